@@ -0,0 +1,87 @@
+import shutil
+import sys
+import tempfile
+from tornado.options import define, options
+
+sys.path.append('..')
+
+import configuration.settings as settings
+from database.backends import mysql, sqlite
+import utilities
+
+""" Benchmarks the throughput of the common DatabaseConnector operations on each backend. Run from
+the benchmarks directory, e.g. "python3 backends.py --users=1000 --iterations=2000". The MySQL
+backend is skipped if the server in the settings cannot be reached. """
+__author__ = "Thomas Reeve"
+
+define("users", default=1000, type=int, help="The number of users in the database.")
+define("iterations", default=2000, type=int, help="The number of times to run each operation.")
+
+
+####################################################################################################
+def benchmark_backend(backend):
+    """ Times the operations on a backend.
+
+    Args:
+        backend (base.Backend): The backend.
+
+    Returns:
+        list(float): The operations per second for each operation in OPERATIONS.
+    """
+    database_connector = utilities.create_connector(backend)
+    utilities.add_users(database_connector, options.users)
+    entry_ids = settings.country_codes
+
+    def access_token(iteration):
+        return "token_" + str(iteration % options.users)
+
+    operations = [
+        lambda iteration: database_connector.get_username(access_token(iteration)),
+        lambda iteration: database_connector.is_access_token_valid(
+            "user_" + str(iteration % options.users), access_token(iteration)),
+        lambda iteration: database_connector.update_score(
+            access_token(iteration), entry_ids[iteration % len(entry_ids)],
+            iteration % (settings.MAXIMUM_SCORE + 1)),
+        lambda iteration: database_connector.get_user_scores(access_token(iteration))
+    ]
+
+    try:
+        return [utilities.time_operation(operation, options.iterations)
+                for operation in operations]
+    finally:
+        database_connector.drop_database(utilities.DATABASE_NAME)
+
+
+####################################################################################################
+def main():
+    """ Runs the benchmark on every backend and prints the results. """
+    options.parse_command_line()
+
+    directory = tempfile.mkdtemp()
+    backends = [
+        ("sqlite (memory)", sqlite.SQLiteBackend()),
+        ("sqlite (file)", sqlite.SQLiteBackend(directory)),
+        ("mysql", mysql.MySQLBackend(settings.DATABASE_HOST, settings.DATABASE_USER,
+                                     settings.DATABASE_PASSWORD))
+    ]
+
+    rows = []
+    try:
+        for name, backend in backends:
+            try:
+                backend.connect().close()
+            except Exception as error:
+                print("Skipping " + name + ": " + str(error))
+                continue
+            rows.append([name] + benchmark_backend(backend))
+    finally:
+        shutil.rmtree(directory)
+
+    print("Operations per second with " + str(options.users) + " users:")
+    utilities.print_table(["backend", "get_username", "is_access_token_valid", "update_score",
+                           "get_user_scores"], rows)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import sys
+import time
+import tornado.gen
+import tornado.ioloop
+import tornado.websocket
+from tornado.options import define, options
+
+sys.path.append('..')
+
+import configuration.settings as settings
+import handlers.codec as codec
+import handlers.update as update
+import utilities
+
+""" Benchmarks broadcasting a message to many websocket clients, framing the message for each client
+with write_message as broadcasts used to, against framing it once with update.frame_message. The
+clients are in memory, their streams only count the bytes written to them, so only the server's CPU
+time is measured. Run from the benchmarks directory, e.g. "python3 broadcast.py --clients=5000". """
+__author__ = "Thomas Reeve"
+
+define("clients", default=5000, type=int, help="The number of clients to broadcast to.")
+define("iterations", default=20, type=int, help="The number of broadcasts of each message.")
+
+
+####################################################################################################
+def create_clients(number_of_clients, compressed):
+    """ Creates the clients, and registers them as update.clients.
+
+    Args:
+        number_of_clients (int): The number of clients.
+        compressed (bool): Whether the clients have negotiated compression.
+
+    Returns:
+        list(update.UpdateHandler): The clients.
+    """
+    update.clients = update.ClientRegistry()
+    handlers = []
+    for index in range(number_of_clients):
+        handler = update.UpdateHandler.__new__(update.UpdateHandler)
+        handler.ws_connection = tornado.websocket.WebSocketProtocol13(
+            handler, False, tornado.websocket._WebSocketParams())
+        handler.ws_connection.stream = utilities.CountingStream()
+        if compressed:
+            handler.ws_connection._create_compressors("server", {})
+        update.clients.add(handler)
+        update.clients.identify(handler, "user_" + str(index), "token_" + str(index))
+        handlers.append(handler)
+    return handlers
+
+
+####################################################################################################
+def create_messages():
+    """ Creates messages like those broadcast by the server.
+
+    Returns:
+        list(tuple): The name and encoded message of each message.
+    """
+    entry_ids = settings.country_codes
+    results = dict((entry_id, dict((score, 100 + score) for score in
+                                   range(-1, settings.MAXIMUM_SCORE + 1)))
+                   for entry_id in entry_ids)
+    return [
+        ("resultsDelta", codec.dumps({"type": "resultsDelta", "sequence": 1234,
+                                      "changes": [[entry_ids[0], 3, -1], [entry_ids[0], 5, 1]]})),
+        ("results", codec.dumps({"type": "results", "sequence": 1234, "results": results}))
+    ]
+
+
+####################################################################################################
+async def write_to_each(handlers, message):
+    """ Broadcasts a message as broadcasts used to, calling write_message for each client.
+
+    Args:
+        handlers (list(update.UpdateHandler)): The clients.
+        message (bytes): The message.
+    """
+    await tornado.gen.multi([handler.write_message(message) for handler in handlers])
+
+
+####################################################################################################
+async def write_frame_once(handlers, message):
+    """ Broadcasts a message with update.broadcast_message_locally, framing it once.
+
+    Args:
+        handlers (list(update.UpdateHandler)): The clients, which are update.clients.
+        message (bytes): The message.
+    """
+    update.broadcast_message_locally(message)
+
+
+####################################################################################################
+async def time_broadcasts(broadcast, handlers, message):
+    """ Times broadcasting a message.
+
+    Args:
+        broadcast: Coroutine function that broadcasts the message to the clients.
+        handlers (list(update.UpdateHandler)): The clients.
+        message (bytes): The message.
+
+    Returns:
+        tuple: The milliseconds of CPU time per broadcast, and the bytes written per client.
+    """
+    streams = [handler.ws_connection.stream for handler in handlers]
+    bytes_before = streams[0].bytes_written
+    start = time.process_time()
+    for _ in range(options.iterations):
+        await broadcast(handlers, message)
+    milliseconds = 1000.0 * (time.process_time() - start) / options.iterations
+    return milliseconds, (streams[0].bytes_written - bytes_before) / options.iterations
+
+
+####################################################################################################
+async def run():
+    """ Runs the benchmark and prints the results. """
+    rows = []
+    for compressed in [False, True]:
+        handlers = create_clients(options.clients, compressed)
+        for name, message in create_messages():
+            before, before_bytes = await time_broadcasts(write_to_each, handlers, message)
+            after, after_bytes = await time_broadcasts(write_frame_once, handlers, message)
+            assert before_bytes == after_bytes or compressed
+            rows.append([name + (" (compressed)" if compressed else ""), len(message),
+                         before, after, before / after if after > 0 else float("inf")])
+
+    print("CPU milliseconds per broadcast to " + str(options.clients) + " clients:")
+    utilities.print_table(["message", "bytes", "write_message", "frame once", "speedup"], rows)
+
+
+####################################################################################################
+def main():
+    """ Runs the benchmark. """
+    options.parse_command_line()
+    tornado.ioloop.IOLoop.current().run_sync(run)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    main()
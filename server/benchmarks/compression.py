@@ -0,0 +1,114 @@
+import random
+import sys
+import time
+import tornado.ioloop
+import tornado.websocket
+from tornado.options import define, options
+
+sys.path.append('..')
+
+import configuration.settings as settings
+import handlers.codec as codec
+import handlers.update as update
+import utilities
+
+""" Benchmarks sending the results snapshot to a websocket client that has just connected, without
+compression and with permessage-deflate at several compression levels, memory levels and window
+sizes, see settings.WEBSOCKET_COMPRESSION. Prints the bytes sent, the CPU time and the memory of
+the connection's compressor. Run from the benchmarks directory, e.g. "python3 compression.py". """
+__author__ = "Thomas Reeve"
+
+define("entries", default=40, type=int, help="The number of entries in the results.")
+define("users", default=5000, type=int, help="The number of users that have scored the entries.")
+define("iterations", default=500, type=int, help="The number of snapshots to send.")
+
+# The compression level, memory level and window bits of each setting to measure. Tornado's default
+# is level 6, memory level 8 and a window of 15 bits.
+COMPRESSION_SETTINGS = [
+    (1, 8, 15),
+    (6, 8, 15),
+    (9, 8, 15),
+    (6, 5, 12),
+    (1, 5, 12),
+    (6, 1, 9)
+]
+
+
+####################################################################################################
+def create_snapshot():
+    """ Creates a results snapshot message, as sent by UpdateHandler.send_snapshot, with random
+    counts.
+
+    Returns:
+        bytes: The message.
+    """
+    generator = random.Random(0)
+    results = {}
+    for entry in range(options.entries):
+        scores = dict((score, 0) for score in range(-1, settings.MAXIMUM_SCORE + 1))
+        for _ in range(options.users):
+            scores[generator.randint(-1, settings.MAXIMUM_SCORE)] += 1
+        results[str(entry + 1)] = scores
+    return codec.dumps({"type": "results", "sequence": 1234, "results": results})
+
+
+####################################################################################################
+async def send_snapshots(snapshot, compression):
+    """ Sends the snapshot to new connections.
+
+    Args:
+        snapshot (bytes): The message.
+        compression (tuple): The compression level, memory level and window bits, None to not
+        compress.
+
+    Returns:
+        tuple: The bytes sent to each connection, and the CPU microseconds for each connection.
+    """
+    streams = []
+    start = time.process_time()
+    for _ in range(options.iterations):
+        protocol = tornado.websocket.WebSocketProtocol13(
+            None, False, tornado.websocket._WebSocketParams())
+        protocol.stream = utilities.CountingStream()
+        if compression is not None:
+            level, memory_level, window_bits = compression
+            protocol._create_compressors("server", {}, {"compression_level": level,
+                                                        "mem_level": memory_level})
+            update.limit_compression_window(protocol, window_bits)
+        await protocol.write_message(snapshot)
+        streams.append(protocol.stream)
+    microseconds = 1000000.0 * (time.process_time() - start) / options.iterations
+    return streams[0].bytes_written, microseconds
+
+
+####################################################################################################
+async def run():
+    """ Runs the benchmark and prints the results. """
+    snapshot = create_snapshot()
+    rows = []
+    for compression in [None] + COMPRESSION_SETTINGS:
+        bytes_sent, microseconds = await send_snapshots(snapshot, compression)
+        if compression is None:
+            name, memory = "none", 0
+        else:
+            level, memory_level, window_bits = compression
+            name = "level " + str(level) + ", memory " + str(memory_level) + ", window " + \
+                str(window_bits)
+            memory = (2 ** (window_bits + 2) + 2 ** (memory_level + 9)) // 1024
+        rows.append([name, bytes_sent, 100.0 * bytes_sent / len(snapshot), microseconds, memory])
+
+    print("Sending a results snapshot of " + str(len(snapshot)) + " bytes:")
+    utilities.print_table(["compression", "bytes", "% of snapshot", "CPU us",
+                           "compressor KiB"], rows)
+
+
+####################################################################################################
+def main():
+    """ Runs the benchmark. """
+    options.parse_command_line()
+    tornado.ioloop.IOLoop.current().run_sync(run)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    main()
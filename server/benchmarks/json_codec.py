@@ -0,0 +1,82 @@
+import copy
+import json
+import sys
+from tornado.options import define, options
+
+sys.path.append('..')
+
+import configuration.settings as settings
+import handlers.codec as codec
+import utilities
+
+""" Benchmarks encoding the results and entries payloads, and decoding a request, with each
+installed JSON library against the json.dumps calls the handlers used to make. Run from the
+benchmarks directory, e.g. "python3 json_codec.py". """
+__author__ = "Thomas Reeve"
+
+define("iterations", default=20000, type=int, help="The number of times to run each operation.")
+
+
+####################################################################################################
+def create_documents():
+    """ Creates documents like those the server sends and receives.
+
+    Returns:
+        tuple: The results message, the entries document and an encoded bulk update request.
+    """
+    results = dict((entry_id, dict((score, 100 + score) for score in
+                                   range(-1, settings.MAXIMUM_SCORE + 1)))
+                   for entry_id in settings.country_codes)
+    results_message = {"type": "results", "results": results}
+
+    entries = copy.deepcopy(settings.entries)
+    for entry in entries:
+        entry["attributes"]["score"] = 5
+    entries_document = {"data": entries}
+
+    request = json.dumps({"update": "score", "scores": [{"id": entry_id, "score": 5}
+                                                        for entry_id in settings.country_codes]})
+    return results_message, entries_document, request.encode()
+
+
+####################################################################################################
+def benchmark(dumps, loads, documents):
+    """ Times encoding and decoding the documents.
+
+    Args:
+        dumps: Callable that encodes a document to bytes.
+        loads: Callable that decodes bytes.
+        documents (tuple): See create_documents.
+
+    Returns:
+        list(float): The operations per second for the results, entries and request.
+    """
+    results_message, entries_document, request = documents
+    return [utilities.time_operation(lambda iteration: dumps(results_message), options.iterations),
+            utilities.time_operation(lambda iteration: dumps(entries_document), options.iterations),
+            utilities.time_operation(lambda iteration: loads(request), options.iterations)]
+
+
+####################################################################################################
+def main():
+    """ Runs the benchmark and prints the results. """
+    options.parse_command_line()
+    documents = create_documents()
+
+    baseline = benchmark(lambda document: json.dumps(document).encode(),
+                         lambda data: json.loads(data.decode()), documents)
+    rows = [["json.dumps (before)"] + baseline]
+    for codec_name in codec.PREFERENCE:
+        if codec_name in codec.CODECS:
+            codec.use_codec(codec_name)
+            rates = benchmark(codec.dumps, codec.loads, documents)
+            rows.append(["codec (" + codec_name + ")"] + rates)
+            rows.append(["  speedup"] + [rate / base for rate, base in zip(rates, baseline)])
+
+    print("Operations per second:")
+    utilities.print_table(["encoder", "results message", "entries", "decode request"], rows)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import sys
+from tornado.options import define, options
+
+sys.path.append('..')
+
+import configuration.settings as settings
+from database.backends import sqlite
+import utilities
+
+""" Benchmarks counting the results in the database, with GROUP BY, against fetching every score
+and counting them in Python. Run from the benchmarks directory, e.g. "python3 results.py". The
+in memory SQLite backend is used. """
+__author__ = "Thomas Reeve"
+
+define("users", default=[10000, 100000], type=int, multiple=True,
+       help="The numbers of users to benchmark with.")
+define("entries", default=26, type=int, help="The number of entries.")
+define("iterations", default=10, type=int, help="The number of times to count the results.")
+
+
+####################################################################################################
+def count_in_python(database_connector, entry_ids):
+    """ Counts the results the way generate_results_dictionary used to, by fetching every score.
+
+    Args:
+        database_connector (connector.DatabaseConnector): The connector.
+        entry_ids: The IDs of the entries to count the results for.
+
+    Returns:
+        dict: The results, see DatabaseConnector.generate_results_dictionary.
+    """
+    number_of_users = database_connector.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    results = dict((entry_id, dict((score, 0) for score in range(-1, settings.MAXIMUM_SCORE + 1)))
+                   for entry_id in entry_ids)
+    for entry_id in entry_ids:
+        results[entry_id][-1] = number_of_users
+
+    select_command = "SELECT entry_id, score FROM scores WHERE entry_id IN (" + \
+                     ", ".join(["%s"] * len(entry_ids)) + ")"
+    for entry_id, score in database_connector.execute(select_command, tuple(entry_ids)).fetchall():
+        results[entry_id][score] += 1
+        results[entry_id][-1] -= 1
+    return results
+
+
+####################################################################################################
+def main():
+    """ Runs the benchmark and prints the results. """
+    options.parse_command_line()
+
+    entry_ids = ["entry_" + str(entry) for entry in range(options.entries)]
+    rows = []
+
+    for number_of_users in options.users:
+        database_connector = utilities.create_connector(sqlite.SQLiteBackend())
+        try:
+            utilities.add_users(database_connector, number_of_users, entry_ids=entry_ids)
+
+            if count_in_python(database_connector, entry_ids) != \
+                    database_connector.generate_results_dictionary(entry_ids):
+                raise Exception("The results are different.")
+
+            python_rate = utilities.time_operation(
+                lambda iteration: count_in_python(database_connector, entry_ids),
+                options.iterations)
+            database_rate = utilities.time_operation(
+                lambda iteration: database_connector.generate_results_dictionary(entry_ids),
+                options.iterations)
+
+            rows.append([number_of_users, 1000.0 / python_rate, 1000.0 / database_rate,
+                         database_rate / python_rate])
+        finally:
+            database_connector.drop_database(utilities.DATABASE_NAME)
+
+    print("Milliseconds to count the results for " + str(options.entries) + " entries:")
+    utilities.print_table(["users", "fetch every score", "group by", "speedup"], rows)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import random
+import time
+import tornado.concurrent
+
+import configuration.settings as settings
+import database.connector as connector
+import database.pool as pool
+
+""" This module contains helper functions for the benchmarks. """
+__author__ = "Thomas Reeve"
+
+# The name of the database the benchmarks create and drop.
+DATABASE_NAME = "BENCHMARK_DATABASE"
+
+
+####################################################################################################
+def create_connector(backend):
+    """ Creates a DatabaseConnector with empty tables on a new database.
+
+    Args:
+        backend (base.Backend): The backend to use.
+
+    Returns:
+        connector.DatabaseConnector: The connector.
+    """
+    maximum_size = backend.maximum_connections or 1
+    connection_pool = pool.ConnectionPool(backend.connect, minimum_size=1,
+                                          maximum_size=maximum_size)
+    database_connector = connector.DatabaseConnector(connection_pool, backend=backend)
+
+    if database_connector.does_database_exist(DATABASE_NAME):
+        database_connector.drop_database(DATABASE_NAME)
+    database_connector.create_database(DATABASE_NAME)
+    database_connector.use_database(DATABASE_NAME)
+    database_connector.create_users_table()
+    database_connector.create_scores_table()
+    database_connector.create_access_table()
+    return database_connector
+
+
+####################################################################################################
+def add_users(database_connector, number_of_users, scored_fraction=0.5, seed=0, entry_ids=None):
+    """ Adds users straight to the tables, without hashing passwords, in one transaction. Users are
+    called "user_<n>" and their access token is "token_<n>".
+
+    Args:
+        database_connector (connector.DatabaseConnector): The connector.
+        number_of_users (int): The number of users to add.
+        scored_fraction (float): The fraction of entries each user has scored.
+        seed (int): Seed for the random scores.
+        entry_ids: Sequence of the IDs of the entries to score. If None the entries in the settings
+        are used.
+    """
+    generator = random.Random(seed)
+    entry_ids = settings.country_codes if entry_ids is None else entry_ids
+    expiry = connector.DatabaseConnector.calculate_expiry(settings.ACCESS_EXPIRY_SECONDS)
+
+    with database_connector.transaction():
+        for user in range(number_of_users):
+            username = "user_" + str(user)
+            database_connector.execute(
+                "INSERT INTO users (username, password, refresh_token, refresh_token_expiry, "
+                "activated) VALUES (%s, %s, %s, %s, %s)",
+                (username, "password", "refresh_" + str(user), expiry, True))
+            database_connector.execute(
+                "INSERT INTO access (username, access_token, access_token_expiry) "
+                "VALUES (%s, %s, %s)", (username, "token_" + str(user), expiry))
+            for entry_id in entry_ids:
+                if generator.random() < scored_fraction:
+                    database_connector.execute(
+                        "INSERT INTO scores (username, entry_id, score) VALUES (%s, %s, %s)",
+                        (username, entry_id, generator.randint(0, settings.MAXIMUM_SCORE)))
+
+
+####################################################################################################
+def time_operation(operation, iterations):
+    """ Times an operation.
+
+    Args:
+        operation: Callable that takes the iteration number.
+        iterations (int): The number of times to run the operation.
+
+    Returns:
+        float: The number of operations per second.
+    """
+    start = time.perf_counter()
+    for iteration in range(iterations):
+        operation(iteration)
+    seconds = time.perf_counter() - start
+    return iterations / seconds if seconds > 0 else float("inf")
+
+
+####################################################################################################
+def print_table(headings, rows):
+    """ Prints a table of results, numbers are printed to one decimal place.
+
+    Args:
+        headings: Sequence of the column headings.
+        rows: Sequence of rows, each a sequence of values with one value per heading.
+    """
+    cells = [list(headings)] + [[format_cell(value) for value in row] for row in rows]
+    widths = [max(len(row[column]) for row in cells) for column in range(len(headings))]
+
+    for index, row in enumerate(cells):
+        print("  ".join(cell.rjust(width) if column > 0 else cell.ljust(width)
+                        for column, (cell, width) in enumerate(zip(row, widths))))
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+####################################################################################################
+def format_cell(value):
+    """ Formats a value for print_table.
+
+    Args:
+        value: The value.
+
+    Returns:
+        str: The formatted value.
+    """
+    if isinstance(value, float):
+        return "%.1f" % value
+    return str(value)
+
+
+####################################################################################################
+class CountingStream(object):
+    """ Stands in for a client's IOStream, counting the bytes written to it. """
+    ################################################################################################
+    def __init__(self):
+        """ Constructor. """
+        self.bytes_written = 0
+
+    ################################################################################################
+    def closed(self):
+        """ The stream is never closed. """
+        return False
+
+    ################################################################################################
+    def write(self, data):
+        """ Counts the bytes.
+
+        Args:
+            data (bytes): The bytes written.
+
+        Returns:
+            Future: A future that is already done.
+        """
+        self.bytes_written += len(data)
+        future = tornado.concurrent.Future()
+        future.set_result(None)
+        return future
@@ -44,6 +44,10 @@ def setup_custom_logger(name):
 # database.
 PASSWORD_SALTING_ROUNDS = 10000
 PASSWORD_SALTING_SIZE = 16
+# The number of processes used to hash and verify passwords (0 hashes them on threads), and how many
+# passwords can be waiting to be hashed before login and register requests are turned away.
+PASSWORD_HASHING_PROCESSES = 2
+PASSWORD_HASHING_QUEUE_SIZE = 100
 # Should be plenty to store the type of theme.
 THEME_LENGTH = 100
 
@@ -51,22 +55,76 @@ THEME_LENGTH = 100
 # The port number on which to access the Vision web page (note this will be mapped through to a
 # different port number on the host machine as this will run in a Docker container).
 PORT = 15555
+# The number of processes to serve requests with, 0 for one per CPU. Websocket broadcasts are passed
+# between the processes. Several processes cannot share an in memory SQLite database.
+PROCESSES = 1
 CLEAR_DATABASE = False
 
 ####################################################################################################
 # The Database configuration.
+DATABASE_BACKEND = "mysql"  # Either "mysql" or "sqlite".
+DATABASE_SQLITE_DIRECTORY = None  # Where SQLite stores databases, None keeps them in memory.
 DATABASE_USER = "vision"
 DATABASE_PASSWORD = "visionpass"
 DATABASE_NAME = "visiondb"
 DATABASE_HOST = "localhost"
 
+# The database connection pool configuration.
+DATABASE_POOL_MINIMUM_SIZE = 2
+DATABASE_POOL_MAXIMUM_SIZE = 10
+DATABASE_POOL_ACQUIRE_TIMEOUT_SECONDS = 10  # How long to wait for a free connection.
+DATABASE_POOL_IDLE_TIMEOUT_SECONDS = 5 * 60  # Idle connections above the minimum are then closed.
+DATABASE_POOL_HEALTH_CHECK_SECONDS = 30  # Connections idle for longer are pinged before use.
+DATABASE_POOL_REAP_INTERVAL_SECONDS = 60  # How often to close idle connections.
+# The number of threads database queries run on so they do not block the server. There is no point
+# having more threads than connections in the pool.
+DATABASE_EXECUTOR_THREADS = DATABASE_POOL_MAXIMUM_SIZE
+
 MAX_USERNAME_LENGTH = 20
+ENTRY_ID_LENGTH = 36  # The maximum length of an entry ID in the entries json file.
 PASSWORD_HASH_LENGTH = 2000  # Far greater than the string generated by passlib.hash.
 
 MAXIMUM_SCORE = 10
 
 UPDATE_TIMEOUT = 10000  # Update every 10 seconds. We don't need to update too often.
 
+# A user's score updates are collected for this long, then only the latest score for each entry is
+# written and broadcast. Dragging a score slider sends an update for every score it passes.
+SCORE_COALESCING_SECONDS = 0.1
+
+# The most bytes a websocket connection may have waiting to be sent, e.g. to a phone on a bad
+# connection. Broadcasts of the results to a connection over the limit are dropped, and it is sent a
+# snapshot of the results once it has caught up. Connections over the limit for longer than
+# WEBSOCKET_STALLED_SECONDS are closed.
+WEBSOCKET_MAXIMUM_BUFFER_BYTES = 1024 * 1024
+WEBSOCKET_STALLED_SECONDS = 30
+
+# Compresses the messages sent to one websocket client, e.g. the results snapshot sent when it
+# connects, with permessage-deflate if the client offers it. Broadcasts are never compressed, see
+# UpdateHandler.write_frame. Each connection keeps a compressor of about
+# 2 ** (WINDOW_BITS + 2) + 2 ** (MEMORY_LEVEL + 9) bytes. See benchmarks/compression.py.
+WEBSOCKET_COMPRESSION = False
+WEBSOCKET_COMPRESSION_LEVEL = 6  # From 1, the fastest, to 9, the smallest.
+WEBSOCKET_COMPRESSION_MEMORY_LEVEL = 5  # From 1 to 9, the memory for finding repeated strings.
+WEBSOCKET_COMPRESSION_WINDOW_BITS = 12  # From 9 to 15, None for as large as the client allows.
+
+ACCESS_TOKEN_CACHE_SIZE = 10000  # The number of access tokens to remember the username for.
+ACCESS_TOKEN_CACHE_SECONDS = 60  # How long to remember them for, at most.
+
+# The library used to encode and decode JSON, "orjson", "ujson" or "json". None uses the fastest one
+# installed.
+JSON_CODEC = None
+
+# Static files without a fingerprint in their name, e.g. the flags, are cached by browsers for this
+# long. Fingerprinted files are cached forever as a new build gives them a new name.
+STATIC_CACHE_SECONDS = 24 * 60 * 60
+STATIC_MEMORY_CACHE_SIZE = 64 * 1024 * 1024  # The bytes of static files kept in memory.
+STATIC_MEMORY_CACHE_FILE_SIZE = 512 * 1024  # Only files up to this size are kept in memory.
+
+# The addresses that can read the metrics at "/api/metrics", e.g. the address of a Prometheus
+# server. Requests from any other address are refused. An empty list turns the metrics off.
+METRICS_ALLOWED_ADDRESSES = ["127.0.0.1", "::1"]
+
 UUID_LENGTH = 36  # The length of a UUID. Used for access or refresh token.
 
 REFRESH_EXPIRY_SECONDS = 60 * 24 * 60 * 60  # The refresh token will last for 60 days.
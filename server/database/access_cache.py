@@ -0,0 +1,155 @@
+import collections
+import datetime
+import threading
+import time
+
+""" This module contains the AccessTokenCache class, which remembers which user an access token
+belongs to so that authenticated requests do not have to query the access table every time. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class AccessTokenCache(object):
+    """ Thread safe least recently used cache of access token to username. Entries are kept for at
+    most the time to live, and never beyond the access token's expiry. The DatabaseConnector must
+    invalidate a user's entries whenever their row in the access table changes. """
+    ################################################################################################
+    def __init__(self, maximum_size=10000, time_to_live=60):
+        """ Constructor.
+
+        Args:
+            maximum_size (int): The maximum number of access tokens to remember. If 0 nothing is
+            cached.
+            time_to_live (float): The maximum number of seconds to remember an access token for.
+        """
+        self.__maximum_size = maximum_size
+        self.__time_to_live = time_to_live
+
+        self.__lock = threading.Lock()
+        # Access token to (username, time.time() the entry expires), least recently used first.
+        self.__entries = collections.OrderedDict()
+        # Username to the set of their cached access tokens.
+        self.__tokens_by_username = {}
+        # Incremented on every invalidation, see get_generation.
+        self.__generation = 0
+        self.__statistics = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evicted": 0,
+            "invalidated": 0
+        }
+
+    ################################################################################################
+    def get(self, access_token):
+        """ Gets the username for an access token.
+
+        Args:
+            access_token (str): The access token.
+
+        Returns:
+            str: The username, or None if the access token is not cached.
+        """
+        with self.__lock:
+            entry = self.__entries.get(access_token)
+            if entry is None:
+                self.__statistics["misses"] += 1
+                return None
+
+            username, expires = entry
+            if time.time() >= expires:
+                self.__remove(access_token)
+                self.__statistics["expired"] += 1
+                self.__statistics["misses"] += 1
+                return None
+
+            self.__entries.move_to_end(access_token)
+            self.__statistics["hits"] += 1
+            return username
+
+    ################################################################################################
+    def get_generation(self):
+        """ Gets the number of invalidations so far. Callers take the generation before reading
+        the database and pass it to put, so a read that raced with an invalidation is not cached.
+
+        Returns:
+            int: The generation.
+        """
+        with self.__lock:
+            return self.__generation
+
+    ################################################################################################
+    def put(self, access_token, username, access_token_expiry, generation):
+        """ Remembers the username for an access token.
+
+        Args:
+            access_token (str): The access token.
+            username (str): The user's username.
+            access_token_expiry (datetime.datetime): When the access token expires.
+            generation (int): The generation from before the database was read.
+        """
+        seconds_until_expiry = (access_token_expiry - datetime.datetime.now()).total_seconds()
+        seconds_to_live = min(self.__time_to_live, seconds_until_expiry)
+
+        with self.__lock:
+            if self.__maximum_size <= 0 or seconds_to_live <= 0 or \
+                    generation != self.__generation:
+                return
+
+            if access_token in self.__entries:
+                self.__remove(access_token)
+
+            self.__entries[access_token] = (username, time.time() + seconds_to_live)
+            self.__tokens_by_username.setdefault(username, set()).add(access_token)
+
+            while len(self.__entries) > self.__maximum_size:
+                self.__remove(next(iter(self.__entries)))
+                self.__statistics["evicted"] += 1
+
+    ################################################################################################
+    def invalidate_user(self, username):
+        """ Forgets every access token belonging to a user.
+
+        Args:
+            username (str): The user's username.
+        """
+        with self.__lock:
+            self.__generation += 1
+            for access_token in self.__tokens_by_username.pop(username, ()):
+                del self.__entries[access_token]
+                self.__statistics["invalidated"] += 1
+
+    ################################################################################################
+    def clear(self):
+        """ Forgets every access token. """
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.__tokens_by_username.clear()
+
+    ################################################################################################
+    def __remove(self, access_token):
+        """ Forgets an access token. Must be called with the lock held.
+
+        Args:
+            access_token (str): The access token, which must be cached.
+        """
+        username, _ = self.__entries.pop(access_token)
+        access_tokens = self.__tokens_by_username[username]
+        access_tokens.discard(access_token)
+        if not access_tokens:
+            del self.__tokens_by_username[username]
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets statistics about the cache.
+
+        Returns:
+            dict: Dictionary containing the number of hits, misses, expired, evicted and invalidated
+            entries, and the current and maximum size.
+        """
+        with self.__lock:
+            statistics = dict(self.__statistics)
+            statistics["size"] = len(self.__entries)
+            statistics["maximum_size"] = self.__maximum_size
+            return statistics
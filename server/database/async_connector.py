@@ -0,0 +1,182 @@
+import functools
+import tornado.ioloop
+
+from database import leaderboard, passwords
+
+""" This module contains the AsyncDatabaseConnector class, which lets the Tornado handlers use a
+DatabaseConnector without blocking the IOLoop. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class AsyncDatabaseConnector(object):
+    """ Asynchronous version of the DatabaseConnector. Every method is a coroutine that runs the
+    matching DatabaseConnector method on an executor, so the IOLoop keeps serving requests and
+    websockets while queries are in flight. """
+    ################################################################################################
+    def __init__(self, database_connector, executor, password_hasher=None):
+        """ Constructor.
+
+        Args:
+            database_connector (DatabaseConnector): The connector to run queries with. It must be
+            safe to use from several threads at once, i.e. be backed by a connection pool.
+            executor (concurrent.futures.Executor): The executor to run the queries on.
+            password_hasher (passwords.PasswordHasher): Used to hash and verify passwords between
+            the queries, so the executor's threads do not wait for them. If None passwords are
+            hashed on the IOLoop's default executor.
+        """
+        self.__database_connector = database_connector
+        self.__executor = executor
+        self.__password_hasher = password_hasher or passwords.PasswordHasher()
+
+    ################################################################################################
+    async def __run(self, method, *args):
+        """ Runs a DatabaseConnector method on the executor.
+
+        Args:
+            method: The bound DatabaseConnector method.
+            *args: The arguments to pass to the method.
+
+        Returns:
+            The value returned by the method.
+        """
+        return await tornado.ioloop.IOLoop.current().run_in_executor(
+            self.__executor, functools.partial(method, *args))
+
+    ################################################################################################
+    def get_etag(self, username, resource):
+        """ See DatabaseConnector.get_etag, which does not read the database. """
+        return self.__database_connector.get_etag(username, resource)
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets the statistics of the DatabaseConnector, which does not read the database.
+
+        Returns:
+            dict: The "commits", and the statistics of the "queries", "pool", "password_hasher" and
+            "access_token_cache", see the DatabaseConnector methods that get them.
+        """
+        return {
+            "commits": self.__database_connector.get_commit_count(),
+            "queries": self.__database_connector.get_query_statistics(),
+            "pool": self.__database_connector.get_pool_statistics(),
+            "password_hasher": self.__password_hasher.get_statistics(),
+            "access_token_cache": self.__database_connector.get_access_token_cache_statistics()
+        }
+
+    ################################################################################################
+    async def get_username(self, access_token):
+        """ See DatabaseConnector.get_username. The username is returned straight away when the
+        access token is cached. """
+        username = self.__database_connector.get_cached_username(access_token)
+        if username is not None:
+            return username
+        return await self.__run(self.__database_connector.get_username, access_token)
+
+    ################################################################################################
+    async def register_user(self, username, password):
+        """ See DatabaseConnector.register_user. The password is hashed by the PasswordHasher.
+
+        Raises:
+            PasswordHasherBusyException: If too many passwords are waiting to be hashed.
+        """
+        await self.__run(self.__database_connector.check_new_user, username, password)
+        password_hash = await self.__password_hasher.hash(password)
+        await self.__run(self.__database_connector.register_user, username, password,
+                         password_hash)
+
+    ################################################################################################
+    async def login_user(self, username, password):
+        """ See DatabaseConnector.login_user. The password is verified by the PasswordHasher.
+
+        Raises:
+            PasswordHasherBusyException: If too many passwords are waiting to be verified.
+        """
+        password_hash = await self.__run(self.__database_connector.get_password_hash, username)
+        if not await self.__password_hasher.verify(password, password_hash):
+            raise ValueError("Cannot login. Username/password is incorrect.")
+        await self.__run(self.__database_connector.login_verified_user, username)
+
+    ################################################################################################
+    async def get_access_information(self, username):
+        """ See DatabaseConnector.get_access_information. """
+        return await self.__run(self.__database_connector.get_access_information, username)
+
+    ################################################################################################
+    async def is_access_token_valid(self, username, access_token):
+        """ See DatabaseConnector.is_access_token_valid. """
+        return await self.__run(self.__database_connector.is_access_token_valid, username,
+                                access_token)
+
+    ################################################################################################
+    async def is_refresh_token_valid(self, username, refresh_token):
+        """ See DatabaseConnector.is_refresh_token_valid. """
+        return await self.__run(self.__database_connector.is_refresh_token_valid, username,
+                                refresh_token)
+
+    ################################################################################################
+    async def extend_access_expiry(self, username, expected_access_token):
+        """ See DatabaseConnector.extend_access_expiry. """
+        return await self.__run(self.__database_connector.extend_access_expiry, username,
+                                expected_access_token)
+
+    ################################################################################################
+    async def update_score(self, access_token, entry_id, score):
+        """ See DatabaseConnector.update_score. """
+        return await self.__run(self.__database_connector.update_score, access_token, entry_id,
+                                score)
+
+    ################################################################################################
+    async def update_scores(self, access_token, scores):
+        """ See DatabaseConnector.update_scores. """
+        return await self.__run(self.__database_connector.update_scores, access_token, scores)
+
+    ################################################################################################
+    async def generate_results_dictionary(self, columns):
+        """ See DatabaseConnector.generate_results_dictionary. The results are returned straight
+        away when they are kept in memory. """
+        if self.__database_connector.is_results_aggregate_loaded():
+            return self.__database_connector.generate_results_dictionary(columns)
+        return await self.__run(self.__database_connector.generate_results_dictionary, columns)
+
+    ################################################################################################
+    def is_results_aggregate_loaded(self):
+        """ See DatabaseConnector.is_results_aggregate_loaded, which does not read the database. """
+        return self.__database_connector.is_results_aggregate_loaded()
+
+    ################################################################################################
+    def take_results_changes(self):
+        """ See DatabaseConnector.take_results_changes, which does not read the database. """
+        return self.__database_connector.take_results_changes()
+
+    ################################################################################################
+    async def get_results_snapshot(self):
+        """ See DatabaseConnector.get_results_snapshot. The snapshot is returned straight away when
+        the results are kept in memory. """
+        if self.__database_connector.is_results_aggregate_loaded():
+            return self.__database_connector.get_results_snapshot()
+        return await self.__run(self.__database_connector.get_results_snapshot)
+
+    ################################################################################################
+    async def get_leaderboard(self, order=leaderboard.TOTAL, start=0, count=None):
+        """ See DatabaseConnector.get_leaderboard. The ranking is returned straight away when it is
+        kept in memory. """
+        if self.__database_connector.is_results_aggregate_loaded():
+            return self.__database_connector.get_leaderboard(order, start, count)
+        return await self.__run(self.__database_connector.get_leaderboard, order, start, count)
+
+    ################################################################################################
+    async def get_score(self, access_token, entry_id):
+        """ See DatabaseConnector.get_score. """
+        return await self.__run(self.__database_connector.get_score, access_token, entry_id)
+
+    ################################################################################################
+    async def get_user_scores(self, access_token):
+        """ See DatabaseConnector.get_user_scores. """
+        return await self.__run(self.__database_connector.get_user_scores, access_token)
+
+    ################################################################################################
+    async def generate_settings_dictionary(self, access_token):
+        """ See DatabaseConnector.generate_settings_dictionary. """
+        return await self.__run(self.__database_connector.generate_settings_dictionary,
+                                access_token)
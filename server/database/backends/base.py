@@ -0,0 +1,132 @@
+""" This module contains the Backend class, which is the interface the DatabaseConnector uses for
+everything that differs between database servers. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class Backend(object):
+    """ Base class for database backends. The DatabaseConnector writes its queries in MySQL's
+    dialect with %s placeholders, backends provide connections that accept those queries and
+    implement the few statements that cannot be written portably. """
+    # The maximum number of connections the backend supports at once, None if there is no limit.
+    maximum_connections = None
+
+    ################################################################################################
+    def connect(self):
+        """ Opens a new connection that is not using a database. Connections must have the cursor,
+        commit, rollback, close, ping and select_db methods of a MySQLdb connection, and their
+        cursors must fetch every row when a query is executed, as the cursor is read after the
+        connection has been returned to the pool.
+
+        Returns:
+            The database connection.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def is_connection_lost_error(self, error):
+        """ Checks if the error was raised because the connection to the database was lost.
+
+        Args:
+            error (Exception): The error raised by the database driver.
+
+        Returns:
+            bool: True if the connection was lost, False otherwise.
+        """
+        return False
+
+    ################################################################################################
+    def get_current_database(self, execute):
+        """ Gets the name of the database the connection is using.
+
+        Args:
+            execute: DatabaseConnector.execute.
+
+        Returns:
+            str: The name of the database, or None if no database is being used.
+        """
+        return execute("SELECT DATABASE()").fetchone()[0]
+
+    ################################################################################################
+    def get_all_databases(self, execute):
+        """ Gets the names of all the databases.
+
+        Args:
+            execute: DatabaseConnector.execute.
+
+        Returns:
+            list(str): The names of all the databases.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def create_database(self, execute, name):
+        """ Creates a database.
+
+        Args:
+            execute: DatabaseConnector.execute.
+            name (str): The name of the new database.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def drop_database(self, execute, name):
+        """ Drops a database.
+
+        Args:
+            execute: DatabaseConnector.execute.
+            name (str): The name of the database to drop.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def use_database(self, execute, name):
+        """ Switches the connection to a database. The connection pool switches every other
+        connection by calling select_db.
+
+        Args:
+            execute: DatabaseConnector.execute.
+            name (str): The name of the database to use.
+        """
+        pass
+
+    ################################################################################################
+    def get_columns(self, execute, table_name):
+        """ Gets the names of a table's columns.
+
+        Args:
+            execute: DatabaseConnector.execute.
+            table_name (str): The name of the table.
+
+        Returns:
+            list(str): The names of the columns, in order.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def get_tables(self, execute):
+        """ Gets the names of the tables in the database the connection is using.
+
+        Args:
+            execute: DatabaseConnector.execute.
+
+        Returns:
+            list(str): The names of the tables.
+        """
+        raise NotImplementedError()
+
+    ################################################################################################
+    def upsert(self, table_name, columns, key_columns):
+        """ Creates a statement that inserts a row, or updates the row if one with the same key
+        already exists.
+
+        Args:
+            table_name (str): The name of the table.
+            columns: Sequence of the names of the columns to set, the statement takes a parameter
+            for each one.
+            key_columns: Sequence of the names of the columns in the table's primary key.
+
+        Returns:
+            str: The statement.
+        """
+        raise NotImplementedError()
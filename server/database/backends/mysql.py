@@ -0,0 +1,74 @@
+from database import pool
+from database.backends import base
+
+""" This module contains the MySQLBackend class, which connects the DatabaseConnector to a MySQL
+server. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class MySQLBackend(base.Backend):
+    """ Backend for a MySQL server, using MySQLdb. """
+    ################################################################################################
+    def __init__(self, host, user, password):
+        """ Constructor.
+
+        Args:
+            host (str): The host the MySQL server is running on.
+            user (str): The user to connect as.
+            password (str): The user's password.
+        """
+        self.__host = host
+        self.__user = user
+        self.__password = password
+
+    ################################################################################################
+    def connect(self):
+        """ See Backend.connect. """
+        # Imported here so the other backends can be used without MySQLdb installed.
+        import MySQLdb
+        return MySQLdb.connect(host=self.__host, user=self.__user, passwd=self.__password)
+
+    ################################################################################################
+    def is_connection_lost_error(self, error):
+        """ See Backend.is_connection_lost_error. """
+        return pool.is_connection_lost_error(error)
+
+    ################################################################################################
+    def get_all_databases(self, execute):
+        """ See Backend.get_all_databases. """
+        return [row[0] for row in execute("SHOW DATABASES").fetchall()]
+
+    ################################################################################################
+    def create_database(self, execute, name):
+        """ See Backend.create_database. """
+        execute("CREATE DATABASE `%s`" % name)
+
+    ################################################################################################
+    def drop_database(self, execute, name):
+        """ See Backend.drop_database. """
+        execute("DROP DATABASE `%s`" % name)
+
+    ################################################################################################
+    def use_database(self, execute, name):
+        """ See Backend.use_database. """
+        execute("USE `%s`" % name)
+
+    ################################################################################################
+    def get_columns(self, execute, table_name):
+        """ See Backend.get_columns. """
+        return [row[0] for row in execute("SHOW COLUMNS FROM `%s`" % table_name).fetchall()]
+
+    ################################################################################################
+    def get_tables(self, execute):
+        """ See Backend.get_tables. """
+        return [row[0] for row in execute("SHOW TABLES").fetchall()]
+
+    ################################################################################################
+    def upsert(self, table_name, columns, key_columns):
+        """ See Backend.upsert. """
+        updates = ", ".join("`%s` = VALUES(`%s`)" % (column, column) for column in columns
+                            if column not in key_columns)
+        return "INSERT INTO `%s` (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s" % (
+            table_name, ", ".join("`" + column + "`" for column in columns),
+            ", ".join(["%s"] * len(columns)), updates)
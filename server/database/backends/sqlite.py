@@ -0,0 +1,347 @@
+import datetime
+import functools
+import os
+import re
+import sqlite3
+import threading
+import urllib.parse
+import uuid
+import weakref
+
+from database.backends import base
+
+""" This module contains the SQLiteBackend class, which stores the database in SQLite so the server
+and tests can run without a MySQL server. """
+__author__ = "Thomas Reeve"
+
+# The DatabaseConnector passes datetimes and UUIDs as parameters, and expects DATETIME columns to be
+# read back as datetimes like they are from MySQL.
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(uuid.UUID, str)
+
+
+####################################################################################################
+def convert_datetime(value):
+    """ Converts a DATETIME column read from SQLite.
+
+    Args:
+        value (bytes): The value stored in the column.
+
+    Returns:
+        datetime.datetime: The date and time.
+    """
+    value = value.decode()
+    if "." in value:
+        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+    return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+
+sqlite3.register_converter("DATETIME", convert_datetime)
+
+
+####################################################################################################
+@functools.lru_cache(maxsize=1024)
+def translate_query(query):
+    """ Translates a query with MySQLdb's %s placeholders to SQLite's ? placeholders.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The translated query.
+    """
+    return re.sub(r"%([s%])", lambda match: "?" if match.group(1) == "s" else "%", query)
+
+
+####################################################################################################
+class SQLiteCursor(object):
+    """ Cursor that fetches every row when a query is executed, like MySQLdb's default cursor. """
+    ################################################################################################
+    def __init__(self, connection):
+        """ Constructor.
+
+        Args:
+            connection (sqlite3.Connection): The connection to execute queries on.
+        """
+        self.__connection = connection
+        self.__rows = []
+        self.__position = 0
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    ################################################################################################
+    def execute(self, query, args=None):
+        """ Executes a query.
+
+        Args:
+            query (str): The query, with %s placeholders.
+            args: Sequence of the parameters.
+
+        Returns:
+            int: The number of rows affected or selected.
+        """
+        cursor = self.__connection.execute(translate_query(query), args or ())
+        try:
+            self.description = cursor.description
+            self.__rows = cursor.fetchall() if cursor.description is not None else []
+            self.__position = 0
+            self.rowcount = len(self.__rows) if cursor.description is not None else \
+                cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+        finally:
+            cursor.close()
+        return self.rowcount
+
+    ################################################################################################
+    def fetchone(self):
+        """ Fetches the next row.
+
+        Returns:
+            tuple: The row, or None if there are no more rows.
+        """
+        if self.__position >= len(self.__rows):
+            return None
+        self.__position += 1
+        return self.__rows[self.__position - 1]
+
+    ################################################################################################
+    def fetchall(self):
+        """ Fetches the remaining rows.
+
+        Returns:
+            list(tuple): The rows.
+        """
+        rows = self.__rows[self.__position:]
+        self.__position = len(self.__rows)
+        return rows
+
+    ################################################################################################
+    def close(self):
+        """ Closes the cursor. """
+        self.__rows = []
+
+
+####################################################################################################
+class SQLiteConnection(object):
+    """ Wraps a sqlite3 connection to behave like a MySQLdb connection. Selecting a database opens
+    a new sqlite3 connection to it. """
+    ################################################################################################
+    def __init__(self, backend):
+        """ Constructor.
+
+        Args:
+            backend (SQLiteBackend): The backend that opened the connection.
+        """
+        self.__backend = backend
+        self.__connection = None
+        self.database = None
+        self.select_db(None)
+
+    ################################################################################################
+    def select_db(self, name):
+        """ Switches to a database.
+
+        Args:
+            name (str): The name of the database, or None to use a private in memory database.
+
+        Raises:
+            sqlite3.OperationalError: If the database does not exist.
+        """
+        connection = self.__backend.open(name)
+        connection.create_function("DATABASE", 0, lambda: self.database)
+        self.close()
+        self.__connection = connection
+        self.database = name
+
+    ################################################################################################
+    def cursor(self):
+        """ Creates a cursor.
+
+        Returns:
+            SQLiteCursor: The cursor.
+        """
+        return SQLiteCursor(self.__connection)
+
+    ################################################################################################
+    def commit(self):
+        """ Commits the current transaction. """
+        self.__connection.commit()
+
+    ################################################################################################
+    def rollback(self):
+        """ Rolls back the current transaction. """
+        self.__connection.rollback()
+
+    ################################################################################################
+    def ping(self):
+        """ Checks the connection can still be used.
+
+        Raises:
+            sqlite3.Error: If the connection is closed.
+        """
+        self.__connection.execute("SELECT 1").close()
+
+    ################################################################################################
+    def close(self):
+        """ Closes the connection. """
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+
+####################################################################################################
+class SQLiteBackend(base.Backend):
+    """ Backend that stores each database in a SQLite file in a directory, or in memory if no
+    directory is given. In memory databases last until they are dropped or the process exits, and
+    only one connection can use them at once as SQLite locks whole tables between connections
+    sharing an in memory database. """
+    ################################################################################################
+    def __init__(self, directory=None, timeout=5):
+        """ Constructor.
+
+        Args:
+            directory (str): The directory to store the database files in, or None to keep the
+            databases in memory.
+            timeout (float): Seconds to wait for another connection to finish writing to a database
+            file before giving up.
+        """
+        self.__directory = directory
+        self.__timeout = timeout
+
+        self.__lock = threading.Lock()
+        self.__connections = weakref.WeakSet()
+        # In memory databases are deleted once nothing is connected to them, so a connection to
+        # each one is kept open until it is dropped.
+        self.__memory_databases = {}
+
+        if directory is None:
+            self.maximum_connections = 1
+
+    ################################################################################################
+    def __get_uri(self, name, mode):
+        """ Gets the URI of a database.
+
+        Args:
+            name (str): The name of the database.
+            mode (str): "rw" to open an existing database, or "rwc" to create it if needed.
+
+        Returns:
+            str: The URI.
+        """
+        if self.__directory is None:
+            return "file:%s?mode=memory&cache=shared" % urllib.parse.quote(name)
+        path = os.path.abspath(os.path.join(self.__directory, name + ".sqlite3"))
+        return "file:%s?mode=%s" % (urllib.parse.quote(path), mode)
+
+    ################################################################################################
+    def open(self, name, mode="rw"):
+        """ Opens a sqlite3 connection to a database.
+
+        Args:
+            name (str): The name of the database, or None to open a private in memory database.
+            mode (str): "rw" to open an existing database, or "rwc" to create it if needed.
+
+        Returns:
+            sqlite3.Connection: The connection.
+
+        Raises:
+            sqlite3.OperationalError: If the database does not exist.
+        """
+        if name is None:
+            uri = "file::memory:"
+        else:
+            with self.__lock:
+                if self.__directory is None and name not in self.__memory_databases:
+                    raise sqlite3.OperationalError("Unknown database '" + name + "'.")
+            uri = self.__get_uri(name, mode)
+
+        connection = sqlite3.connect(uri, timeout=self.__timeout, uri=True,
+                                     detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    ################################################################################################
+    def connect(self):
+        """ See Backend.connect. """
+        connection = SQLiteConnection(self)
+        with self.__lock:
+            self.__connections.add(connection)
+        return connection
+
+    ################################################################################################
+    def get_all_databases(self, execute):
+        """ See Backend.get_all_databases. """
+        if self.__directory is None:
+            with self.__lock:
+                return sorted(self.__memory_databases)
+
+        if not os.path.isdir(self.__directory):
+            return []
+        return sorted(file_name[:-len(".sqlite3")] for file_name in os.listdir(self.__directory)
+                      if file_name.endswith(".sqlite3"))
+
+    ################################################################################################
+    def create_database(self, execute, name):
+        """ See Backend.create_database. """
+        if name in self.get_all_databases(execute):
+            raise sqlite3.OperationalError("Can't create database '" + name + "'; database "
+                                           "exists.")
+
+        if self.__directory is None:
+            connection = sqlite3.connect(self.__get_uri(name, "rwc"), uri=True,
+                                         check_same_thread=False)
+            with self.__lock:
+                self.__memory_databases[name] = connection
+        else:
+            if not os.path.isdir(self.__directory):
+                os.makedirs(self.__directory)
+            connection = self.open(name, "rwc")
+            # Readers do not block the writer, and the writer does not block readers.
+            connection.execute("PRAGMA journal_mode = WAL").close()
+            connection.close()
+
+    ################################################################################################
+    def drop_database(self, execute, name):
+        """ See Backend.drop_database. The connections still using the database are switched away
+        from it, so none of them can be in use by another thread, see
+        DatabaseConnector.drop_database. """
+        if name not in self.get_all_databases(execute):
+            raise sqlite3.OperationalError("Can't drop database '" + name + "'; database doesn't "
+                                           "exist.")
+
+        # Nothing can be left connected, otherwise an in memory database would live on and a file
+        # would be deleted from underneath its connections.
+        with self.__lock:
+            connections = [connection for connection in self.__connections
+                           if connection.database == name]
+        for connection in connections:
+            connection.select_db(None)
+
+        if self.__directory is None:
+            with self.__lock:
+                self.__memory_databases.pop(name).close()
+        else:
+            path = os.path.join(self.__directory, name + ".sqlite3")
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    ################################################################################################
+    def get_columns(self, execute, table_name):
+        """ See Backend.get_columns. """
+        return [row[1] for row in execute("PRAGMA table_info(`%s`)" % table_name).fetchall()]
+
+    ################################################################################################
+    def get_tables(self, execute):
+        """ See Backend.get_tables. """
+        return [row[0] for row in execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                .fetchall()]
+
+    ################################################################################################
+    def upsert(self, table_name, columns, key_columns):
+        """ See Backend.upsert. The row is replaced, so every column in the table must be set. """
+        return "INSERT OR REPLACE INTO `%s` (%s) VALUES (%s)" % (
+            table_name, ", ".join("`" + column + "`" for column in columns),
+            ", ".join(["%s"] * len(columns)))
@@ -1,13 +1,23 @@
 from configuration import settings
 
+import collections
+import contextlib
 import copy
 import datetime
-from passlib.hash import pbkdf2_sha256
+import functools
 import re
 import sys
+import threading
 import time
 import uuid
 
+from database import access_cache
+from database import histogram
+from database import leaderboard
+from database import passwords
+from database import results
+from database import versions
+from database.backends import mysql
 from handlers import update
 
 sys.path.append('..')
@@ -16,6 +26,30 @@ sys.path.append('..')
 database. """
 __author__ = "Thomas Reeve"
 
+logger = settings.setup_custom_logger(__name__)
+
+# The names of the events sent to the other processes, see DatabaseConnector.__init__.
+INVALIDATE_USER_EVENT = "invalidate_user"
+BUMP_VERSIONS_EVENT = "bump_versions"
+
+
+####################################################################################################
+def validate_scores(scores):
+    """ Checks the scores of an update are valid.
+
+    Args:
+        scores (list(tuple)): The entry ID and score of each update.
+
+    Raises:
+        ValueError: If a score is not in the correct range or an entry ID is invalid.
+    """
+    for entry_id, score in scores:
+        if score < 0 or score > settings.MAXIMUM_SCORE:
+            raise ValueError("Score " + str(score) + " not in [0," + str(settings.MAXIMUM_SCORE) +
+                             "].")
+        elif entry_id not in settings.country_codes:
+            raise ValueError("Entry ID is invalid.")
+
 
 ####################################################################################################
 class InvalidAccessTokenException(Exception):
@@ -32,21 +66,59 @@ class InvalidAccessTokenException(Exception):
 
 ####################################################################################################
 class DatabaseConnector(object):
-    """ DatabaseConnector objects are used to interact with databases. It uses a mysql connect
-    object to do this. Methods in this class are mostly helper methods, if you want to contrust your
-    own SQL query strings, with arguments, use the sql_query method. """
+    """ DatabaseConnector objects are used to interact with databases. It uses a pool of connect
+    objects to do this, and a backend for the statements that differ between database servers.
+    Methods in this class are mostly helper methods, if you want to contrust your own SQL query
+    strings, with arguments, use the sql_query method. """
     ################################################################################################
-    def __init__(self, mysql_connection):
+    def __init__(self, connection_pool, access_token_cache=None, backend=None, broker=None,
+                 boot_id=None):
         """ Constructor.
         
         Args:
-            mysql_connection: MySQL connection object.
+            connection_pool (pool.ConnectionPool): Pool of connection objects opened by the
+            backend.
+            access_token_cache (access_cache.AccessTokenCache): Used to look up the username for an
+            access token without querying the database. If None access tokens are not cached.
+            backend (base.Backend): The database backend. If None the MySQL server in the settings
+            is used.
+            broker (broker.Broker): Used to keep the access token cache and ETag versions of other
+            processes up to date, when requests are served by several processes. The results
+            aggregate must not be loaded in that case.
+            boot_id (str): The ID in the ETags, which must be shared by every process, see
+            versions.UserVersions. If None a new ID is generated.
         """
-        self.__mysql_connection = mysql_connection
+        self.__connection_pool = connection_pool
+        self.__backend = backend or mysql.MySQLBackend(settings.DATABASE_HOST,
+                                                       settings.DATABASE_USER,
+                                                       settings.DATABASE_PASSWORD)
+        self.__access_token_cache = access_token_cache or access_cache.AccessTokenCache(0)
+        self.__results_aggregate = None
+        self.__versions = versions.UserVersions(boot_id)
+        # Reading a score, updating it and updating the results aggregate must happen together for a
+        # user, otherwise two updates for the same entry could both move the old score. The locks
+        # are striped by username so different users do not wait for each other.
+        self.__score_locks = [threading.Lock() for _ in range(16)]
+        # The transaction the current thread is in, see transaction.
+        self.__local = threading.local()
+        self.__commit_count_lock = threading.Lock()
+        self.__commit_count = 0
+        # How long execute takes, including waiting for a connection and retrying.
+        self.__query_times = histogram.Histogram()
+
+        self.__broker = broker
+        if broker is not None:
+            broker.subscribe(INVALIDATE_USER_EVENT, self.__access_token_cache.invalidate_user)
+            broker.subscribe(BUMP_VERSIONS_EVENT, self.__versions.bump)
+            broker.add_resynchronise_callback(self.__access_token_cache.clear)
+            broker.add_resynchronise_callback(self.__versions.reset)
 
     ################################################################################################
     def execute(self, *args, **kwargs):
-        """ Calls the execute method directly on the MySQL connection object.
+        """ Calls the execute method on a MySQL connection object taken from the pool. If the
+        connection to the server has been lost the statement is retried once on a new connection.
+        Inside a transaction the statement is run on the transaction's connection and is not
+        committed or retried.
 
         Args:
             *args: Variable length argument list.
@@ -55,11 +127,154 @@ class DatabaseConnector(object):
         Returns:
             MySQLCursor: The MySQL cursor.
         """
-        cursor = self.__mysql_connection.cursor()
-        cursor.execute(*args, **kwargs)
-        self.__mysql_connection.commit()
-        return cursor
+        start_time = time.perf_counter()
+        try:
+            return self.__execute(*args, **kwargs)
+        finally:
+            self.__query_times.observe(time.perf_counter() - start_time)
+
+    ################################################################################################
+    def __execute(self, *args, **kwargs):
+        """ Executes a statement, see execute. """
+        current_transaction = getattr(self.__local, "transaction", None)
+        if current_transaction is not None:
+            cursor = current_transaction["connection"].cursor()
+            cursor.execute(*args, **kwargs)
+            return cursor
+
+        retried = False
+        while True:
+            try:
+                with self.__connection_pool.connection() as mysql_connection:
+                    cursor = mysql_connection.cursor()
+                    cursor.execute(*args, **kwargs)
+                    mysql_connection.commit()
+                    self.__count_commit()
+                    return cursor
+            except Exception as error:
+                if retried or not self.__backend.is_connection_lost_error(error):
+                    raise
+                logger.warning("Lost connection to the database, reconnecting: " + str(error))
+                retried = True
+
+    ################################################################################################
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Context manager that runs every statement executed by the current thread on one
+        connection and commits them together on exit. If an exception is raised the statements are
+        rolled back instead. A transaction started inside another transaction joins it, so nothing
+        is committed until the outermost transaction exits.
+
+        Callbacks registered with after_commit are run once the transaction has been committed.
+        """
+        if getattr(self.__local, "transaction", None) is not None:
+            yield
+            return
+
+        with self.__connection_pool.connection() as mysql_connection:
+            self.__local.transaction = {"connection": mysql_connection, "after_commit": []}
+            try:
+                yield
+                mysql_connection.commit()
+            except Exception:
+                try:
+                    mysql_connection.rollback()
+                except Exception:
+                    # The connection is most likely dead, in which case the server rolls back.
+                    pass
+                raise
+            finally:
+                callbacks = self.__local.transaction["after_commit"]
+                self.__local.transaction = None
+
+        self.__count_commit()
+        for callback in callbacks:
+            callback()
+
+    ################################################################################################
+    def after_commit(self, callback):
+        """ Runs a callback once the current transaction has been committed, or straight away if the
+        current thread is not in a transaction. Used to update in memory state, such as the results
+        aggregate, only once the database has changed.
+
+        Args:
+            callback: Callable that takes no arguments.
+        """
+        current_transaction = getattr(self.__local, "transaction", None)
+        if current_transaction is not None:
+            current_transaction["after_commit"].append(callback)
+        else:
+            callback()
+
+    ################################################################################################
+    def __count_commit(self):
+        """ Increments the number of commits. """
+        with self.__commit_count_lock:
+            self.__commit_count += 1
+
+    ################################################################################################
+    def get_commit_count(self):
+        """ Gets the number of commits made since the connector was created.
+
+        Returns:
+            int: The number of commits.
+        """
+        with self.__commit_count_lock:
+            return self.__commit_count
+
+    ################################################################################################
+    def get_query_statistics(self):
+        """ Gets how long statements have taken to execute since the connector was created.
+
+        Returns:
+            dict: The statistics, see histogram.Histogram.get_snapshot.
+        """
+        return self.__query_times.get_snapshot()
+
+    ################################################################################################
+    def get_pool_statistics(self):
+        """ Gets statistics about the connection pool.
+
+        Returns:
+            dict: The statistics, see pool.ConnectionPool.get_statistics.
+        """
+        return self.__connection_pool.get_statistics()
     
+    ################################################################################################
+    def get_etag(self, username, resource):
+        """ Gets the ETag for the current version of a user's resource, without reading the
+        database.
+
+        Args:
+            username (str): The user's username.
+            resource (str): The resource, versions.ENTRIES or versions.SETTINGS.
+
+        Returns:
+            str: The ETag.
+        """
+        return self.__versions.get_etag(username, resource)
+
+    ################################################################################################
+    def get_cached_username(self, access_token):
+        """ Gets the username from the access token if it is cached.
+
+        Args:
+            access_token (str): The user's access token.
+
+        Returns:
+            str: The user's username, or None if the access token is not cached.
+        """
+        return self.__access_token_cache.get(access_token)
+
+    ################################################################################################
+    def get_access_token_cache_statistics(self):
+        """ Gets statistics about the access token cache.
+
+        Returns:
+            dict: See AccessTokenCache.get_statistics.
+        """
+        return self.__access_token_cache.get_statistics()
+
     ################################################################################################
     def get_current_database(self):
         """ Get the name of the current database.
@@ -67,8 +282,7 @@ class DatabaseConnector(object):
         Returns:
             str: The current database.
         """
-        cursor = self.execute("SELECT DATABASE()")
-        return cursor.fetchone()[0]
+        return self.__backend.get_current_database(self.execute)
 
     ################################################################################################
     def get_all_databases(self):
@@ -77,11 +291,7 @@ class DatabaseConnector(object):
         Returns:
             list(str): The names of all the databases.
         """
-        cursor = self.execute("SHOW DATABASES")
-        databases = []
-        for row in cursor.fetchall():
-            databases.append(row[0])
-        return databases
+        return self.__backend.get_all_databases(self.execute)
 
     ################################################################################################
     def does_database_exist(self, name):
@@ -103,16 +313,25 @@ class DatabaseConnector(object):
         Args:
             name (str): The name of the new database.
         """
-        self.execute("CREATE DATABASE %s" % name)
+        self.__backend.create_database(self.execute, name)
 
     ################################################################################################
     def drop_database(self, name):
-        """ Drops a database with name.
+        """ Drops a database with name. Waits for the other threads to release their connections
+        first, and holds up their queries until the database has been dropped, as the backend may
+        switch the idle connections away from the database.
 
         Args:
             name (str): The name of the database to drop.
+
+        Raises:
+            ConnectionPoolTimeoutException: If the other threads did not release their connections
+            in time.
         """
-        self.execute("DROP DATABASE `%s`" % name)
+        with self.__connection_pool.exclusive():
+            self.__backend.drop_database(self.execute, name)
+            if name == self.__connection_pool.get_database():
+                self.__connection_pool.use_database(None)
 
     ################################################################################################
     def use_database(self, name):
@@ -121,7 +340,9 @@ class DatabaseConnector(object):
         Args:
             name (str): The name of the database to use.
         """
-        self.execute("USE `%s`" % name)
+        self.__backend.use_database(self.execute, name)
+        # Every other connection in the pool needs to use the database as well.
+        self.__connection_pool.use_database(name)
 
     ################################################################################################
     def create_users_table(self):
@@ -132,7 +353,7 @@ class DatabaseConnector(object):
             password VARCHAR(%s) NOT NULL,
             refresh_token VARCHAR(%s) NULL,
             refresh_token_expiry DATETIME NULL,
-            activated BOOLEAN NOT NULL DEFAULT FALSE,
+            activated BOOLEAN NOT NULL DEFAULT 0,
             theme VARCHAR(%s) NOT NULL DEFAULT 'ocean',
             PRIMARY KEY (username)
             )
@@ -159,26 +380,71 @@ class DatabaseConnector(object):
         self.execute(command)
 
     ################################################################################################
-    def create_scores_table(self, columns):
-        """ Creates the scores table.
-        
-        Args:
-            columns: Sequence of strings that are the column names.
+    def create_scores_table(self):
+        """ Creates the scores table, which has a row for every score a user has given an entry. If
+        there is no row for a user and entry the user has not scored the entry yet (a score of -1).
         """
-
-        columns_string = ''.join("`" + c + "` INT NOT NULL DEFAULT -1," for c in columns)
-
         command = """
             CREATE TABLE scores (
             username VARCHAR(%s) NOT NULL,
-            %s
-            PRIMARY KEY (username),
+            entry_id VARCHAR(%s) NOT NULL,
+            score INT NOT NULL,
+            PRIMARY KEY (username, entry_id),
             FOREIGN KEY (username) REFERENCES users(username)
             )
         """ % (settings.MAX_USERNAME_LENGTH,
-               columns_string)
+               settings.ENTRY_ID_LENGTH)
         self.execute(command)
 
+        # Used to count the results for an entry.
+        self.execute("CREATE INDEX scores_entry_id_score ON scores (entry_id, score)")
+
+    ################################################################################################
+    def migrate_scores_table(self):
+        """ Migrates a scores table with a column per entry (the layout used by older versions) to
+        a table with a row per score. Scores of -1 are not copied as they mean the user has not
+        scored the entry. Nothing is done if the table has already been migrated.
+
+        The old table is renamed to scores_by_column and dropped once its scores have been copied.
+        MySQL commits each change to a table's layout straight away, so the migration cannot be
+        done in one transaction. Instead, if scores_by_column is left over from a migration that
+        stopped part way through, the scores copied so far are thrown away and the copy is started
+        again.
+
+        Returns:
+            bool: True if the table was migrated, False otherwise.
+        """
+        tables = self.__backend.get_tables(self.execute)
+
+        if "scores_by_column" in tables:
+            logger.warning("Resuming a migration of the scores table that did not finish.")
+            # The server does not start until the migration has finished, so the new table only
+            # has the scores copied so far.
+            if "scores" in tables:
+                self.execute("DROP TABLE scores")
+            columns = self.__backend.get_columns(self.execute, "scores_by_column")
+        else:
+            columns = self.__backend.get_columns(self.execute, "scores")
+            if "entry_id" in columns:
+                return False
+            self.execute("ALTER TABLE scores RENAME TO scores_by_column")
+
+        entry_ids = [column for column in columns if column != "username"]
+        logger.info("Migrating the scores table for entries: " + ", ".join(entry_ids))
+
+        self.create_scores_table()
+
+        for entry_id in entry_ids:
+            # The column names come from the table so they are safe to inject.
+            insert_command = "INSERT INTO scores (username, entry_id, score) " \
+                             "SELECT username, %s, `" + entry_id + "` FROM scores_by_column " \
+                             "WHERE `" + entry_id + "` <> -1"
+            insert_params = (entry_id, )
+            self.execute(insert_command, insert_params)
+
+        self.execute("DROP TABLE scores_by_column")
+        return True
+
     ################################################################################################
     def user_exists(self, username):
         """ Checks the users table to see if the user exists.
@@ -231,8 +497,7 @@ class DatabaseConnector(object):
         Returns:
            The salted and hashed password.
         """
-        return pbkdf2_sha256.using(rounds=settings.PASSWORD_SALTING_ROUNDS,
-                                   salt_size=settings.PASSWORD_SALTING_SIZE).hash(password)
+        return passwords.hash_password(password)
 
     ################################################################################################
     @staticmethod
@@ -303,31 +568,72 @@ class DatabaseConnector(object):
         return valid, invalid_message
 
     ################################################################################################
-    def register_user(self, username, password):
-        """ Registers the user. Rows are added to the users, scores and access tables.
-        
+    def check_new_user(self, username, password):
+        """ Checks a user can be registered, before their password is hashed.
+
         Args:
             username (str): The user's username.
             password (str): The user's password.
 
         Raises:
-            LookupError: If the user does not exist.
+            LookupError: If the user already exists.
             ValueError: If the username and/or password is invalid.
         """
-
         if self.user_exists(username):
             raise LookupError("User: '" + username + "' already exists.")
-        else:
-            valid, message = DatabaseConnector.is_username_and_password_valid(username, password)
-            if valid:
-                self.__insert_user(username, password)
-                self.__insert_scores(username)
-            else:
-                raise ValueError(message)
+        valid, message = DatabaseConnector.is_username_and_password_valid(username, password)
+        if not valid:
+            raise ValueError(message)
+
+    ################################################################################################
+    def register_user(self, username, password, password_hash=None):
+        """ Registers the user. Rows are added to the users and access tables.
+        
+        Args:
+            username (str): The user's username.
+            password (str): The user's password.
+            password_hash (str): The password already salted and hashed, e.g. by
+            passwords.PasswordHasher on the IOLoop. If None the password is hashed on the calling
+            thread.
+
+        Raises:
+            LookupError: If the user already exists.
+            ValueError: If the username and/or password is invalid.
+        """
+        self.check_new_user(username, password)
+        if password_hash is None:
+            password_hash = passwords.hash_password(password)
+
+        with self.transaction():
+            self.__insert_user(username, password_hash)
+            if self.__results_aggregate is not None:
+                self.after_commit(self.__results_aggregate.add_user)
+            # A user with the same name may have been deleted.
+            self.after_commit(functools.partial(self.__bump_versions, username,
+                                                versions.ENTRIES, versions.SETTINGS))
+
+    ################################################################################################
+    def get_password_hash(self, username):
+        """ Gets the user's salted and hashed password, to verify the password they log in with.
+
+        Args:
+            username (str): The user's username.
+
+        Returns:
+            str: The salted and hashed password.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        try:
+            return self.__get_tokens(username)["password"]
+        except LookupError:
+            # We want to make the message more generic to follow OWASP guidelines.
+            raise ValueError("Cannot login. Username/password is incorrect.")
 
     ################################################################################################
     def login_user(self, username, password):
-        """ Logs the user in.
+        """ Logs the user in. The password is verified on the calling thread.
 
         Args:
             username (str): The user's username.
@@ -337,42 +643,62 @@ class DatabaseConnector(object):
             ValueError: If the username and/or password is invalid.
         """
         try:
-            refresh_token, _ = self.__get_refresh_token_and_expiry(username)
+            tokens = self.__get_tokens(username)
         except LookupError:
             # We want to make the message more generic to follow OWASP guidelines.
             raise ValueError("Cannot login. Username/password is incorrect.")
+        if not passwords.verify_password(password, tokens["password"]):
+            raise ValueError("Cannot login. Username/password is incorrect.")
+        self.__login(username, tokens)
 
-        select_command = """
-            SELECT password FROM users WHERE username = %s
+    ################################################################################################
+    def login_verified_user(self, username):
+        """ Logs in a user whose password has been verified, e.g. by passwords.PasswordHasher on
+        the IOLoop.
+
+        Args:
+            username (str): The user's username.
+
+        Raises:
+            ValueError: If the user does not exist.
         """
-        select_params = (username, )
-        cursor = self.execute(select_command, select_params)
-        database_password = cursor.fetchone()[0]
-        if not pbkdf2_sha256.verify(password, database_password):
+        try:
+            tokens = self.__get_tokens(username)
+        except LookupError:
             raise ValueError("Cannot login. Username/password is incorrect.")
-        else:
+        self.__login(username, tokens)
+
+    ################################################################################################
+    def __login(self, username, tokens):
+        """ Gives a user whose password has been verified an access token, or extends it.
+
+        Args:
+            username (str): The user's username.
+            tokens (dict): The user's tokens and their expiries, see __get_tokens.
+        """
+        with self.transaction():
+            refresh_token, _ = self.__get_refresh_token_and_expiry(username, tokens)
             if refresh_token is None:
                 # The only way we should be able to get in here is if the refresh token expired.
                 # In the future we might want to check the user has been sending valid requests.
                 # For now just reactivate the user.
                 self.activate_user(username)
             else:
-                access_token, _ = self.__get_access_token_and_expiry(username)
+                access_token, _ = self.__get_access_token_and_expiry(username, tokens)
                 if access_token is None:
-                    self.insert_access(username)
-                    access_token, _ = self.__get_access_token_and_expiry(username)
-                self.extend_access_expiry(username, access_token)
+                    # A new access token is given the extended expiry.
+                    self.__insert_access(username, tokens)
+                else:
+                    self.__extend_access_expiry(username, tokens)
 
     ################################################################################################
-    def __insert_user(self, username, password):
+    def __insert_user(self, username, hashed_and_salted_password):
         """ Inserts the user into the users table.
 
         Args:
             username (str): The user's username.
-            password (str): The user's password.
+            hashed_and_salted_password (str): The user's salted and hashed password.
         """
-        hashed_and_salted_password = DatabaseConnector.hash_and_salt_password(password)
-
         insert_command = """
             INSERT INTO users (username, password)
             VALUES (%s, %s)
@@ -382,28 +708,24 @@ class DatabaseConnector(object):
         self.activate_user(username)
 
     ################################################################################################
-    def __insert_scores(self, username):
-        """ Inserts a scores row to the scores table, all of the scores will be initialised to -1.
+    def insert_access(self, username):
+        """ Inserts an access row to the access table.
 
         Args:
-             username (str): The user's username.
-        """
-        insert_command = """
-            INSERT INTO scores (username)
-            VALUES (%s)
+            username (str): The user's username.
         """
-        insert_params = (username, )
-        self.execute(insert_command, insert_params)
+        self.__insert_access(username, self.__get_tokens(username))
 
     ################################################################################################
-    def insert_access(self, username):
+    def __insert_access(self, username, tokens):
         """ Inserts an access row to the access table.
 
         Args:
             username (str): The user's username.
+            tokens (dict): The user's tokens, as returned by __get_tokens.
         """
         access_token = DatabaseConnector.generate_token()
-        access_token_expiry = self.__calculate_access_expiry(username)
+        access_token_expiry = self.__calculate_access_expiry(username, tokens)
 
         insert_command = """
             INSERT INTO access (access_token, access_token_expiry, username)
@@ -423,12 +745,20 @@ class DatabaseConnector(object):
             LookupError: If the user does not exist.
         """
 
-        if not self.user_exists(username):
-            raise LookupError("User: '" + username + "' does not exist.")
-        else:
+        # The score lock is held until the results aggregate has been updated after the commit.
+        with self.__get_score_lock(username), self.transaction():
+            if not self.user_exists(username):
+                raise LookupError("User: '" + username + "' does not exist.")
+
             self.delete_access(username)
+            user_scores = self.__get_user_scores(username)
             self.__delete_scores(username)
             self.__delete_user(username)
+            if self.__results_aggregate is not None:
+                self.after_commit(functools.partial(self.__results_aggregate.remove_user,
+                                                    user_scores))
+            self.after_commit(functools.partial(self.__bump_versions, username, versions.ENTRIES,
+                                                versions.SETTINGS))
 
     ################################################################################################
     def __delete_user(self, username):
@@ -455,11 +785,45 @@ class DatabaseConnector(object):
         """
         delete_params = (username, )
         self.execute(delete_command, delete_params)
-        update.close_connections(username=username, reason="Session Expired")
+        self.after_commit(functools.partial(self.__close_access, username))
+
+    ################################################################################################
+    def __invalidate_cached_tokens(self, username):
+        """ Forgets the user's cached access tokens, in every process.
+
+        Args:
+            username (str): The user's username.
+        """
+        self.__access_token_cache.invalidate_user(username)
+        if self.__broker is not None:
+            self.__broker.publish(INVALIDATE_USER_EVENT, username)
+
+    ################################################################################################
+    def __bump_versions(self, username, *resources):
+        """ Increments the versions of the user's resources, in every process.
+
+        Args:
+            username (str): The user's username.
+            *resources: The resources that have changed.
+        """
+        self.__versions.bump(username, *resources)
+        if self.__broker is not None:
+            self.__broker.publish(BUMP_VERSIONS_EVENT, username, *resources)
+
+    ################################################################################################
+    def __close_access(self, username):
+        """ Forgets the user's cached access tokens and closes their websockets, once their access
+        row has been deleted.
+
+        Args:
+            username (str): The user's username.
+        """
+        self.__invalidate_cached_tokens(username)
+        update.close_connections_threadsafe(username=username, reason="Session Expired")
 
     ################################################################################################
     def __delete_scores(self, username):
-        """ Deletes an access row from the access table.
+        """ Deletes the user's rows from the scores table.
 
         Args:
             username (str): The user's username.
@@ -472,7 +836,8 @@ class DatabaseConnector(object):
 
     ################################################################################################
     def get_username(self, access_token):
-        """ Gets the username from the access token.
+        """ Gets the username from the access token. The username is cached until the access token
+        expires, or the user's access is changed or deleted.
 
         Args:
             access_token (str): The user's access token.
@@ -483,8 +848,13 @@ class DatabaseConnector(object):
         Raises:
             InvalidAccessTokenException: If access token does not exist.
         """
+        username = self.__access_token_cache.get(access_token)
+        if username is not None:
+            return username
+
+        generation = self.__access_token_cache.get_generation()
         select_command = """
-            SELECT `username` FROM access WHERE `access_token` = %s
+            SELECT `username`, `access_token_expiry` FROM access WHERE `access_token` = %s
         """
         select_params = (access_token, )
         cursor = self.execute(select_command, select_params)
@@ -492,31 +862,110 @@ class DatabaseConnector(object):
         rows = cursor.fetchall()
 
         if len(rows) == 1:
-            return rows[0][0]
+            username, access_token_expiry = rows[0]
+            self.__access_token_cache.put(access_token, username, access_token_expiry, generation)
+            return username
         else:
             raise InvalidAccessTokenException("Access token is invalid.")
 
     ################################################################################################
-    def update_score(self, access_token, column, score):
+    def update_score(self, access_token, entry_id, score):
         """ Update the score in the scores table.
 
         Args:
             access_token (str): The user's access token.
-            column (str): The name of the column to update in the scores table.
+            entry_id (str): The ID of the entry to update the score for.
             score (int): The score.
 
         Raises:
             Exception: If the access token is invalid.
-            ValueError: If the score is not in the correct range.
+            ValueError: If the score is not in the correct range or the entry ID is invalid.
+        """
+        self.update_scores(access_token, [(entry_id, score)])
+
+    ################################################################################################
+    def update_scores(self, access_token, scores):
+        """ Update several scores in the scores table, in one transaction. Nothing is updated if any
+        of the scores are invalid.
+
+        Args:
+            access_token (str): The user's access token.
+            scores (list(tuple)): The entry ID and score of each update. If an entry is given more
+            than once the last score is used.
+
+        Raises:
+            Exception: If the access token is invalid.
+            ValueError: If a score is not in the correct range or an entry ID is invalid.
         """
         username = self.get_username(access_token)
-        if score < 0 or score > settings.MAXIMUM_SCORE:
-            raise ValueError("Score " + str(score) + " not in [0," + str(settings.MAXIMUM_SCORE) +
-                             "].")
-        else:
-            update_command = 'UPDATE scores SET `' + column + '` = %s WHERE username = %s'
-            update_params = (score, username)
-            self.execute(update_command, update_params)
+        validate_scores(scores)
+        new_scores = collections.OrderedDict(scores)
+
+        # The score lock is held until the results aggregate has been updated after the commit.
+        with self.__get_score_lock(username), self.transaction():
+            if self.__results_aggregate is not None:
+                if len(new_scores) == 1:
+                    entry_id = next(iter(new_scores))
+                    old_scores = {entry_id: self.__get_score(username, entry_id)}
+                else:
+                    old_scores = self.__get_user_scores(username)
+
+            update_command = self.__backend.upsert("scores", ("username", "entry_id", "score"),
+                                                   ("username", "entry_id"))
+            for entry_id, score in new_scores.items():
+                update_params = (username, entry_id, score)
+                self.execute(update_command, update_params)
+
+            if self.__results_aggregate is not None:
+                for entry_id, score in new_scores.items():
+                    self.after_commit(functools.partial(self.__results_aggregate.change_score,
+                                                        entry_id, old_scores.get(entry_id, -1),
+                                                        score))
+            self.after_commit(functools.partial(self.__bump_versions, username,
+                                                versions.ENTRIES))
+
+    ################################################################################################
+    def __get_score_lock(self, username):
+        """ Gets the lock that must be held while changing the user's scores.
+
+        Args:
+            username (str): The user's username.
+
+        Returns:
+            threading.Lock: The lock.
+        """
+        return self.__score_locks[hash(username) % len(self.__score_locks)]
+
+    ################################################################################################
+    def __get_score(self, username, entry_id):
+        """ Gets the score the user has given an entry.
+
+        Args:
+            username (str): The user's username.
+            entry_id (str): The ID of the entry.
+
+        Returns:
+            int: The score, -1 if the user has not scored the entry.
+        """
+        select_command = "SELECT score FROM scores WHERE username = %s AND entry_id = %s"
+        select_params = (username, entry_id)
+        row = self.execute(select_command, select_params).fetchone()
+        return -1 if row is None else row[0]
+
+    ################################################################################################
+    def __get_user_scores(self, username):
+        """ Gets the scores the user has given entries.
+
+        Args:
+            username (str): The user's username.
+
+        Returns:
+            dict: Dictionary of entry ID to score. Entries the user has not scored are missing.
+        """
+        select_command = "SELECT entry_id, score FROM scores WHERE username = %s"
+        select_params = (username, )
+        cursor = self.execute(select_command, select_params)
+        return dict(cursor.fetchall())
 
     ################################################################################################
     def get_access_information(self, username):
@@ -533,8 +982,9 @@ class DatabaseConnector(object):
                 "refresh_token": <UUID string>
             }
         """
-        refresh_token, _ = self.__get_refresh_token_and_expiry(username)
-        access_token, access_token_expiry = self.__get_access_token_and_expiry(username)
+        tokens = self.__get_tokens(username)
+        refresh_token, _ = self.__get_refresh_token_and_expiry(username, tokens)
+        access_token, access_token_expiry = self.__get_access_token_and_expiry(username, tokens)
 
         return {
             "access_token": str(access_token),
@@ -544,77 +994,98 @@ class DatabaseConnector(object):
         }
 
     ################################################################################################
-    def __get_access_token_and_expiry(self, username):
-        """ Gets the access token and access token's expiry for the user.
+    def __get_tokens(self, username):
+        """ Gets the user's password, refresh token and access token with a single query. Every
+        token check starts from this rather than querying the users and access tables separately.
 
         Args:
             username (str): The user's username.
 
+        Returns:
+            dict: Dictionary containing the "password", "refresh_token", "refresh_token_expiry",
+            "access_token" and "access_token_expiry". The tokens and expiries are None if the user
+            does not have them.
+
         Raises:
             LookupError: If the user does not exist.
             Exception: If the account has been deactivated.
         """
-        if not self.user_exists(username):
+        select_command = """
+            SELECT users.activated, users.password, users.refresh_token,
+                   users.refresh_token_expiry, access.access_token, access.access_token_expiry
+            FROM users LEFT JOIN access ON access.username = users.username
+            WHERE users.username = %s
+        """
+        select_params = (username, )
+        cursor = self.execute(select_command, select_params)
+
+        row = cursor.fetchone()
+
+        if row is None:
             raise LookupError("User: '" + username + "' does not exist.")
-        elif not self.is_user_activated(username):
+        elif not row[0]:
             raise Exception("Account has been deactivated.")
-        else:
-            select_command = """
-                SELECT `access_token`, `access_token_expiry` FROM access WHERE username = %s
-            """
-            select_params = (username, )
-            cursor = self.execute(select_command, select_params)
 
-            rows = cursor.fetchall()
+        return {
+            "password": row[1],
+            "refresh_token": row[2],
+            "refresh_token_expiry": row[3],
+            "access_token": row[4],
+            "access_token_expiry": row[5]
+        }
 
-            if len(rows) == 1:
-                token = rows[0][0]
-                token_expiry = rows[0][1]
+    ################################################################################################
+    def __get_access_token_and_expiry(self, username, tokens):
+        """ Gets the access token and access token's expiry for the user. The access row is deleted
+        if the access token has expired.
 
-                if datetime.datetime.now() < token_expiry:
-                    return token, token_expiry
-                else:
-                    self.delete_access(username)
+        Args:
+            username (str): The user's username.
+            tokens (dict): The user's tokens, as returned by __get_tokens.
+
+        Returns:
+            tuple(str, datetime): The access token and the expiry, or None and None if the user
+            does not have a valid access token.
+        """
+        token = tokens["access_token"]
+        token_expiry = tokens["access_token_expiry"]
+
+        if token is not None:
+            if datetime.datetime.now() < token_expiry:
+                return token, token_expiry
+            else:
+                self.delete_access(username)
+                tokens["access_token"] = tokens["access_token_expiry"] = None
 
         return None, None
 
     ################################################################################################
-    def __get_refresh_token_and_expiry(self, username):
-        """ Gets the refresh token and refresh token's expiry for the user.
+    def __get_refresh_token_and_expiry(self, username, tokens):
+        """ Gets the refresh token and refresh token's expiry for the user. The refresh data and
+        access row are deleted if the refresh token has expired.
 
         Args:
             username (str): The user's username.
+            tokens (dict): The user's tokens, as returned by __get_tokens.
 
         Returns:
-            tuple(str, datetime): The refresh token and the expiry.
-
-        Raises:
-            LookupError: If the user does not exist.
-            Exception: If the account has been deactivated.
+            tuple(str, datetime): The refresh token and the expiry, or None and None if the user
+            does not have a valid refresh token.
         """
+        token = tokens["refresh_token"]
+        token_expiry = tokens["refresh_token_expiry"]
 
-        if not self.user_exists(username):
-            raise LookupError("User: '" + username + "' does not exist.")
-        elif not self.is_user_activated(username):
-            raise Exception("Account has been deactivated.")
+        if token_expiry is None:
+            return None, None
+        elif datetime.datetime.now() < token_expiry:
+            return token, token_expiry
         else:
-            select_command = """
-                SELECT `refresh_token`, `refresh_token_expiry` FROM users WHERE username = %s
-            """
-            select_params = (username, )
-            cursor = self.execute(select_command, select_params)
-
-            rows = cursor.fetchall()
-
-            token = rows[0][0]
-            token_expiry = rows[0][1]
-
-            if datetime.datetime.now() < token_expiry:
-                return token, token_expiry
-            else:
-                self.delete_access(username)
-                self.remove_refresh_data(username)
-                return None, None
+            self.delete_access(username)
+            self.remove_refresh_data(username)
+            for key in ("refresh_token", "refresh_token_expiry", "access_token",
+                        "access_token_expiry"):
+                tokens[key] = None
+            return None, None
 
     ################################################################################################
     def __is_token_valid(self, username, token_type, expected_token):
@@ -630,10 +1101,11 @@ class DatabaseConnector(object):
         """
         valid = True
 
+        tokens = self.__get_tokens(username)
         if token_type == "Access":
-            token, token_expiry = self.__get_access_token_and_expiry(username)
+            token, token_expiry = self.__get_access_token_and_expiry(username, tokens)
         elif token_type == "Refresh":
-            token, token_expiry = self.__get_refresh_token_and_expiry(username)
+            token, token_expiry = self.__get_refresh_token_and_expiry(username, tokens)
 
         if token is None or token != expected_token:
             valid = False
@@ -676,15 +1148,17 @@ class DatabaseConnector(object):
         Raises:
             LookupError: If the user doesn't exist.
         """
-        if not self.user_exists(username):
-            raise LookupError("User: '" + username + "' does not exist.")
-
         select_command = """
             SELECT `activated` FROM users WHERE username = %s
         """
         select_params = (username, )
         cursor = self.execute(select_command, select_params)
-        return cursor.fetchone()[0]
+
+        row = cursor.fetchone()
+
+        if row is None:
+            raise LookupError("User: '" + username + "' does not exist.")
+        return row[0]
 
     ################################################################################################
     def deactivate_user(self, username):
@@ -697,12 +1171,13 @@ class DatabaseConnector(object):
         update_command = 'UPDATE users ' \
                          'SET `refresh_token` = NULL, ' \
                          '    `refresh_token_expiry` = NULL, ' \
-                         '    `activated` = FALSE ' \
+                         '    `activated` = %s ' \
                          'WHERE username = %s'
-        update_params = (username, )
-        self.execute(update_command, update_params)
+        update_params = (False, username)
 
-        self.delete_access(username)
+        with self.transaction():
+            self.execute(update_command, update_params)
+            self.delete_access(username)
 
     ################################################################################################
     def remove_refresh_data(self, username):
@@ -731,25 +1206,27 @@ class DatabaseConnector(object):
         update_command = 'UPDATE users ' \
                          'SET `refresh_token` = %s,' \
                          '    `refresh_token_expiry` = %s, ' \
-                         '    `activated` = TRUE ' \
+                         '    `activated` = %s ' \
                          'WHERE username = %s'
-        update_params = (refresh_token, refresh_token_expiry, username)
-        self.execute(update_command, update_params)
+        update_params = (refresh_token, refresh_token_expiry, True, username)
 
-        self.insert_access(username)
+        with self.transaction():
+            self.execute(update_command, update_params)
+            self.insert_access(username)
 
     ################################################################################################
-    def __calculate_access_expiry(self, username):
+    def __calculate_access_expiry(self, username, tokens):
         """ Calculates the access expiry that should be set in the access table.
 
         Args:
             username (str): The user's username.
+            tokens (dict): The user's tokens, as returned by __get_tokens.
         """
-        refresh_token, refresh_token_expiry = self.__get_refresh_token_and_expiry(username)
+        refresh_token, refresh_token_expiry = self.__get_refresh_token_and_expiry(username, tokens)
         if refresh_token is None:
             raise Exception("Cannot extend access token's expiry as refresh token has expired.")
 
-        _, current_access_token_expiry = self.__get_access_token_and_expiry(username)
+        _, current_access_token_expiry = self.__get_access_token_and_expiry(username, tokens)
 
         expiry = DatabaseConnector.calculate_expiry(settings.ACCESS_EXPIRY_SECONDS)
         datetime_expiry = datetime.datetime.strptime(expiry, settings.DATETIME_FORMAT)
@@ -769,16 +1246,76 @@ class DatabaseConnector(object):
             username (str): The user's username.
             expected_access_token (str): The access token sent by the client.
         """
-        if self.is_access_token_valid(username, expected_access_token):
-            update_command = 'UPDATE access SET `access_token_expiry` = %s WHERE username = %s'
-            update_params = (self.__calculate_access_expiry(username), username)
-            self.execute(update_command, update_params)
+        tokens = self.__get_tokens(username)
+        access_token, _ = self.__get_access_token_and_expiry(username, tokens)
+
+        if access_token is not None and access_token == expected_access_token:
+            self.__extend_access_expiry(username, tokens)
         else:
             raise ValueError("Access token is invalid.")
 
+    ################################################################################################
+    def __extend_access_expiry(self, username, tokens):
+        """ Extends the access token's expiry.
+
+        Args:
+            username (str): The user's username.
+            tokens (dict): The user's tokens, as returned by __get_tokens.
+        """
+        update_command = 'UPDATE access SET `access_token_expiry` = %s WHERE username = %s'
+        update_params = (self.__calculate_access_expiry(username, tokens), username)
+        self.execute(update_command, update_params)
+        self.after_commit(functools.partial(self.__invalidate_cached_tokens, username))
+
+    ################################################################################################
+    def load_results_aggregate(self):
+        """ Counts the results for every entry in settings.country_codes from the scores table and
+        keeps them in memory. From then on generate_results_dictionary does not touch the database
+        and the results are kept up to date as scores change. """
+        # Count from the scores table rather than from the current aggregate.
+        self.__results_aggregate = None
+        self.__results_aggregate = results.ResultsAggregate(
+            self.generate_results_dictionary(settings.country_codes))
+
+    ################################################################################################
+    def is_results_aggregate_loaded(self):
+        """ Checks if the results are being kept in memory, see load_results_aggregate.
+
+        Returns:
+            bool: True if the results are in memory, False otherwise.
+        """
+        return self.__results_aggregate is not None
+
+    ################################################################################################
+    def take_results_changes(self):
+        """ Takes the changes to the results since they were last taken, see
+        results.ResultsAggregate.take_changes. Does not read the database.
+
+        Returns:
+            tuple: The sequence number and list of changes. None if nothing has changed, or if the
+            results aggregate has not been loaded.
+        """
+        if self.__results_aggregate is None:
+            return None
+        return self.__results_aggregate.take_changes()
+
+    ################################################################################################
+    def get_results_snapshot(self):
+        """ Gets the results of every entry, with the sequence number of the last changes taken that
+        they include, see results.ResultsAggregate.get_snapshot.
+
+        Returns:
+            tuple: The sequence number, None if the results aggregate has not been loaded, and the
+            results in the form returned by generate_results_dictionary.
+        """
+        if self.__results_aggregate is not None:
+            return self.__results_aggregate.get_snapshot(settings.country_codes)
+        return None, self.generate_results_dictionary(settings.country_codes)
+
     ################################################################################################
     def generate_results_dictionary(self, columns):
-        """ Generates the results dictionary.
+        """ Generates the results dictionary. If the results aggregate has been loaded the results
+        are taken from memory, otherwise they are counted from the scores table.
 
         Args:
             columns: The columns to get the results for in the scores dictionary.
@@ -794,10 +1331,10 @@ class DatabaseConnector(object):
                 }, ...
             }
         """
-        select_columns = ''.join("`" + c + "`," for c in columns).rstrip(',')
-        select_command = "SELECT " + select_columns + " FROM scores"
-        cursor = self.execute(select_command)
-        rows = cursor.fetchall()
+        if self.__results_aggregate is not None:
+            return self.__results_aggregate.get_results(columns)
+
+        number_of_users = self.execute("SELECT COUNT(*) FROM users").fetchone()[0]
 
         maximum_score = settings.MAXIMUM_SCORE
 
@@ -805,67 +1342,82 @@ class DatabaseConnector(object):
 
         results = dict((column, default_scores()) for column in columns)
 
-        for row in rows:
-            for index, column in enumerate(columns):
-                results[column][row[index]] += 1
+        # Users without a row for an entry have not scored it.
+        for column in columns:
+            results[column][-1] = number_of_users
 
-        return results
+        if len(columns) > 0:
+            # The database counts the scores using the (entry_id, score) index, so only a row per
+            # entry and score is sent back.
+            select_command = "SELECT entry_id, score, COUNT(*) FROM scores WHERE entry_id IN (" + \
+                             ", ".join(["%s"] * len(columns)) + ") GROUP BY entry_id, score"
+            cursor = self.execute(select_command, tuple(columns))
 
-    ################################################################################################
-    def get_entry(self, access_token, entry_id):
-        """ Gets the entry.
+            for entry_id, score, count in cursor.fetchall():
+                results[entry_id][score] = count
+                results[entry_id][-1] -= count
 
-        :param access_token: The access token the client has sent.
-        :type access_token: str
-        :param entry_id: The ID of the entry to get.
-        :type entry_id: str
-        :return The entry.
-        """
-
-        if entry_id not in settings.country_codes:
-            raise ValueError("Entry ID is invalid.")
+        return results
 
-        username = self.get_username(access_token)
+    ################################################################################################
+    def get_leaderboard(self, order=leaderboard.TOTAL, start=0, count=None):
+        """ Gets the entries ranked by their scores. If the results aggregate has been loaded the
+        ranking is kept up to date in memory, otherwise the results are counted from the scores
+        table and ranked.
 
-        entry = next(e for e in settings.entries if e["id"] == entry_id)
-        entry_copy = copy.deepcopy(entry)
+        Args:
+            order (str): Either leaderboard.TOTAL or leaderboard.AVERAGE.
+            start (int): The position of the first entry to get, 0 for the top ranked entry.
+            count (int): The number of entries to get, None for every entry from the start.
 
-        # We are able to inject entry_id directly below as we check it is in the country_codes.
-        select_command = "SELECT `" + entry_id + "` FROM scores WHERE username = %s"
-        select_params = (username, )
-        cursor = self.execute(select_command, select_params)
+        Returns:
+            list: See leaderboard.Leaderboard.get_ranking.
 
-        score = cursor.fetchone()[0]
+        Raises:
+            ValueError: If the order is unknown.
+        """
+        if self.__results_aggregate is not None:
+            return self.__results_aggregate.get_ranking(order, start, count)
 
-        entry["attributes"]["score"] = score
-        return entry
+        if order not in leaderboard.ORDERS:
+            raise ValueError("Unknown leaderboard order: '" + str(order) + "'.")
+        return leaderboard.Leaderboard(self.generate_results_dictionary(
+            settings.country_codes)).get_ranking(order, start, count)
 
     ################################################################################################
-    def generate_entries_dictionary(self, access_token):
-        """ Generates the entries dictionary.
+    def get_score(self, access_token, entry_id):
+        """ Gets the score the user has given an entry.
 
         Args:
             access_token (str): The access token the client has sent.
+            entry_id (str): The ID of the entry.
 
         Returns:
-            str: The entries dictionary.
+            int: The score, -1 if the user has not scored the entry.
+
+        Raises:
+            InvalidAccessTokenException: If the access token is invalid.
+            ValueError: If the entry ID is invalid.
         """
-        username = self.get_username(access_token)
+        if entry_id not in settings.country_codes:
+            raise ValueError("Entry ID is invalid.")
 
-        entries_copy = copy.deepcopy(settings.entries)
+        return self.__get_score(self.get_username(access_token), entry_id)
 
-        select_command = "SELECT * FROM scores WHERE username = %s"
-        select_params = (username, )
-        cursor = self.execute(select_command, select_params)
+    ################################################################################################
+    def get_user_scores(self, access_token):
+        """ Gets the scores the user has given entries.
 
-        column_names = [c[0] for c in cursor.description]
-        user_scores = dict(zip(column_names, cursor.fetchone()))
+        Args:
+            access_token (str): The access token the client has sent.
 
-        for entry in entries_copy:
-            entry_id = entry["id"]
-            entry["attributes"]["score"] = user_scores[entry_id]
+        Returns:
+            dict: Dictionary of entry ID to score. Entries the user has not scored are missing.
 
-        return entries_copy
+        Raises:
+            InvalidAccessTokenException: If the access token is invalid.
+        """
+        return self.__get_user_scores(self.get_username(access_token))
 
     ################################################################################################
     def generate_settings_dictionary(self, access_token):
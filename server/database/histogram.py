@@ -0,0 +1,89 @@
+import bisect
+import threading
+
+""" This module contains the Histogram class, which counts how long operations take so that
+percentiles can be reported without keeping every timing. """
+__author__ = "Thomas Reeve"
+
+# The upper bounds of the buckets, in seconds. From half a millisecond to ten seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+####################################################################################################
+class Histogram(object):
+    """ Thread safe count of observations in buckets, with their sum. """
+    ################################################################################################
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """ Constructor.
+
+        Args:
+            buckets: Sequence of the upper bounds of the buckets. A final bucket without an upper
+            bound is always added.
+        """
+        self.__buckets = tuple(sorted(buckets))
+        self.__lock = threading.Lock()
+        self.__counts = [0] * (len(self.__buckets) + 1)
+        self.__sum = 0.0
+
+    ################################################################################################
+    def observe(self, value):
+        """ Counts an observation.
+
+        Args:
+            value (float): The observation, e.g. a number of seconds.
+        """
+        index = bisect.bisect_left(self.__buckets, value)
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += value
+
+    ################################################################################################
+    def get_snapshot(self):
+        """ Gets the observations so far.
+
+        Returns:
+            dict: The "buckets", a list of each upper bound (None for the last bucket) and the
+            number of observations less than or equal to it, and the "sum" and "count" of the
+            observations.
+        """
+        with self.__lock:
+            counts = list(self.__counts)
+            total = self.__sum
+
+        buckets = []
+        cumulative_count = 0
+        for upper_bound, count in zip(self.__buckets + (None, ), counts):
+            cumulative_count += count
+            buckets.append((upper_bound, cumulative_count))
+        return {"buckets": buckets, "sum": total, "count": cumulative_count}
+
+
+####################################################################################################
+def get_quantile(snapshot, quantile):
+    """ Estimates a quantile from a snapshot, assuming observations are spread evenly through each
+    bucket.
+
+    Args:
+        snapshot (dict): The snapshot, see Histogram.get_snapshot.
+        quantile (float): The quantile, e.g. 0.95.
+
+    Returns:
+        float: The estimate, None if there are no observations. Observations in the last bucket are
+        estimated as the largest upper bound.
+    """
+    if snapshot["count"] == 0:
+        return None
+
+    rank = quantile * snapshot["count"]
+    lower_bound = 0.0
+    lower_count = 0
+    for upper_bound, cumulative_count in snapshot["buckets"]:
+        if upper_bound is None:
+            return lower_bound
+        if cumulative_count >= rank and cumulative_count > lower_count:
+            return lower_bound + (upper_bound - lower_bound) * \
+                (rank - lower_count) / (cumulative_count - lower_count)
+        lower_bound = upper_bound
+        lower_count = cumulative_count
+    return lower_bound
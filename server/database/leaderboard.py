@@ -0,0 +1,275 @@
+import fractions
+import random
+
+""" This module contains the Leaderboard class, which ranks the entries by their total and average
+scores, and the IndexableSkiplist it keeps the rankings in. """
+__author__ = "Thomas Reeve"
+
+# The orders the entries are ranked in.
+TOTAL = "total"
+AVERAGE = "average"
+ORDERS = (TOTAL, AVERAGE)
+
+
+####################################################################################################
+class _Node(object):
+    """ A value in an IndexableSkiplist, with its links to the following nodes. """
+    __slots__ = ("value", "next", "width")
+
+    ################################################################################################
+    def __init__(self, value, levels):
+        """ Constructor.
+
+        Args:
+            value: The value.
+            levels (int): The number of levels the node is linked into.
+        """
+        self.value = value
+        # The next node on each level, None at the end of the list.
+        self.next = [None] * levels
+        # How many positions along the list the next node on each level is.
+        self.width = [1] * levels
+
+
+####################################################################################################
+class IndexableSkiplist(object):
+    """ Sorted list that values can be inserted into, removed from and looked up by position in
+    O(log n) time. The values must be unique and comparable. Not thread safe. """
+    ################################################################################################
+    def __init__(self, maximum_levels=16):
+        """ Constructor.
+
+        Args:
+            maximum_levels (int): The number of levels. Lists of up to about 2 ** maximum_levels
+            values keep O(log n) performance.
+        """
+        self.__maximum_levels = maximum_levels
+        self.__head = _Node(None, maximum_levels)
+        self.__size = 0
+
+    ################################################################################################
+    def __len__(self):
+        """ Gets the number of values.
+
+        Returns:
+            int: The number of values.
+        """
+        return self.__size
+
+    ################################################################################################
+    def __find_previous(self, value):
+        """ Finds the last node before a value on each level.
+
+        Args:
+            value: The value.
+
+        Returns:
+            tuple: The list of the node on each level, and the list of the positions moved along
+            each level to reach them.
+        """
+        chain = [None] * self.__maximum_levels
+        steps = [0] * self.__maximum_levels
+        node = self.__head
+        for level in reversed(range(self.__maximum_levels)):
+            while node.next[level] is not None and node.next[level].value < value:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps
+
+    ################################################################################################
+    def insert(self, value):
+        """ Inserts a value.
+
+        Args:
+            value: The value, which must not already be in the list.
+        """
+        levels = 1
+        while levels < self.__maximum_levels and random.random() < 0.5:
+            levels += 1
+
+        chain, steps = self.__find_previous(value)
+        node = _Node(value, levels)
+        # The positions between the node on the current level and the new node.
+        distance = 0
+        for level in range(levels):
+            previous = chain[level]
+            node.next[level] = previous.next[level]
+            node.width[level] = previous.width[level] - distance
+            previous.next[level] = node
+            previous.width[level] = distance + 1
+            distance += steps[level]
+        for level in range(levels, self.__maximum_levels):
+            chain[level].width[level] += 1
+        self.__size += 1
+
+    ################################################################################################
+    def remove(self, value):
+        """ Removes a value.
+
+        Args:
+            value: The value.
+
+        Raises:
+            ValueError: If the value is not in the list.
+        """
+        chain, _ = self.__find_previous(value)
+        node = chain[0].next[0]
+        if node is None or node.value != value:
+            raise ValueError("Value is not in the list.")
+
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), self.__maximum_levels):
+            chain[level].width[level] -= 1
+        self.__size -= 1
+
+    ################################################################################################
+    def get_range(self, start=0, stop=None):
+        """ Gets the values between two positions.
+
+        Args:
+            start (int): The position of the first value.
+            stop (int): The position after the last value, None for the end of the list.
+
+        Returns:
+            list: The values, in order.
+        """
+        stop = self.__size if stop is None else min(stop, self.__size)
+        if start >= stop:
+            return []
+
+        # Find the node at the start, counting positions from 1 as the head is at 0.
+        remaining = start + 1
+        node = self.__head
+        for level in reversed(range(self.__maximum_levels)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+
+        values = []
+        for _ in range(stop - start):
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+
+####################################################################################################
+class Leaderboard(object):
+    """ Ranks the entries by their total score, and by their average score. Each ranking is kept in
+    an IndexableSkiplist, so a score changing moves one entry in O(log n) time instead of sorting
+    every entry again. Not thread safe. """
+    ################################################################################################
+    def __init__(self, results):
+        """ Constructor.
+
+        Args:
+            results (dict): The results to rank, in the form returned by
+            DatabaseConnector.generate_results_dictionary.
+        """
+        # Entry ID to its total score and number of votes.
+        self.__entries = {}
+        self.__rankings = dict((order, IndexableSkiplist()) for order in ORDERS)
+        for entry_id, scores in results.items():
+            self.__entries[entry_id] = (
+                sum(score * count for score, count in scores.items() if score >= 0),
+                sum(count for score, count in scores.items() if score >= 0))
+            self.__insert(entry_id)
+
+    ################################################################################################
+    def __get_keys(self, entry_id):
+        """ Gets the keys an entry is sorted by in each ranking.
+
+        Args:
+            entry_id (str): The ID of the entry.
+
+        Returns:
+            dict: The order to the key. Ties are ranked by the number of votes, then the entry ID.
+        """
+        total, votes = self.__entries[entry_id]
+        # Entries without votes have no average, so they are ranked last.
+        average = -fractions.Fraction(total, votes) if votes > 0 else 0
+        return {
+            TOTAL: (-total, votes, entry_id),
+            AVERAGE: (votes == 0, average, -votes, entry_id)
+        }
+
+    ################################################################################################
+    def __insert(self, entry_id):
+        """ Inserts an entry into the rankings.
+
+        Args:
+            entry_id (str): The ID of the entry.
+        """
+        for order, key in self.__get_keys(entry_id).items():
+            self.__rankings[order].insert(key)
+
+    ################################################################################################
+    def __remove(self, entry_id):
+        """ Removes an entry from the rankings.
+
+        Args:
+            entry_id (str): The ID of the entry.
+        """
+        for order, key in self.__get_keys(entry_id).items():
+            self.__rankings[order].remove(key)
+
+    ################################################################################################
+    def change_score(self, entry_id, old_score, new_score):
+        """ Moves a user's vote for an entry from one score to another.
+
+        Args:
+            entry_id (str): The ID of the entry.
+            old_score (int): The score the user had given the entry, -1 if they had not scored it.
+            new_score (int): The score the user has now given the entry, -1 if they no longer
+            score it.
+        """
+        if entry_id not in self.__entries or old_score == new_score:
+            return
+
+        total, votes = self.__entries[entry_id]
+        if old_score >= 0:
+            total -= old_score
+            votes -= 1
+        if new_score >= 0:
+            total += new_score
+            votes += 1
+
+        self.__remove(entry_id)
+        self.__entries[entry_id] = (total, votes)
+        self.__insert(entry_id)
+
+    ################################################################################################
+    def get_ranking(self, order=TOTAL, start=0, count=None):
+        """ Gets the entries in rank order.
+
+        Args:
+            order (str): Either TOTAL or AVERAGE.
+            start (int): The position of the first entry to get, 0 for the top ranked entry.
+            count (int): The number of entries to get, None for every entry from the start.
+
+        Returns:
+            list: The "id", "rank" (1 for the top), "total", "votes" and "average" of each entry.
+            The average is None for entries without votes.
+
+        Raises:
+            ValueError: If the order is unknown.
+        """
+        if order not in self.__rankings:
+            raise ValueError("Unknown leaderboard order: '" + str(order) + "'.")
+
+        keys = self.__rankings[order].get_range(start, None if count is None else start + count)
+        ranking = []
+        for rank, key in enumerate(keys, start + 1):
+            entry_id = key[-1]
+            total, votes = self.__entries[entry_id]
+            ranking.append({
+                "id": entry_id,
+                "rank": rank,
+                "total": total,
+                "votes": votes,
+                "average": float(total) / votes if votes > 0 else None
+            })
+        return ranking
@@ -0,0 +1,164 @@
+from configuration import settings
+
+from passlib.hash import pbkdf2_sha256
+import time
+import tornado.ioloop
+
+""" This module contains the PasswordHasher class, which salts, hashes and verifies passwords away
+from the IOLoop. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+def hash_password(password):
+    """ Salts and hashes a password.
+
+    Args:
+        password (str): The password to salt and hash.
+
+    Returns:
+       The salted and hashed password.
+    """
+    return pbkdf2_sha256.using(rounds=settings.PASSWORD_SALTING_ROUNDS,
+                               salt_size=settings.PASSWORD_SALTING_SIZE).hash(password)
+
+
+####################################################################################################
+def verify_password(password, password_hash):
+    """ Verifies a password against a salted and hashed password.
+
+    Args:
+        password (str): The password the user sent.
+        password_hash (str): The salted and hashed password from the database.
+
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    return pbkdf2_sha256.verify(password, password_hash)
+
+
+####################################################################################################
+class PasswordHasherBusyException(Exception):
+    """ Exception that is thrown when too many passwords are waiting to be hashed. """
+    ################################################################################################
+    def __init__(self, message):
+        """ Constructor.
+
+        Args:
+            message (str): Message to add to exception.
+        """
+        super(PasswordHasherBusyException, self).__init__(message)
+
+
+####################################################################################################
+class PasswordHasher(object):
+    """ Hashes and verifies passwords on an executor, normally a process pool, as each hash takes
+    PASSWORD_SALTING_ROUNDS rounds of PBKDF2. The hashes are awaited on the IOLoop, so the database
+    executor threads are left for queries. The number of passwords waiting to be hashed is bounded,
+    so a flood of logins is turned away rather than queueing up without limit. Only used on the
+    IOLoop, so there is no lock. """
+    ################################################################################################
+    def __init__(self, executor=None, maximum_queue_size=100):
+        """ Constructor.
+
+        Args:
+            executor (concurrent.futures.Executor): The executor to hash passwords on. If None the
+            IOLoop's default executor is used.
+            maximum_queue_size (int): The maximum number of passwords that can be waiting to be
+            hashed or verified at once.
+        """
+        self.__executor = executor
+        self.__maximum_queue_size = maximum_queue_size
+
+        self.__queue_depth = 0
+        self.__statistics = {
+            "hashed": 0,
+            "verified": 0,
+            "rejected": 0,
+            "maximum_queue_depth": 0,
+            "total_seconds": 0.0,
+            "maximum_seconds": 0.0
+        }
+
+    ################################################################################################
+    def start(self):
+        """ Starts the executor's workers by running a job on them. Process pools fork their workers
+        on the first job, which is safer to do at start up before other threads are running. """
+        if self.__executor is not None:
+            self.__executor.submit(time.time).result()
+
+    ################################################################################################
+    async def hash(self, password):
+        """ Salts and hashes a password.
+
+        Args:
+            password (str): The password to salt and hash.
+
+        Returns:
+           The salted and hashed password.
+
+        Raises:
+            PasswordHasherBusyException: If too many passwords are waiting to be hashed.
+        """
+        return await self.__run("hashed", hash_password, password)
+
+    ################################################################################################
+    async def verify(self, password, password_hash):
+        """ Verifies a password against a salted and hashed password.
+
+        Args:
+            password (str): The password the user sent.
+            password_hash (str): The salted and hashed password from the database.
+
+        Returns:
+            bool: True if the password matches, False otherwise.
+
+        Raises:
+            PasswordHasherBusyException: If too many passwords are waiting to be hashed.
+        """
+        return await self.__run("verified", verify_password, password, password_hash)
+
+    ################################################################################################
+    async def __run(self, statistic, function, *args):
+        """ Runs a hashing function on the executor and waits for the result.
+
+        Args:
+            statistic (str): The name of the statistic to increment.
+            function: The function to run.
+            *args: The arguments to pass to the function.
+
+        Returns:
+            The value returned by the function.
+        """
+        if self.__queue_depth >= self.__maximum_queue_size:
+            self.__statistics["rejected"] += 1
+            raise PasswordHasherBusyException("Server is busy, please try again.")
+        self.__queue_depth += 1
+        self.__statistics["maximum_queue_depth"] = max(self.__statistics["maximum_queue_depth"],
+                                                       self.__queue_depth)
+
+        start = time.time()
+        try:
+            return await tornado.ioloop.IOLoop.current().run_in_executor(self.__executor, function,
+                                                                         *args)
+        finally:
+            seconds = time.time() - start
+            self.__queue_depth -= 1
+            self.__statistics[statistic] += 1
+            self.__statistics["total_seconds"] += seconds
+            self.__statistics["maximum_seconds"] = max(self.__statistics["maximum_seconds"],
+                                                       seconds)
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets statistics about the hashing.
+
+        Returns:
+            dict: Dictionary containing the current and maximum queue depth, the configured queue
+            size, the number of passwords hashed, verified and rejected, and the total and maximum
+            seconds spent waiting for a hash (including time spent queueing).
+        """
+        statistics = dict(self.__statistics)
+        statistics["queue_depth"] = self.__queue_depth
+        statistics["maximum_queue_size"] = self.__maximum_queue_size
+        return statistics
@@ -0,0 +1,443 @@
+import collections
+import contextlib
+import threading
+import time
+
+""" This module contains the ConnectionPool class, which hands out database connections to the
+DatabaseConnector so that queries do not have to share a single connection. """
+__author__ = "Thomas Reeve"
+
+# MySQL client error codes that mean the connection to the server has been lost, i.e. "MySQL server
+# has gone away" and "Lost connection to MySQL server during query".
+CONNECTION_LOST_ERROR_CODES = (2006, 2013)
+
+
+####################################################################################################
+def is_connection_lost_error(error):
+    """ Checks if the error was raised because the connection to the database server was lost.
+
+    Args:
+        error (Exception): The error raised by the database driver.
+
+    Returns:
+        bool: True if the connection was lost, False otherwise.
+    """
+    return len(error.args) > 0 and error.args[0] in CONNECTION_LOST_ERROR_CODES
+
+
+####################################################################################################
+class ConnectionPoolTimeoutException(Exception):
+    """ Exception that is thrown when a connection could not be acquired in time. """
+    ################################################################################################
+    def __init__(self, message):
+        """ Constructor.
+
+        Args:
+            message (str): Message to add to exception.
+        """
+        super(ConnectionPoolTimeoutException, self).__init__(message)
+
+
+####################################################################################################
+class PooledConnection(object):
+    """ Book keeping for a connection owned by the pool. """
+    ################################################################################################
+    def __init__(self, connection):
+        """ Constructor.
+
+        Args:
+            connection: The database connection.
+        """
+        self.connection = connection
+        self.database = None
+        self.last_used = time.time()
+
+
+####################################################################################################
+class ConnectionPool(object):
+    """ A thread safe pool of database connections. Connections are created on demand up to the
+    maximum size, checked before they are handed out if they have been idle for a while, and closed
+    once they have been idle for longer than the idle timeout (the pool never shrinks below the
+    minimum size). """
+    ################################################################################################
+    def __init__(self, connect, minimum_size=1, maximum_size=10, acquire_timeout=10,
+                 idle_timeout=300, health_check_interval=30):
+        """ Constructor.
+
+        Args:
+            connect: Callable that takes no arguments and returns a new database connection.
+            minimum_size (int): The number of connections to keep open.
+            maximum_size (int): The maximum number of connections that can be open at once.
+            acquire_timeout (float): Seconds to wait for a free connection before giving up.
+            idle_timeout (float): Seconds a connection can be idle before it is closed.
+            health_check_interval (float): Seconds a connection can be idle before it is pinged
+            when it is next acquired.
+        """
+        if minimum_size < 0 or maximum_size < 1 or minimum_size > maximum_size:
+            raise ValueError("Invalid pool size: minimum " + str(minimum_size) + ", maximum " +
+                             str(maximum_size) + ".")
+
+        self.__connect = connect
+        self.__minimum_size = minimum_size
+        self.__maximum_size = maximum_size
+        self.__acquire_timeout = acquire_timeout
+        self.__idle_timeout = idle_timeout
+        self.__health_check_interval = health_check_interval
+
+        self.__condition = threading.Condition()
+        self.__idle = collections.deque()
+        self.__in_use = {}
+        # The open connections, and the connections being opened by acquire.
+        self.__size = 0
+        self.__database = None
+        # Changed by every use_database call, so acquire can tell if it was called while a
+        # connection was being prepared.
+        self.__database_version = 0
+        # The thread in the exclusive context manager, see exclusive.
+        self.__exclusive_thread = None
+
+        self.__statistics = {
+            "acquired": 0,
+            "created": 0,
+            "closed": 0,
+            "reaped": 0,
+            "reconnected": 0,
+            "waited": 0,
+            "timed_out": 0
+        }
+
+        with self.__condition:
+            for _ in range(minimum_size):
+                self.__idle.append(self.__open())
+                self.__size += 1
+
+    ################################################################################################
+    def __open(self):
+        """ Opens a new connection. Does not change the size of the pool.
+
+        Returns:
+            PooledConnection: The new connection.
+        """
+        pooled = PooledConnection(self.__connect())
+        with self.__condition:
+            self.__statistics["created"] += 1
+        return pooled
+
+    ################################################################################################
+    def __close_connection(self, pooled):
+        """ Closes a connection, ignoring any errors. Does not change the size of the pool or the
+        statistics. Must be called without the condition held, so a slow close does not hold up the
+        other threads.
+
+        Args:
+            pooled (PooledConnection): The connection to close.
+        """
+        try:
+            pooled.connection.close()
+        except Exception:
+            # The connection is most likely already dead, which is why we are closing it.
+            pass
+
+    ################################################################################################
+    def __remove(self, pooled):
+        """ Removes a connection that has been taken out of the pool from the size of the pool, and
+        counts it as closed. Must be called with the condition held, and the connection closed with
+        __close_connection once the condition has been released.
+
+        Args:
+            pooled (PooledConnection): The connection to remove.
+        """
+        self.__size -= 1
+        self.__statistics["closed"] += 1
+
+    ################################################################################################
+    def __is_excluded(self):
+        """ Checks if another thread is in the exclusive context manager, in which case the current
+        thread cannot acquire a connection. Must be called with the condition held.
+
+        Returns:
+            bool: True if the current thread has to wait, False otherwise.
+        """
+        return self.__exclusive_thread not in (None, threading.get_ident())
+
+    ################################################################################################
+    def __wait(self, deadline, message):
+        """ Waits for the condition to be notified. Must be called with the condition held.
+
+        Args:
+            deadline (float): The time to give up waiting at.
+            message (str): The message of the exception raised if the deadline has passed.
+
+        Raises:
+            ConnectionPoolTimeoutException: If the deadline has passed.
+        """
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self.__statistics["timed_out"] += 1
+            raise ConnectionPoolTimeoutException(message)
+        self.__condition.wait(remaining)
+
+    ################################################################################################
+    def __notify(self):
+        """ Wakes the threads waiting for a connection. Every thread is woken while a thread is in
+        the exclusive context manager, as it waits for all the connections rather than one of them.
+        Must be called with the condition held. """
+        if self.__exclusive_thread is None:
+            self.__condition.notify()
+        else:
+            self.__condition.notify_all()
+
+    ################################################################################################
+    def __prepare(self, pooled, database):
+        """ Gets a connection ready to be handed out. Stale connections are replaced with a new
+        connection. Called without the condition held, so opening or checking a connection does not
+        hold up the other threads. If it fails the connection is closed, but the size of the pool is
+        not changed.
+
+        Args:
+            pooled (PooledConnection): The connection to prepare, None to open a new connection.
+            database (str): The database the connection should use, None for any database.
+
+        Returns:
+            PooledConnection: The connection to hand out.
+        """
+        try:
+            if pooled is None:
+                pooled = self.__open()
+            elif time.time() - pooled.last_used > self.__health_check_interval:
+                try:
+                    pooled.connection.ping()
+                except Exception:
+                    with self.__condition:
+                        self.__statistics["closed"] += 1
+                        self.__statistics["reconnected"] += 1
+                    self.__close_connection(pooled)
+                    pooled = None
+                    pooled = self.__open()
+
+            if database is not None and pooled.database != database:
+                pooled.connection.select_db(database)
+                pooled.database = database
+            return pooled
+        except Exception:
+            if pooled is not None:
+                with self.__condition:
+                    self.__statistics["closed"] += 1
+                self.__close_connection(pooled)
+            raise
+
+    ################################################################################################
+    def acquire(self):
+        """ Takes a connection from the pool, waiting for one to be released if the pool is at its
+        maximum size.
+
+        Returns:
+            The database connection.
+
+        Raises:
+            ConnectionPoolTimeoutException: If no connection was released in time.
+        """
+        deadline = time.time() + self.__acquire_timeout
+
+        with self.__condition:
+            if self.__is_excluded() or (not self.__idle and self.__size >= self.__maximum_size):
+                self.__statistics["waited"] += 1
+
+            while self.__is_excluded() or (not self.__idle and self.__size >= self.__maximum_size):
+                self.__wait(deadline, "Timed out waiting for a database connection.")
+
+            if self.__idle:
+                # Take the most recently used connection so that the rest can be reaped.
+                pooled = self.__idle.pop()
+            else:
+                # Keep the place of the new connection in the pool while it is opened.
+                pooled = None
+                self.__size += 1
+            database = self.__database
+            database_version = self.__database_version
+
+        try:
+            while True:
+                pooled = self.__prepare(pooled, database)
+                with self.__condition:
+                    if self.__database_version == database_version:
+                        self.__in_use[pooled.connection] = pooled
+                        self.__statistics["acquired"] += 1
+                        return pooled.connection
+                    # use_database was called while the connection was being prepared.
+                    pooled.database = None
+                    database = self.__database
+                    database_version = self.__database_version
+        except Exception:
+            with self.__condition:
+                self.__size -= 1
+                self.__notify()
+            raise
+
+    ################################################################################################
+    def release(self, connection):
+        """ Returns a connection to the pool.
+
+        Args:
+            connection: The database connection that was acquired.
+        """
+        with self.__condition:
+            pooled = self.__in_use.pop(connection)
+            pooled.last_used = time.time()
+            self.__idle.append(pooled)
+            self.__notify()
+
+    ################################################################################################
+    def discard(self, connection):
+        """ Closes a connection that was acquired instead of returning it to the pool, e.g. because
+        the connection to the server has been lost.
+
+        Args:
+            connection: The database connection that was acquired.
+        """
+        with self.__condition:
+            pooled = self.__in_use.pop(connection)
+            self.__remove(pooled)
+            self.__statistics["reconnected"] += 1
+            self.__notify()
+        self.__close_connection(pooled)
+
+    ################################################################################################
+    @contextlib.contextmanager
+    def connection(self):
+        """ Context manager that acquires a connection and releases it afterwards. If the
+        connection to the server was lost the connection is discarded instead.
+
+        Yields:
+            The database connection.
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception as error:
+            if is_connection_lost_error(error):
+                self.discard(connection)
+            else:
+                self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    ################################################################################################
+    @contextlib.contextmanager
+    def exclusive(self):
+        """ Context manager that waits for every connection to be released, and then only hands out
+        connections to the current thread until it exits. Used to change what the idle connections
+        are connected to, e.g. when a database is dropped, while no other thread is using them. The
+        current thread must not be holding a connection when it enters.
+
+        Raises:
+            ConnectionPoolTimeoutException: If the connections were not released in time.
+        """
+        deadline = time.time() + self.__acquire_timeout
+
+        with self.__condition:
+            while self.__exclusive_thread is not None:
+                self.__wait(deadline, "Timed out waiting for the database connections to be "
+                                      "released.")
+            # Claim the pool before waiting for the connections in use, so other threads cannot
+            # keep acquiring connections in the meantime.
+            self.__exclusive_thread = threading.get_ident()
+            try:
+                while self.__size > len(self.__idle):
+                    self.__wait(deadline, "Timed out waiting for the database connections to be "
+                                          "released.")
+            except Exception:
+                self.__exclusive_thread = None
+                self.__condition.notify_all()
+                raise
+
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__exclusive_thread = None
+                self.__condition.notify_all()
+
+    ################################################################################################
+    def use_database(self, name):
+        """ Sets the database every connection should use. Connections switch database the next
+        time they are acquired, even if they were already using a database with the same name as it
+        may have been dropped and created again since.
+
+        Args:
+            name (str): The name of the database, or None to stop switching database.
+        """
+        with self.__condition:
+            self.__database = name
+            self.__database_version += 1
+            for pooled in list(self.__idle) + list(self.__in_use.values()):
+                pooled.database = None
+
+    ################################################################################################
+    def get_database(self):
+        """ Gets the database every connection should use.
+
+        Returns:
+            str: The name of the database, or None if no database has been set.
+        """
+        with self.__condition:
+            return self.__database
+
+    ################################################################################################
+    def reap_idle_connections(self):
+        """ Closes connections that have been idle for longer than the idle timeout, keeping at
+        least the minimum number of connections open.
+
+        Returns:
+            int: The number of connections closed.
+        """
+        reaped = []
+        now = time.time()
+
+        with self.__condition:
+            # The oldest connections are at the left of the deque.
+            while self.__idle and self.__size > self.__minimum_size and \
+                    now - self.__idle[0].last_used > self.__idle_timeout:
+                reaped.append(self.__idle.popleft())
+                self.__remove(reaped[-1])
+
+            self.__statistics["reaped"] += len(reaped)
+
+        for pooled in reaped:
+            self.__close_connection(pooled)
+        return len(reaped)
+
+    ################################################################################################
+    def close(self):
+        """ Closes all the idle connections and stops the pool keeping connections open. """
+        with self.__condition:
+            closed = list(self.__idle)
+            self.__idle.clear()
+            for pooled in closed:
+                self.__remove(pooled)
+            self.__minimum_size = 0
+
+        for pooled in closed:
+            self.__close_connection(pooled)
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets statistics about the pool.
+
+        Returns:
+            dict: Dictionary containing the current size of the pool, the number of idle and in use
+            connections, the configured limits, and running totals of connections acquired, created,
+            closed, reaped and reconnected, and the number of times callers had to wait for a
+            connection or timed out waiting.
+        """
+        with self.__condition:
+            statistics = dict(self.__statistics)
+            statistics.update({
+                "size": self.__size,
+                "idle": len(self.__idle),
+                "in_use": len(self.__in_use),
+                "minimum_size": self.__minimum_size,
+                "maximum_size": self.__maximum_size
+            })
+            return statistics
@@ -0,0 +1,157 @@
+import collections
+import threading
+
+from database import leaderboard
+
+""" This module contains the ResultsAggregate class, which keeps the results in memory so they do
+not have to be counted from the scores table every time they are sent to the clients. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class ResultsAggregate(object):
+    """ Thread safe count of how many users have given each score to each entry. It is built once
+    from the scores table and then kept up to date as scores change, users register and users are
+    deleted. The entries are kept ranked in a leaderboard.Leaderboard as well.
+
+    The changes to the results are collected so they can be sent to the clients instead of the
+    results, see take_changes. Each set of changes taken has the next sequence number, and the
+    results can be got as they were after any set, see get_snapshot. """
+    ################################################################################################
+    def __init__(self, results):
+        """ Constructor.
+
+        Args:
+            results (dict): The results to start from, in the form returned by
+            DatabaseConnector.generate_results_dictionary.
+        """
+        self.__lock = threading.Lock()
+        self.__results = dict((entry_id, dict(scores)) for entry_id, scores in results.items())
+        self.__leaderboard = leaderboard.Leaderboard(self.__results)
+        # (entry ID, score) to the change in its count since the changes were last taken.
+        self.__changes = collections.OrderedDict()
+        self.__sequence = 0
+
+    ################################################################################################
+    def change_score(self, entry_id, old_score, new_score):
+        """ Moves a user's vote for an entry from one score to another.
+
+        Args:
+            entry_id (str): The ID of the entry.
+            old_score (int): The score the user had given the entry.
+            new_score (int): The score the user has now given the entry.
+        """
+        if old_score == new_score:
+            return
+
+        with self.__lock:
+            scores = self.__results.get(entry_id)
+            if scores is not None:
+                scores[old_score] -= 1
+                scores[new_score] += 1
+                self.__leaderboard.change_score(entry_id, old_score, new_score)
+                self.__add_change(entry_id, old_score, -1)
+                self.__add_change(entry_id, new_score, 1)
+
+    ################################################################################################
+    def __add_change(self, entry_id, score, count):
+        """ Collects a change to the results. The lock must be held.
+
+        Args:
+            entry_id (str): The ID of the entry.
+            score (int): The score whose count has changed.
+            count (int): The change in the count.
+        """
+        key = (entry_id, score)
+        self.__changes[key] = self.__changes.get(key, 0) + count
+
+    ################################################################################################
+    def add_user(self):
+        """ Adds a user who has not scored any entries yet. """
+        with self.__lock:
+            for entry_id, scores in self.__results.items():
+                scores[-1] += 1
+                self.__add_change(entry_id, -1, 1)
+
+    ################################################################################################
+    def remove_user(self, user_scores):
+        """ Removes a user's scores.
+
+        Args:
+            user_scores (dict): Dictionary of entry ID to the score the user gave the entry.
+            Entries that are missing have not been scored by the user.
+        """
+        with self.__lock:
+            for entry_id, scores in self.__results.items():
+                score = user_scores.get(entry_id, -1)
+                scores[score] -= 1
+                self.__leaderboard.change_score(entry_id, score, -1)
+                self.__add_change(entry_id, score, -1)
+
+    ################################################################################################
+    def get_results(self, entry_ids):
+        """ Gets the results for entries.
+
+        Args:
+            entry_ids: The IDs of the entries to get the results for.
+
+        Returns:
+            dict: A copy of the results, in the form returned by
+            DatabaseConnector.generate_results_dictionary.
+        """
+        with self.__lock:
+            return dict((entry_id, dict(self.__results[entry_id])) for entry_id in entry_ids)
+
+    ################################################################################################
+    def get_ranking(self, order=leaderboard.TOTAL, start=0, count=None):
+        """ Gets the entries in rank order.
+
+        Args:
+            order (str): Either leaderboard.TOTAL or leaderboard.AVERAGE.
+            start (int): The position of the first entry to get, 0 for the top ranked entry.
+            count (int): The number of entries to get, None for every entry from the start.
+
+        Returns:
+            list: See leaderboard.Leaderboard.get_ranking.
+
+        Raises:
+            ValueError: If the order is unknown.
+        """
+        with self.__lock:
+            return self.__leaderboard.get_ranking(order, start, count)
+
+    ################################################################################################
+    def take_changes(self):
+        """ Takes the changes to the results since they were last taken.
+
+        Returns:
+            tuple: The sequence number of the changes, and the list of the entry ID, score and
+            change in the count of each score whose count has changed. None if nothing has changed.
+        """
+        with self.__lock:
+            changes = [(entry_id, score, count)
+                       for (entry_id, score), count in self.__changes.items() if count != 0]
+            self.__changes.clear()
+            if not changes:
+                return None
+            self.__sequence += 1
+            return self.__sequence, changes
+
+    ################################################################################################
+    def get_snapshot(self, entry_ids):
+        """ Gets the results as they were when the changes were last taken, so that applying every
+        later set of changes to them gives the current results.
+
+        Args:
+            entry_ids: The IDs of the entries to get the results for.
+
+        Returns:
+            tuple: The sequence number of the last changes taken, 0 if none have been, and the
+            results in the form returned by DatabaseConnector.generate_results_dictionary.
+        """
+        with self.__lock:
+            snapshot = dict((entry_id, dict(self.__results[entry_id])) for entry_id in entry_ids)
+            for (entry_id, score), count in self.__changes.items():
+                if entry_id in snapshot:
+                    snapshot[entry_id][score] -= count
+            return self.__sequence, snapshot
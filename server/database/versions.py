@@ -0,0 +1,91 @@
+import threading
+import uuid
+
+""" This module contains the UserVersions class, which counts how many times each user's data has
+changed so that clients can be told their copy is still up to date without reading the database. """
+__author__ = "Thomas Reeve"
+
+# The resources that have versions.
+ENTRIES = "entries"
+SETTINGS = "settings"
+
+
+####################################################################################################
+def generate_boot_id():
+    """ Generates an ID for the ETags given out by a server that has just started.
+
+    Returns:
+        str: The ID.
+    """
+    return uuid.uuid4().hex[:12]
+
+
+####################################################################################################
+class UserVersions(object):
+    """ Thread safe version counters for each user's resources. The counters are only kept in
+    memory, so the ETags include an ID that is different every time the server starts. """
+    ################################################################################################
+    def __init__(self, boot_id=None):
+        """ Constructor.
+
+        Args:
+            boot_id (str): The ID in the ETags, see generate_boot_id. When requests are served by
+            several processes they must share the ID, so that an ETag given out by one process
+            matches in the others. If None a new ID is generated.
+        """
+        self.__lock = threading.Lock()
+        self.__versions = {}
+        self.__boot_id = boot_id or generate_boot_id()
+
+    ################################################################################################
+    def get(self, username, resource):
+        """ Gets the version of a user's resource.
+
+        Args:
+            username (str): The user's username.
+            resource (str): The resource, e.g. ENTRIES.
+
+        Returns:
+            int: The version.
+        """
+        with self.__lock:
+            return self.__versions.get((username, resource), 0)
+
+    ################################################################################################
+    def bump(self, username, *resources):
+        """ Increments the version of a user's resources, which must be done after they have
+        changed in the database.
+
+        Args:
+            username (str): The user's username.
+            *resources: The resources that have changed.
+        """
+        with self.__lock:
+            for resource in resources:
+                key = (username, resource)
+                self.__versions[key] = self.__versions.get(key, 0) + 1
+
+    ################################################################################################
+    def reset(self):
+        """ Forgets every version and changes the ID in the ETags, so that no ETag given out before
+        matches. Used when bumps from other processes may have been missed, so the new ID is not
+        shared with them. """
+        with self.__lock:
+            self.__versions.clear()
+            self.__boot_id = generate_boot_id()
+
+    ################################################################################################
+    def get_etag(self, username, resource):
+        """ Gets a strong ETag for the current version of a user's resource. The username is part
+        of the ETag as different users can log in on the same browser.
+
+        Args:
+            username (str): The user's username, which must be alphanumeric.
+            resource (str): The resource, e.g. ENTRIES.
+
+        Returns:
+            str: The ETag, including the quotes.
+        """
+        with self.__lock:
+            return '"%s-%s-%s-%d"' % (self.__boot_id, resource, username,
+                                      self.__versions.get((username, resource), 0))
@@ -1,8 +1,9 @@
-import json
 import tornado.web
 import traceback
 
+from . import codec
 import configuration.settings as settings
+from database import passwords
 
 __author__ = "Thomas Henry Reeve"
 """ Module for handling requests for authorization. """
@@ -36,15 +37,15 @@ class RegisterHandler(tornado.web.RequestHandler):
         RegisterHandler._handle_request_exception(self, exc)
 
     ################################################################################################
-    def post(self):
+    async def post(self):
         """ Handles register requests. The user submits a username and password. """
         username = self.get_argument('username', None, strip=False)
         password = self.get_argument('password', None, strip=False)
 
-        self.register_user(username, password)
+        await self.register_user(username, password)
 
     ################################################################################################
-    def register_user(self, username, password):
+    async def register_user(self, username, password):
         """ Registers the user.
 
         Args:
@@ -52,14 +53,19 @@ class RegisterHandler(tornado.web.RequestHandler):
             password (str): The user's password.
         """
         try:
-            self.application.database_connector.register_user(username, password)
+            await self.application.database_connector.register_user(username, password)
             self.set_status(200)
-            access_info = self.application.database_connector.get_access_information(username)
-            self.write(json.dumps(access_info))
+            access_info = await self.application.database_connector.get_access_information(
+                username)
+            self.write(codec.dumps(access_info))
         except (LookupError, ValueError) as error:
             logger.error(traceback.format_exc())
             self.set_status(400)
-            self.write(json.dumps(str(error)))
+            self.write(codec.dumps(str(error)))
+        except passwords.PasswordHasherBusyException as error:
+            logger.warning("Too many passwords waiting to be hashed, rejected register request.")
+            self.set_status(503)
+            self.write(codec.dumps(str(error)))
 
 
 ####################################################################################################
@@ -74,15 +80,15 @@ class TokenHandler(tornado.web.RequestHandler):
         TokenHandler._handle_request_exception(self, exc)
 
     ################################################################################################
-    def post(self):
+    async def post(self):
         """ Handles token requests. The user submits a username and password. """
         username = self.get_argument('username', None, strip=False)
         password = self.get_argument('password', None, strip=False)
 
-        self.login_user(username, password)
+        await self.login_user(username, password)
 
     ################################################################################################
-    def login_user(self, username, password):
+    async def login_user(self, username, password):
         """ Logs the user in.
 
         Args:
@@ -90,11 +96,16 @@ class TokenHandler(tornado.web.RequestHandler):
             password (str): The user's password.
         """
         try:
-            self.application.database_connector.login_user(username, password)
+            await self.application.database_connector.login_user(username, password)
             self.set_status(200)
-            access_info = self.application.database_connector.get_access_information(username)
-            self.write(json.dumps(access_info))
+            access_info = await self.application.database_connector.get_access_information(
+                username)
+            self.write(codec.dumps(access_info))
         except ValueError as error:
             logger.error(traceback.format_exc())
             self.set_status(400)
-            self.write(json.dumps(str(error)))
+            self.write(codec.dumps(str(error)))
+        except passwords.PasswordHasherBusyException as error:
+            logger.warning("Too many passwords waiting to be verified, rejected login request.")
+            self.set_status(503)
+            self.write(codec.dumps(str(error)))
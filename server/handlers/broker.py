@@ -0,0 +1,207 @@
+import collections
+import socket
+import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+import tornado.netutil
+import tornado.tcpserver
+import traceback
+
+from . import codec
+import configuration.settings as settings
+
+__author__ = "Thomas Henry Reeve"
+""" Module for passing events, e.g. websocket broadcasts, between the server's processes. """
+
+logger = settings.setup_custom_logger(__name__)
+
+
+####################################################################################################
+class Broker(object):
+    """ Passes events between processes over a Unix socket. One process is the hub, which listens on
+    the socket and forwards each event to every other process. Events are sent to the other
+    processes only, the process publishing an event must also handle it itself.
+
+    Events can be missed if a process loses its connection to the hub, e.g. when the hub is
+    restarted. The resynchronise callbacks are called whenever that may have happened, so that
+    anything kept in memory can be thrown away. """
+    ################################################################################################
+    def __init__(self, path, is_hub, reconnect_seconds=1, maximum_pending=10000):
+        """ Constructor.
+
+        Args:
+            path (str): The path of the Unix socket.
+            is_hub (bool): Whether this process is the hub.
+            reconnect_seconds (float): How long to wait before connecting to the hub again.
+            maximum_pending (int): The number of events to keep while not connected to the hub.
+            The oldest are dropped after that.
+        """
+        self.__path = path
+        self.__is_hub = is_hub
+        self.__reconnect_seconds = reconnect_seconds
+        self.__io_loop = None
+        self.__server = None
+        # Event name to the list of callbacks that handle it.
+        self.__subscribers = {}
+        self.__resynchronise_callbacks = []
+        # The hub's connections to the other processes, or the connection to the hub.
+        self.__streams = set()
+        self.__pending = collections.deque(maxlen=maximum_pending)
+        self.__stopped = False
+
+    ################################################################################################
+    def subscribe(self, event, callback):
+        """ Handles an event published by another process. Callbacks run on the IOLoop.
+
+        Args:
+            event (str): The name of the event.
+            callback (function): Called with the event's arguments.
+        """
+        self.__subscribers.setdefault(event, []).append(callback)
+
+    ################################################################################################
+    def add_resynchronise_callback(self, callback):
+        """ Calls a function, without arguments, whenever events from other processes may have been
+        missed. Callbacks run on the IOLoop.
+
+        Args:
+            callback (function): The function.
+        """
+        self.__resynchronise_callbacks.append(callback)
+
+    ################################################################################################
+    def start(self):
+        """ Starts listening on, or connecting to, the socket. Must be called on the IOLoop. """
+        self.__io_loop = tornado.ioloop.IOLoop.current()
+        if self.__is_hub:
+            self.__server = _HubServer(self)
+            self.__server.add_socket(tornado.netutil.bind_unix_socket(self.__path))
+        else:
+            self.__io_loop.spawn_callback(self.__connect)
+
+    ################################################################################################
+    def stop(self):
+        """ Stops listening and closes every connection. Must be called on the IOLoop. """
+        self.__stopped = True
+        if self.__server is not None:
+            self.__server.stop()
+        for stream in list(self.__streams):
+            stream.close()
+
+    ################################################################################################
+    def publish(self, event, *args):
+        """ Sends an event to the other processes. Can be called from any thread.
+
+        Args:
+            event (str): The name of the event.
+            *args: The arguments, which must be serialisable as JSON.
+        """
+        message = codec.dumps([event, args]) + b"\n"
+        if self.__io_loop is not None:
+            self.__io_loop.add_callback(self.__send, message)
+
+    ################################################################################################
+    def __send(self, message, source=None):
+        """ Writes a message to every connection. Must be called on the IOLoop.
+
+        Args:
+            message (bytes): The message.
+            source (tornado.iostream.IOStream): The connection the message came from, which it is
+            not sent back to.
+        """
+        if not self.__is_hub and not self.__streams:
+            self.__pending.append(message)
+            return
+
+        for stream in self.__streams:
+            if stream is not source and not stream.closed():
+                stream.write(message)
+
+    ################################################################################################
+    async def __connect(self):
+        """ Connects to the hub, and connects again whenever the connection is lost. """
+        while not self.__stopped:
+            stream = tornado.iostream.IOStream(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+            try:
+                await stream.connect(self.__path)
+            except (tornado.iostream.StreamClosedError, OSError):
+                stream.close()
+                await tornado.gen.sleep(self.__reconnect_seconds)
+                continue
+
+            logger.debug("Connected to the broker hub.")
+            self.__streams.add(stream)
+            self.__resynchronise()
+            while self.__pending:
+                stream.write(self.__pending.popleft())
+
+            await self.handle_stream(stream)
+            if not self.__stopped:
+                logger.warning("Lost the connection to the broker hub.")
+                await tornado.gen.sleep(self.__reconnect_seconds)
+
+    ################################################################################################
+    async def handle_stream(self, stream):
+        """ Reads the events from a connection until it is closed.
+
+        Args:
+            stream (tornado.iostream.IOStream): The connection.
+        """
+        self.__streams.add(stream)
+        try:
+            while True:
+                message = await stream.read_until(b"\n")
+                if self.__is_hub:
+                    self.__send(message, stream)
+                self.__dispatch(message)
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            self.__streams.discard(stream)
+
+    ################################################################################################
+    def __dispatch(self, message):
+        """ Calls the callbacks for an event.
+
+        Args:
+            message (bytes): The event, as sent by publish.
+        """
+        event, args = codec.loads(message)
+        for callback in self.__subscribers.get(event, []):
+            try:
+                callback(*args)
+            except Exception:
+                logger.error(traceback.format_exc())
+
+    ################################################################################################
+    def __resynchronise(self):
+        """ Calls the resynchronise callbacks. """
+        for callback in self.__resynchronise_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.error(traceback.format_exc())
+
+
+####################################################################################################
+class _HubServer(tornado.tcpserver.TCPServer):
+    """ Accepts the connections from the other processes to the hub. """
+    ################################################################################################
+    def __init__(self, broker):
+        """ Constructor.
+
+        Args:
+            broker (Broker): The hub.
+        """
+        super(_HubServer, self).__init__()
+        self.__broker = broker
+
+    ################################################################################################
+    async def handle_stream(self, stream, address):
+        """ Handles a connection from another process.
+
+        Args:
+            stream (tornado.iostream.IOStream): The connection.
+            address: The address of the other process, unused for Unix sockets.
+        """
+        await self.__broker.handle_stream(stream)
@@ -0,0 +1,250 @@
+import collections
+import tornado.concurrent
+import tornado.ioloop
+import traceback
+
+from . import codec
+from . import update
+import configuration.settings as settings
+from database import connector
+
+__author__ = "Thomas Henry Reeve"
+""" Module for combining the score updates a user makes in quick succession, e.g. while dragging a
+score slider, into one database write and one broadcast. """
+
+logger = settings.setup_custom_logger(__name__)
+
+
+####################################################################################################
+class ScoreCoalescer(object):
+    """ Collects a user's score updates for a short window, then writes only the latest score for
+    each entry and broadcasts the results once. Each update waits for the write and the broadcast,
+    so a client that has been answered can read its score back. A user's writes are made in the
+    order their windows closed, and each user's window is written separately, so one user's updates
+    never fail another's. If the write of a window fails each update in it is written on its own,
+    so an update only fails because of its own scores. Only used on the IOLoop, so there is no
+    lock. """
+    ################################################################################################
+    def __init__(self, database_connector, window_seconds):
+        """ Constructor.
+
+        Args:
+            database_connector (async_connector.AsyncDatabaseConnector): Used to write the scores.
+            window_seconds (float): How long to collect a user's updates for, after the first.
+        """
+        self.__database_connector = database_connector
+        self.__window_seconds = window_seconds
+        # Username to the updates waiting to be written: the latest access token, the scores and
+        # future of each update, and the timeout that closes the window.
+        self.__pending = {}
+        # Username to the future resolved once the write in progress has finished.
+        self.__writing = {}
+        self.__statistics = {"updates": 0, "writes": 0, "failed_writes": 0}
+
+    ################################################################################################
+    async def update_score(self, access_token, username, entry_id, score):
+        """ Updates a score once the current window for the user closes.
+
+        Args:
+            access_token (str): The user's access token.
+            username (str): The user's username.
+            entry_id (str): The ID of the entry.
+            score (int): The score.
+
+        Returns:
+            int: The score written for the entry, which is a later score if the user changed it
+            again within the window.
+
+        Raises:
+            ValueError: If the score is not in the correct range or the entry ID is invalid.
+            InvalidAccessTokenException: If the access token is no longer valid when written.
+        """
+        written_scores = await self.__add(access_token, username, [(entry_id, score)], False)
+        return written_scores[entry_id]
+
+    ################################################################################################
+    async def update_scores(self, access_token, username, scores):
+        """ Updates several scores after the user's earlier updates. The scores join the current
+        window for the user, which is closed straight away rather than holding the update up, as
+        the scores are not expected to change again soon. Either every score is updated or none
+        are.
+
+        Args:
+            access_token (str): The user's access token.
+            username (str): The user's username.
+            scores (list): The (entry ID, score) of each update, the last score for an entry is the
+            one written.
+
+        Returns:
+            dict: The entry ID to the score written for each entry, which is a later score if the
+            user changed it again within the window.
+
+        Raises:
+            ValueError: If any score is not in the correct range or any entry ID is invalid, in
+            which case none of the scores are updated.
+            InvalidAccessTokenException: If the access token is no longer valid when written.
+        """
+        return await self.__add(access_token, username, scores, True)
+
+    ################################################################################################
+    async def __add(self, access_token, username, scores, close_window):
+        """ Adds an update to the current window for the user, and waits for it to be written.
+
+        Args:
+            access_token (str): The user's access token.
+            username (str): The user's username.
+            scores (list): The (entry ID, score) of each update.
+            close_window (bool): Whether to close the window straight away.
+
+        Returns:
+            dict: The entry ID to the score written for each entry.
+        """
+        connector.validate_scores(scores)
+        if not scores:
+            return {}
+
+        self.__statistics["updates"] += len(scores)
+        io_loop = tornado.ioloop.IOLoop.current()
+        pending = self.__pending.get(username)
+        if pending is None:
+            pending = self.__pending[username] = {
+                "access_token": access_token,
+                "updates": [],
+                "timeout": io_loop.call_later(self.__window_seconds, self.__write, username)
+            }
+        pending["access_token"] = access_token
+        future = tornado.concurrent.Future()
+        pending["updates"].append((scores, future))
+
+        if close_window and pending["timeout"] is not None:
+            io_loop.remove_timeout(pending["timeout"])
+            pending["timeout"] = None
+            io_loop.add_callback(self.__write, username)
+
+        return await future
+
+    ################################################################################################
+    @staticmethod
+    def __merge(updates):
+        """ Merges updates into the latest score for each entry.
+
+        Args:
+            updates (list): The scores and future of each update, in the order they were made.
+
+        Returns:
+            collections.OrderedDict: The entry ID to score, in the order they were last changed.
+        """
+        scores = collections.OrderedDict()
+        for update_scores, _ in updates:
+            for entry_id, score in update_scores:
+                scores.pop(entry_id, None)
+                scores[entry_id] = score
+        return scores
+
+    ################################################################################################
+    async def __write(self, username):
+        """ Writes and broadcasts the user's pending updates.
+
+        Args:
+            username (str): The user's username.
+        """
+        pending = self.__pending.pop(username)
+        previous_write = self.__writing.get(username)
+        written = self.__writing[username] = tornado.concurrent.Future()
+        try:
+            if previous_write is not None:
+                await previous_write
+
+            access_token = pending["access_token"]
+            updates = pending["updates"]
+            # The error is only passed on straight away if the window has one update.
+            future = updates[0][1] if len(updates) == 1 else None
+            if not await self.__write_scores(access_token, self.__merge(updates).items(), future):
+                if future is not None:
+                    return
+                # Write each update on its own, so that only the updates that cannot be written
+                # fail, e.g. if an entry has been deleted since it was scored.
+                written_updates = []
+                for update_scores, update_future in updates:
+                    if await self.__write_scores(access_token, update_scores, update_future):
+                        written_updates.append((update_scores, update_future))
+                updates = written_updates
+                if not updates:
+                    return
+            scores = self.__merge(updates)
+
+            # The updates are answered once the results have been broadcast as well.
+            await self.__broadcast(access_token, scores)
+            for update_scores, future in updates:
+                future.set_result(dict((entry_id, scores[entry_id])
+                                       for entry_id, _ in update_scores))
+        finally:
+            written.set_result(None)
+            if self.__writing.get(username) is written:
+                del self.__writing[username]
+
+    ################################################################################################
+    async def __write_scores(self, access_token, scores, future):
+        """ Writes scores to the database.
+
+        Args:
+            access_token (str): The user's access token.
+            scores: The (entry ID, score) of each update.
+            future (tornado.concurrent.Future): Answered with the error if the write fails, None to
+            ignore the error. It is answered here, once the error has been caught, so the error's
+            traceback does not refer to the frames of the write that are still running.
+
+        Returns:
+            bool: True if the scores were written, False otherwise.
+        """
+        try:
+            await self.__database_connector.update_scores(access_token, list(scores))
+        except Exception as error:
+            self.__statistics["failed_writes"] += 1
+            if future is not None:
+                future.set_exception(error)
+            return False
+        self.__statistics["writes"] += 1
+        return True
+
+    ################################################################################################
+    async def __broadcast(self, access_token, scores):
+        """ Broadcasts the results of the entries and the leaderboard, and the new scores to the
+        user's clients.
+
+        Args:
+            access_token (str): The user's access token.
+            scores (dict): The entry ID to score of each update.
+        """
+        try:
+            await update.broadcast_results(self.__database_connector, list(scores))
+
+            if len(scores) == 1:
+                entry_id, score = next(iter(scores.items()))
+                update.broadcast_message(codec.dumps({
+                    "type": "scoreUpdate",
+                    "scoreUpdate": {
+                        "id": entry_id,
+                        "score": score
+                    }
+                }), access_token)
+            else:
+                update.broadcast_message(codec.dumps({
+                    "type": "scoreUpdates",
+                    "scoreUpdates": [{"id": entry_id, "score": score}
+                                     for entry_id, score in scores.items()]
+                }), access_token)
+        except Exception:
+            logger.error(traceback.format_exc())
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets statistics about the coalescing.
+
+        Returns:
+            dict: Dictionary containing the number of updates, writes and failed writes so far, and
+            the number of users with updates waiting to be written.
+        """
+        statistics = dict(self.__statistics)
+        statistics["pending_users"] = len(self.__pending)
+        return statistics
@@ -0,0 +1,120 @@
+import json
+
+import configuration.settings as settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__author__ = "Thomas Henry Reeve"
+""" Module for encoding and decoding JSON. The fastest installed library is used, orjson or ujson,
+falling back to the json module. Whichever is used, documents are encoded to the same compact UTF-8
+bytes, so they can be written to clients without encoding them again. """
+
+logger = settings.setup_custom_logger(__name__)
+
+
+####################################################################################################
+def _dumps_orjson(document):
+    """ Encodes a document with orjson. """
+    # Non string keys are needed for the results, which are keyed by score.
+    return orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS)
+
+
+####################################################################################################
+def _dumps_ujson(document):
+    """ Encodes a document with ujson. """
+    return ujson.dumps(document, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+
+# Reused, as json.dumps creates an encoder on every call when given any options.
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+####################################################################################################
+def _dumps_json(document):
+    """ Encodes a document with the json module. """
+    return _json_encoder.encode(document).encode()
+
+
+####################################################################################################
+def _loads_json(data):
+    """ Decodes a document with the json module, which only accepts bytes from Python 3.6. """
+    if isinstance(data, bytes):
+        data = data.decode()
+    return json.loads(data)
+
+
+####################################################################################################
+# The name of each library to its functions to encode and decode, fastest first.
+CODECS = {"json": (_dumps_json, _loads_json)}
+if ujson is not None:
+    CODECS["ujson"] = (_dumps_ujson, ujson.loads)
+if orjson is not None:
+    CODECS["orjson"] = (_dumps_orjson, orjson.loads)
+PREFERENCE = ["orjson", "ujson", "json"]
+
+# The library in use, see use_codec.
+name = None
+_dumps = None
+_loads = None
+
+
+####################################################################################################
+def use_codec(codec_name=None):
+    """ Chooses the library used to encode and decode JSON.
+
+    Args:
+        codec_name (str): "orjson", "ujson" or "json". If None the fastest installed is used.
+
+    Raises:
+        ValueError: If the library is not installed.
+    """
+    global name, _dumps, _loads
+    if codec_name is None:
+        codec_name = next(preferred for preferred in PREFERENCE if preferred in CODECS)
+    elif codec_name not in CODECS:
+        raise ValueError("JSON codec: '" + codec_name + "' is not installed.")
+    name = codec_name
+    _dumps, _loads = CODECS[codec_name]
+
+
+####################################################################################################
+def dumps(document):
+    """ Encodes a document as JSON.
+
+    Args:
+        document: The document, made of dicts, lists, strings, numbers, booleans and None. Dict
+        keys can be strings or integers.
+
+    Returns:
+        bytes: The compact JSON, encoded as UTF-8.
+    """
+    return _dumps(document)
+
+
+####################################################################################################
+def loads(data):
+    """ Decodes a JSON document.
+
+    Args:
+        data: The JSON, as bytes or a string.
+
+    Returns:
+        The document.
+
+    Raises:
+        ValueError: If the data is not valid JSON.
+    """
+    return _loads(data)
+
+
+####################################################################################################
+use_codec(settings.JSON_CODEC)
+logger.info("Using the " + name + " JSON codec.")
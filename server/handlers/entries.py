@@ -1,12 +1,11 @@
-import json
-import tornado.escape
 import tornado.web
 import traceback
 
 from . import authorization
-from . import update
+from . import codec
+from . import payloads
 import configuration.settings as settings
-from database import connector
+from database import connector, versions
 
 __author__ = "Thomas Henry Reeve"
 """ Module for handling requests to entries. """
@@ -14,6 +13,36 @@ __author__ = "Thomas Henry Reeve"
 logger = settings.setup_custom_logger(__name__)
 
 
+####################################################################################################
+def parse_scores(scores):
+    """ Parses the scores in a request to update several entries.
+
+    Args:
+        scores (list): The {"id": ..., "score": ...} of each update.
+
+    Returns:
+        list(tuple): The entry ID and score of each update.
+
+    Raises:
+        ValueError: If the scores are not a list of updates, an entry does not exist or a score
+        is not an integer.
+    """
+    if not isinstance(scores, list):
+        raise ValueError("Scores must be a list.")
+    parsed_scores = []
+    for update_request in scores:
+        if not isinstance(update_request, dict) or "id" not in update_request or \
+                "score" not in update_request:
+            raise ValueError("Each score must be an object with an id and a score.")
+        entry_id, score = update_request["id"], update_request["score"]
+        if entry_id not in settings.country_codes:
+            raise ValueError("Entry " + str(entry_id) + " does not exist.")
+        if not isinstance(score, int) or isinstance(score, bool):
+            raise ValueError("Score must be an integer.")
+        parsed_scores.append((entry_id, score))
+    return parsed_scores
+
+
 ####################################################################################################
 class EntriesHandler(tornado.web.RequestHandler):
     """ Handles requests to entries. """
@@ -26,17 +55,62 @@ class EntriesHandler(tornado.web.RequestHandler):
         EntriesHandler._handle_request_exception(self, exc)
 
     ################################################################################################
-    def get(self):
+    async def get(self):
         """ Handles getting all entries requests. """
         try:
             access_token = authorization.get_access_token(self.request)
-            entries = self.application.database_connector.generate_entries_dictionary(access_token)
+            if await payloads.is_not_modified(self, access_token, versions.ENTRIES):
+                return
+            user_scores = await self.application.database_connector.get_user_scores(access_token)
             self.set_status(200)
-            self.write(json.dumps({"data": entries}))
+            self.write(self.application.entries_payload.render(user_scores))
         except connector.InvalidAccessTokenException as error:
             logger.error(traceback.format_exc())
             self.set_status(401)
-            self.write(json.dumps(str(error)))
+            self.write(codec.dumps(str(error)))
+
+    ################################################################################################
+    async def patch(self):
+        """ Updates the scores for several entries at once, e.g. when a user reconnects after
+        scoring entries offline. The body is {"update": "score", "scores": [{"id": ..., "score":
+        ...}, ...]}. Either every score is updated or none are. The scores are written straight
+        away, with the user's other updates in the current window, see coalescer.ScoreCoalescer,
+        so they are written in the order they were made. A malformed body, or an entry that does
+        not exist, is rejected with a 400 and a message. """
+        try:
+            access_token = authorization.get_access_token(self.request)
+
+            try:
+                request = codec.loads(self.request.body)
+                if not isinstance(request, dict) or "update" not in request:
+                    raise ValueError("Body must be an object with an update type.")
+                if request["update"] != "score":
+                    self.set_status(500)
+                    self.write("Unknown update type")
+                    return
+                scores = parse_scores(request.get("scores"))
+            except ValueError as error:
+                self.set_status(400)
+                self.write(codec.dumps(str(error)))
+                return
+
+            username = await self.application.database_connector.get_username(access_token)
+            if not scores:
+                # Nothing to write, so the scores, their ETag and the results are unchanged.
+                self.set_status(200)
+                return
+            try:
+                await self.application.score_coalescer.update_scores(access_token, username,
+                                                                     scores)
+            except ValueError as error:
+                self.set_status(400)
+                self.write(codec.dumps(str(error)))
+                return
+            self.set_status(200)
+        except connector.InvalidAccessTokenException as error:
+            logger.error(traceback.format_exc())
+            self.set_status(401)
+            self.write(codec.dumps(str(error)))
 
 
 ####################################################################################################
@@ -51,7 +125,7 @@ class EntryHandler(tornado.web.RequestHandler):
         EntryHandler._handle_request_exception(self, exc)
 
     ################################################################################################
-    def get(self, sub_path):
+    async def get(self, sub_path):
         """ Gets a single entry.
 
         :param sub_path: The path after the path defined in the routes containing the entry ID.
@@ -60,17 +134,22 @@ class EntryHandler(tornado.web.RequestHandler):
         try:
             access_token = authorization.get_access_token(self.request)
             entry_id = sub_path
-            entry = self.application.database_connector.get_entry(access_token, entry_id)
+            if await payloads.is_not_modified(self, access_token, versions.ENTRIES):
+                return
+            score = await self.application.database_connector.get_score(access_token, entry_id)
             self.set_status(200)
-            self.write(json.dumps({"data": entry}))
+            self.write(self.application.entries_payload.render_entry(entry_id, score))
         except connector.InvalidAccessTokenException as error:
             logger.error(traceback.format_exc())
             self.set_status(401)
-            self.write(json.dumps(str(error)))
+            self.write(codec.dumps(str(error)))
 
     ################################################################################################
-    def patch(self, sub_path):
-        """ Updates the score for the entry.
+    async def patch(self, sub_path):
+        """ Updates the score for the entry. Updates made in quick succession are written together,
+        see coalescer.ScoreCoalescer, and the response is sent once the score has been written. The
+        body of the response is the entry's score, which is a later score if the user changed it
+        again before it was written.
 
         :param sub_path: The path after the path defined in the routes containing the entry ID.
         :type sub_path: str
@@ -83,32 +162,29 @@ class EntryHandler(tornado.web.RequestHandler):
                 self.set_status(404)
                 return
 
-            request = tornado.escape.json_decode(self.request.body)
+            request = codec.loads(self.request.body)
             if request["update"] == "score":
                 new_score = request["score"]
-
-                self.application.database_connector.update_score(access_token, entry_id, new_score)
+                if not isinstance(new_score, int) or isinstance(new_score, bool):
+                    self.set_status(400)
+                    self.write(codec.dumps("Score must be an integer."))
+                    return
+
+                username = await self.application.database_connector.get_username(access_token)
+                try:
+                    score = await self.application.score_coalescer.update_score(
+                        access_token, username, entry_id, new_score)
+                except ValueError as error:
+                    self.set_status(400)
+                    self.write(codec.dumps(str(error)))
+                    return
                 self.set_status(200)
-
-                results = self.application.database_connector.generate_results_dictionary([entry_id])
-
-                update.broadcast_message(json.dumps({
-                    "type": "results",
-                    "results": results
-                }))
-
-                update.broadcast_message(json.dumps({
-                    "type": "scoreUpdate",
-                    "scoreUpdate": {
-                        "id": entry_id,
-                        "score": new_score
-                    }
-                }), access_token)
+                self.write(codec.dumps({"id": entry_id, "score": score}))
             else:
                 self.set_status(500)
                 self.write("Unknown update type")
         except connector.InvalidAccessTokenException as error:
             logger.error(traceback.format_exc())
             self.set_status(401)
-            self.write(json.dumps(str(error)))
+            self.write(codec.dumps(str(error)))
 
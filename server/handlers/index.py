@@ -1,12 +1,89 @@
+import gzip
+import hashlib
+import os
 import tornado.web
 
+from . import static
+
 __author__ = "Thomas Henry Reeve"
 """ Module for rendering the index page. """
 
+# The index page built by the UI.
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dist", "index.html")
+
+
+####################################################################################################
+class IndexPage(object):
+    """ The index page, read once and kept in memory with its gzip copy and ETags. The page is read
+    again if the file is modified. Only used on the IOLoop, so it is not thread safe. """
+    ################################################################################################
+    def __init__(self, path):
+        """ Constructor.
+
+        Args:
+            path (str): The path of the index page.
+        """
+        self.__path = path
+        self.__modified = None
+        self.body = None
+        self.gzip_body = None
+        self.etag = None
+        self.gzip_etag = None
+
+    ################################################################################################
+    def reload_if_modified(self):
+        """ Reads the page if the file has been modified since it was last read. """
+        stat_result = os.stat(self.__path)
+        modified = (stat_result.st_mtime, stat_result.st_size)
+        if modified == self.__modified:
+            return
+
+        with open(self.__path, "rb") as file:
+            self.body = file.read()
+        self.gzip_body = gzip.compress(self.body, compresslevel=9)
+        version = hashlib.md5(self.body).hexdigest()
+        # Each encoding is a different representation, so they have different ETags.
+        self.etag = '"' + version + '"'
+        self.gzip_etag = '"' + version + '-gzip"'
+        self.__modified = modified
+
 
 ####################################################################################################
 class IndexHandler(tornado.web.RequestHandler):
+    """ Serves the index page for every path the UI handles. """
+
+    # Path to the IndexPage, shared by every request.
+    pages = {}
+
+    ################################################################################################
+    def initialize(self, path=INDEX_PATH):
+        """ Initialises the handler.
+
+        Args:
+            path (str): The path of the index page.
+        """
+        self.page = IndexHandler.pages.get(path)
+        if self.page is None:
+            self.page = IndexHandler.pages[path] = IndexPage(path)
+
     ################################################################################################
-    @tornado.web.asynchronous
     def get(self):
-        self.render("../dist/index.html")
+        self.page.reload_if_modified()
+
+        self.set_header("Content-Type", "text/html; charset=UTF-8")
+        self.set_header("Vary", "Accept-Encoding")
+        # The page names the fingerprinted assets, so browsers must check for a new build.
+        self.set_header("Cache-Control", "no-cache")
+
+        if "gzip" in static.get_accepted_encodings(self.request.headers.get("Accept-Encoding", "")):
+            self.set_header("Content-Encoding", "gzip")
+            self.set_header("Etag", self.page.gzip_etag)
+            body = self.page.gzip_body
+        else:
+            self.set_header("Etag", self.page.etag)
+            body = self.page.body
+
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        self.finish(body)
@@ -0,0 +1,47 @@
+import tornado.web
+import traceback
+
+from . import authorization
+from . import codec
+import configuration.settings as settings
+from database import connector, leaderboard
+
+__author__ = "Thomas Henry Reeve"
+""" Module for handling requests to the leaderboard. """
+
+logger = settings.setup_custom_logger(__name__)
+
+
+####################################################################################################
+class LeaderboardHandler(tornado.web.RequestHandler):
+    """ Handles requests to the leaderboard. """
+    ################################################################################################
+    async def get(self):
+        """ Gets the entries ranked by their scores. The optional "order" argument is "total", the
+        default, or "average". The optional "start" and "count" arguments get part of the ranking,
+        e.g. start=0&count=10 for the top ten. """
+        try:
+            access_token = authorization.get_access_token(self.request)
+            await self.application.database_connector.get_username(access_token)
+
+            order = self.get_argument("order", leaderboard.TOTAL)
+            try:
+                start = int(self.get_argument("start", 0))
+                count = self.get_argument("count", None)
+                count = None if count is None else int(count)
+                if start < 0 or (count is not None and count < 0):
+                    raise ValueError("The start and count must not be negative.")
+                ranking = await self.application.database_connector.get_leaderboard(order, start,
+                                                                                    count)
+            except ValueError as error:
+                self.set_status(400)
+                self.write(codec.dumps(str(error)))
+                return
+
+            self.set_status(200)
+            self.set_header("Cache-Control", "no-cache")
+            self.write(codec.dumps({"order": order, "leaderboard": ranking}))
+        except connector.InvalidAccessTokenException as error:
+            logger.error(traceback.format_exc())
+            self.set_status(401)
+            self.write(codec.dumps(str(error)))
@@ -0,0 +1,276 @@
+import tornado.log
+import tornado.web
+
+from . import static
+from . import update
+import configuration.settings as settings
+from database import histogram
+
+__author__ = "Thomas Henry Reeve"
+""" Module for measuring the requests and database queries, and serving the measurements in the
+Prometheus text format. Each process is measured separately, so every sample is labelled with the
+process it came from. """
+
+logger = settings.setup_custom_logger(__name__)
+
+# The quantiles estimated from each histogram.
+QUANTILES = (0.5, 0.95, 0.99)
+
+# The label for requests that do not match a route.
+OTHER_ROUTE = "other"
+
+
+####################################################################################################
+class RequestMetrics(object):
+    """ Counts the requests to each route by method and status, and how long they take. Only used on
+    the IOLoop, so there is no lock. """
+    ################################################################################################
+    def __init__(self):
+        """ Constructor. """
+        # (route, method, status) to the number of requests.
+        self.__counts = {}
+        # (route, method) to the histogram of how long the requests took.
+        self.__durations = {}
+
+    ################################################################################################
+    def log_request(self, handler):
+        """ Records a finished request and writes it to the access log, as Tornado does. Used as the
+        application's log_function.
+
+        Args:
+            handler (tornado.web.RequestHandler): The handler that served the request.
+        """
+        status = handler.get_status()
+        seconds = handler.request.request_time()
+        self.observe(get_route(handler), handler.request.method, status, seconds)
+
+        if status < 400:
+            log_method = tornado.log.access_log.info
+        elif status < 500:
+            log_method = tornado.log.access_log.warning
+        else:
+            log_method = tornado.log.access_log.error
+        log_method("%d %s %.2fms", status, handler._request_summary(), 1000.0 * seconds)
+
+    ################################################################################################
+    def observe(self, route, method, status, seconds):
+        """ Records a finished request.
+
+        Args:
+            route (str): The route the request matched.
+            method (str): The HTTP method.
+            status (int): The status of the response.
+            seconds (float): How long the request took.
+        """
+        key = (route, method, status)
+        self.__counts[key] = self.__counts.get(key, 0) + 1
+
+        key = (route, method)
+        durations = self.__durations.get(key)
+        if durations is None:
+            durations = self.__durations[key] = histogram.Histogram()
+        durations.observe(seconds)
+
+    ################################################################################################
+    def get_counts(self):
+        """ Gets the number of requests so far.
+
+        Returns:
+            dict: (route, method, status) to the number of requests.
+        """
+        return dict(self.__counts)
+
+    ################################################################################################
+    def get_durations(self):
+        """ Gets how long requests have taken so far.
+
+        Returns:
+            dict: (route, method) to the histogram.Histogram snapshot of the request durations.
+        """
+        return {key: durations.get_snapshot() for key, durations in self.__durations.items()}
+
+
+####################################################################################################
+def get_route(handler):
+    """ Gets the route a request matched, so requests for different entries or files are counted
+    together.
+
+    Args:
+        handler (tornado.web.RequestHandler): The handler serving the request.
+
+    Returns:
+        str: The pattern of the first route matching the request's path, or OTHER_ROUTE.
+    """
+    for rule in handler.application.wildcard_router.rules:
+        regex = getattr(rule.matcher, "regex", None)
+        if regex is not None and regex.match(handler.request.path):
+            return regex.pattern.rstrip("$")
+    return OTHER_ROUTE
+
+
+####################################################################################################
+def format_labels(labels):
+    """ Formats the labels of a sample.
+
+    Args:
+        labels (list): The name and value of each label, in order.
+
+    Returns:
+        str: The labels, e.g. '{route="/api/entries",method="GET"}'.
+    """
+    return "{" + ",".join(
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") +
+        '"' for name, value in labels) + "}"
+
+
+####################################################################################################
+def format_value(value):
+    """ Formats the value of a sample.
+
+    Args:
+        value: The value, an int, float, or None for a quantile without observations.
+
+    Returns:
+        str: The value.
+    """
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+####################################################################################################
+class MetricsHandler(tornado.web.RequestHandler):
+    """ Serves the metrics of this process in the Prometheus text format, to the addresses in
+    settings.METRICS_ALLOWED_ADDRESSES. """
+    ################################################################################################
+    def initialize(self, request_metrics, process=0):
+        """ Initialises the handler.
+
+        Args:
+            request_metrics (RequestMetrics): The request metrics of the application.
+            process (int): The number of this process, see tornado.process.fork_processes.
+        """
+        self.request_metrics = request_metrics
+        self.process = process
+        self.lines = []
+
+    ################################################################################################
+    def prepare(self):
+        """ Refuses requests from addresses that are not allowed to read the metrics.
+
+        Raises:
+            tornado.web.HTTPError: A 403 if the address is not allowed.
+        """
+        if self.request.remote_ip not in settings.METRICS_ALLOWED_ADDRESSES:
+            raise tornado.web.HTTPError(403)
+
+    ################################################################################################
+    def get(self):
+        """ Gets the metrics. """
+        self.add_metric("vision_requests_total", "counter", "Requests served.", [
+            ([("route", route), ("method", method), ("status", status)], count)
+            for (route, method, status), count in sorted(self.request_metrics.get_counts().items())
+        ])
+
+        durations = sorted(self.request_metrics.get_durations().items())
+        self.add_histogram("vision_request_duration_seconds", "Time taken to serve requests.", [
+            ([("route", route), ("method", method)], snapshot)
+            for (route, method), snapshot in durations
+        ])
+
+        statistics = self.application.database_connector.get_statistics()
+        self.add_histogram("vision_database_query_duration_seconds",
+                           "Time taken to execute database statements, including retries.",
+                           [([], statistics["queries"])])
+        self.add_metric("vision_database_commits_total", "counter", "Database commits.",
+                        [([], statistics["commits"])])
+
+        self.add_statistics("vision_database_pool", "Database connection pool",
+                            statistics["pool"])
+        self.add_statistics("vision_password_hasher", "Password hasher",
+                            statistics["password_hasher"])
+        self.add_statistics("vision_access_token_cache", "Access token cache",
+                            statistics["access_token_cache"])
+        self.add_statistics("vision_static_memory_cache", "Static file memory cache",
+                            static.StaticFileHandler.memory_cache.get_statistics())
+        score_coalescer = getattr(self.application, "score_coalescer", None)
+        if score_coalescer is not None:
+            self.add_statistics("vision_score_coalescer", "Score coalescer",
+                                score_coalescer.get_statistics())
+        self.add_metric("vision_websocket_clients", "gauge", "Open websocket connections.",
+                        [([], len(update.clients))])
+        self.add_statistics("vision_websocket", "Websocket connections",
+                            update.clients.get_statistics())
+
+        self.set_status(200)
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        self.write("\n".join(self.lines) + "\n")
+
+    ################################################################################################
+    def add_metric(self, name, metric_type, description, samples):
+        """ Adds a metric to the response.
+
+        Args:
+            name (str): The name of the metric.
+            metric_type (str): "counter", "gauge", "histogram" or "untyped".
+            description (str): The help text.
+            samples (list): The labels, see format_labels, and value of each sample.
+        """
+        self.lines.append("# HELP " + name + " " + description)
+        self.lines.append("# TYPE " + name + " " + metric_type)
+        self.add_samples(name, samples)
+
+    ################################################################################################
+    def add_samples(self, name, samples):
+        """ Adds samples to the response, labelled with the process.
+
+        Args:
+            name (str): The name of the samples.
+            samples (list): The labels, see format_labels, and value of each sample.
+        """
+        for labels, value in samples:
+            self.lines.append(name + format_labels([("process", self.process)] + labels) + " " +
+                              format_value(value))
+
+    ################################################################################################
+    def add_histogram(self, name, description, snapshots):
+        """ Adds a histogram to the response, with a gauge of its estimated quantiles.
+
+        Args:
+            name (str): The name of the histogram, which should end with its unit.
+            description (str): The help text.
+            snapshots (list): The labels, see format_labels, and histogram.Histogram snapshot of
+            each sample.
+        """
+        self.lines.append("# HELP " + name + " " + description)
+        self.lines.append("# TYPE " + name + " histogram")
+        for labels, snapshot in snapshots:
+            self.add_samples(name + "_bucket", [
+                (labels + [("le", "+Inf" if upper_bound is None else repr(upper_bound))], count)
+                for upper_bound, count in snapshot["buckets"]
+            ])
+            self.add_samples(name + "_sum", [(labels, float(snapshot["sum"]))])
+            self.add_samples(name + "_count", [(labels, snapshot["count"])])
+
+        self.add_metric(name + "_quantile", "gauge", description + " Estimated quantiles.", [
+            (labels + [("quantile", repr(quantile))],
+             histogram.get_quantile(snapshot, quantile))
+            for labels, snapshot in snapshots for quantile in QUANTILES
+        ])
+
+    ################################################################################################
+    def add_statistics(self, prefix, description, statistics):
+        """ Adds a gauge for each numeric statistic of a component.
+
+        Args:
+            prefix (str): The start of the names of the gauges.
+            description (str): The name of the component for the help text.
+            statistics (dict): The statistics, e.g. from pool.ConnectionPool.get_statistics.
+        """
+        for key, value in sorted(statistics.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.add_metric(prefix + "_" + key, "gauge", description + ": " + key + ".",
+                                [([], value)])
@@ -0,0 +1,132 @@
+import copy
+
+from . import codec
+
+__author__ = "Thomas Henry Reeve"
+""" Module for building response bodies that are mostly the same for every user, and for telling
+clients their copy of a body is still up to date. """
+
+# Written in place of the scores while serialising, then split on.
+SCORE_PLACEHOLDER = "\u0000score\u0000"
+
+
+####################################################################################################
+async def is_not_modified(handler, access_token, resource):
+    """ Sets the ETag for the user's resource, and checks if the client already has that version.
+    Only the access token cache and the version counters are used, so the database is not read when
+    the access token is cached.
+
+    Args:
+        handler (tornado.web.RequestHandler): The handler for the request.
+        access_token (str): The access token the client has sent.
+        resource (str): The resource, versions.ENTRIES or versions.SETTINGS.
+
+    Returns:
+        bool: True if the client's version is up to date, in which case the status is set to 304.
+
+    Raises:
+        InvalidAccessTokenException: If the access token is invalid.
+    """
+    database_connector = handler.application.database_connector
+    username = await database_connector.get_username(access_token)
+    handler.set_header("Etag", database_connector.get_etag(username, resource))
+    # Clients must check their copy is up to date before using it.
+    handler.set_header("Cache-Control", "private, no-cache")
+
+    if handler.check_etag_header():
+        handler.set_status(304)
+        return True
+    return False
+
+
+####################################################################################################
+class EntriesPayload(object):
+    """ The entries response body. The entries are serialised once, only the user's scores are
+    written into the body for each request. """
+    ################################################################################################
+    def __init__(self, entries, minimum_score=-1, maximum_score=10):
+        """ Constructor.
+
+        Args:
+            entries (list): The entries from the settings.
+            minimum_score (int): The lowest score, which is given to entries the user has not
+            scored.
+            maximum_score (int): The highest score.
+        """
+        self.__entry_ids = [entry["id"] for entry in entries]
+        self.__default_score = minimum_score
+        self.__scores = dict((score, str(score).encode()) for score in
+                             range(minimum_score, maximum_score + 1))
+
+        self.__fragments = EntriesPayload.__split({"data": self.__with_placeholders(entries)},
+                                                  len(entries))
+        self.__entry_fragments = dict(
+            (entry["id"], EntriesPayload.__split({"data": self.__with_placeholders([entry])[0]}, 1))
+            for entry in entries)
+
+    ################################################################################################
+    @staticmethod
+    def __with_placeholders(entries):
+        """ Copies the entries with the placeholder as the score.
+
+        Args:
+            entries (list): The entries.
+
+        Returns:
+            list: The copies.
+        """
+        entries_copy = copy.deepcopy(entries)
+        for entry in entries_copy:
+            entry["attributes"]["score"] = SCORE_PLACEHOLDER
+        return entries_copy
+
+    ################################################################################################
+    @staticmethod
+    def __split(document, number_of_scores):
+        """ Serialises a document and splits it where the scores go.
+
+        Args:
+            document (dict): The document, with the placeholder as the scores.
+            number_of_scores (int): The number of placeholders in the document.
+
+        Returns:
+            list(bytes): The serialised document either side of each score.
+        """
+        fragments = codec.dumps(document).split(codec.dumps(SCORE_PLACEHOLDER))
+        if len(fragments) != number_of_scores + 1:
+            raise ValueError("The entries must not contain the score placeholder.")
+        return fragments
+
+    ################################################################################################
+    def render(self, user_scores):
+        """ Creates the body for a request for every entry.
+
+        Args:
+            user_scores (dict): Dictionary of entry ID to the score the user gave the entry. Entries
+            that are missing have not been scored by the user.
+
+        Returns:
+            bytes: The body, the same as codec.dumps({"data": entries}) with the user's scores.
+        """
+        parts = [self.__fragments[0]]
+        for entry_id, fragment in zip(self.__entry_ids, self.__fragments[1:]):
+            parts.append(self.__scores[user_scores.get(entry_id, self.__default_score)])
+            parts.append(fragment)
+        return b"".join(parts)
+
+    ################################################################################################
+    def render_entry(self, entry_id, score):
+        """ Creates the body for a request for one entry.
+
+        Args:
+            entry_id (str): The ID of the entry.
+            score (int): The score the user gave the entry.
+
+        Returns:
+            bytes: The body, the same as codec.dumps({"data": entry}) with the user's score.
+
+        Raises:
+            KeyError: If the entry does not exist.
+        """
+        before, after = self.__entry_fragments[entry_id]
+        return b"".join((before, self.__scores[score], after))
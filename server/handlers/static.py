@@ -0,0 +1,323 @@
+import collections
+import mimetypes
+import os
+import re
+import stat
+import tornado.web
+
+import configuration.settings as settings
+
+__author__ = "Thomas Henry Reeve"
+""" Module for serving the static files built by the UI, e.g. the Ember bundle, fonts and flags. """
+
+# The encodings of the precompressed files, in order of preference, and their file extensions.
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# The fingerprint broccoli-asset-rev adds to file names, e.g. vision-<md5 of the file>.js.
+FINGERPRINT = re.compile(r"-[0-9a-f]{32}\.[^/]+$")
+
+# How long fingerprinted files are cached for. A year is the longest time allowed.
+IMMUTABLE_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+
+####################################################################################################
+def get_accepted_encodings(accept_encoding):
+    """ Gets the encodings a client accepts.
+
+    Args:
+        accept_encoding (str): The Accept-Encoding header, e.g. "gzip, deflate, br;q=0.9".
+
+    Returns:
+        set: The encodings that the client has not given a quality of 0.
+    """
+    encodings = set()
+    for coding in accept_encoding.split(","):
+        parameters = coding.split(";")
+        name = parameters[0].strip().lower()
+        quality = 1.0
+        for parameter in parameters[1:]:
+            key, _, value = parameter.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.add(name)
+    return encodings
+
+
+####################################################################################################
+def get_modified_time(path):
+    """ Gets when a file was last modified.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        float: The modified time, or None if the file does not exist or is not a file.
+    """
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_mtime if stat.S_ISREG(stat_result.st_mode) else None
+
+
+####################################################################################################
+class FileCache(object):
+    """ Least recently used cache of the contents of small files. Files are checked for changes
+    before every use. Only used on the IOLoop, so it is not thread safe. """
+    ################################################################################################
+    def __init__(self, maximum_size, maximum_file_size):
+        """ Constructor.
+
+        Args:
+            maximum_size (int): The maximum number of bytes to keep. If 0 nothing is cached.
+            maximum_file_size (int): The largest file to keep, in bytes.
+        """
+        self.__maximum_size = maximum_size
+        self.__maximum_file_size = min(maximum_file_size, maximum_size)
+        self.__size = 0
+        # Path to (modified time, size, contents), least recently used first.
+        self.__files = collections.OrderedDict()
+        self.__statistics = {
+            "hits": 0,
+            "misses": 0,
+            "evicted": 0
+        }
+
+    ################################################################################################
+    def get(self, path):
+        """ Gets the contents of a file.
+
+        Args:
+            path (str): The absolute path of the file.
+
+        Returns:
+            bytes: The contents, or None if the file is too large to cache.
+        """
+        stat_result = os.stat(path)
+        if stat_result.st_size > self.__maximum_file_size:
+            return None
+
+        entry = self.__files.get(path)
+        if entry is not None and entry[:2] == (stat_result.st_mtime, stat_result.st_size):
+            self.__files.move_to_end(path)
+            self.__statistics["hits"] += 1
+            return entry[2]
+        self.__statistics["misses"] += 1
+
+        with open(path, "rb") as file:
+            contents = file.read()
+        self.__put(path, (stat_result.st_mtime, len(contents), contents))
+        return contents
+
+    ################################################################################################
+    def __put(self, path, entry):
+        """ Adds a file, removing the least recently used files to make space.
+
+        Args:
+            path (str): The absolute path of the file.
+            entry (tuple): The modified time, size and contents of the file.
+        """
+        previous = self.__files.pop(path, None)
+        if previous is not None:
+            self.__size -= previous[1]
+
+        while self.__files and self.__size + entry[1] > self.__maximum_size:
+            _, (_, size, _) = self.__files.popitem(last=False)
+            self.__size -= size
+            self.__statistics["evicted"] += 1
+
+        if entry[1] <= self.__maximum_size:
+            self.__files[path] = entry
+            self.__size += entry[1]
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets the statistics of the cache.
+
+        Returns:
+            dict: The hits, misses and evictions so far, the number of files, and the size and
+            maximum size in bytes.
+        """
+        statistics = dict(self.__statistics)
+        statistics["files"] = len(self.__files)
+        statistics["size"] = self.__size
+        statistics["maximum_size"] = self.__maximum_size
+        return statistics
+
+
+####################################################################################################
+class StaticFileHandler(tornado.web.StaticFileHandler):
+    """ Serves static files, using the precompressed .br or .gz copy of a file when the client
+    accepts it. Fingerprinted files are cached forever and small files are kept in memory. """
+
+    # Shared by every handler, so each file is only kept once.
+    memory_cache = FileCache(settings.STATIC_MEMORY_CACHE_SIZE,
+                             settings.STATIC_MEMORY_CACHE_FILE_SIZE)
+
+    # Absolute path to the modified time of the file, and the encoding, path and modified time of
+    # each precompressed copy of it.
+    __precompressed_paths = {}
+
+    ################################################################################################
+    def initialize(self, path, default_filename=None, cache_seconds=0, precompressed=True):
+        """ Initialises the handler.
+
+        Args:
+            path (str): The directory, or file, to serve.
+            default_filename (str): The file to serve when a directory is requested.
+            cache_seconds (int): How long browsers cache files that are not fingerprinted. If 0
+            they must check the file has not changed before every use.
+            precompressed (bool): Whether to look for precompressed copies of the files.
+        """
+        super(StaticFileHandler, self).initialize(path, default_filename)
+        self.cache_seconds = cache_seconds
+        self.precompressed = precompressed
+        self.uncompressed_path = None
+        self.content_encoding = None
+
+    ################################################################################################
+    def validate_absolute_path(self, root, absolute_path):
+        """ Validates the path, and swaps it for a precompressed copy the client accepts.
+
+        Args:
+            root (str): The directory being served.
+            absolute_path (str): The absolute path of the requested file.
+
+        Returns:
+            str: The absolute path of the file to send.
+        """
+        absolute_path = super(StaticFileHandler, self).validate_absolute_path(root, absolute_path)
+        self.uncompressed_path = absolute_path
+        if absolute_path is None or not self.precompressed:
+            return absolute_path
+
+        accepted_encodings = get_accepted_encodings(
+            self.request.headers.get("Accept-Encoding", ""))
+        precompressed = StaticFileHandler.__get_precompressed_path(absolute_path,
+                                                                   accepted_encodings)
+        if precompressed is None:
+            return absolute_path
+        self.content_encoding, path = precompressed
+        # Validated as well, so the size and modified time are the copy's.
+        return super(StaticFileHandler, self).validate_absolute_path(root, path)
+
+    ################################################################################################
+    @staticmethod
+    def __get_precompressed_path(absolute_path, accepted_encodings):
+        """ Gets the precompressed copy of a file to send. Copies older than the file are ignored.
+        The copies are looked for again when the file changes, or when the copy to send has changed
+        or been deleted, e.g. because the UI was rebuilt while the server was running.
+
+        Args:
+            absolute_path (str): The absolute path of the file.
+            accepted_encodings (set): The encodings the client accepts.
+
+        Returns:
+            tuple: The encoding and absolute path of the copy, or None if there is no copy in an
+            encoding the client accepts.
+        """
+        modified = os.path.getmtime(absolute_path)
+        entry = StaticFileHandler.__precompressed_paths.get(absolute_path)
+        if entry is None or entry[0] != modified:
+            entry = StaticFileHandler.__find_precompressed_paths(absolute_path, modified)
+
+        copies = [copy for copy in entry[1] if copy[0] in accepted_encodings]
+        if copies and get_modified_time(copies[0][1]) != copies[0][2]:
+            entry = StaticFileHandler.__find_precompressed_paths(absolute_path, modified)
+            copies = [copy for copy in entry[1] if copy[0] in accepted_encodings]
+        return copies[0][:2] if copies else None
+
+    ################################################################################################
+    @staticmethod
+    def __find_precompressed_paths(absolute_path, modified):
+        """ Finds the precompressed copies of a file that are not older than it, and remembers
+        them.
+
+        Args:
+            absolute_path (str): The absolute path of the file.
+            modified (float): When the file was last modified.
+
+        Returns:
+            tuple: The modified time of the file, and the encoding, absolute path and modified time
+            of each copy, in order of preference.
+        """
+        paths = []
+        for encoding, extension in ENCODINGS:
+            copy_modified = get_modified_time(absolute_path + extension)
+            if copy_modified is not None and copy_modified >= modified:
+                paths.append((encoding, absolute_path + extension, copy_modified))
+        entry = (modified, paths)
+        StaticFileHandler.__precompressed_paths[absolute_path] = entry
+        return entry
+
+    ################################################################################################
+    def get_content_type(self):
+        """ Gets the type of the file, rather than of its precompressed copy.
+
+        Returns:
+            str: The MIME type.
+        """
+        mime_type, encoding = mimetypes.guess_type(self.uncompressed_path)
+        if encoding is None and mime_type is not None:
+            return mime_type
+        return super(StaticFileHandler, self).get_content_type()
+
+    ################################################################################################
+    def set_extra_headers(self, path):
+        """ Sets the encoding and caching headers.
+
+        Args:
+            path (str): The requested path.
+        """
+        if self.precompressed:
+            self.set_header("Vary", "Accept-Encoding")
+        if self.content_encoding is not None:
+            self.set_header("Content-Encoding", self.content_encoding)
+
+        if FINGERPRINT.search(path):
+            self.set_header("Cache-Control",
+                            "public, max-age=" + str(IMMUTABLE_CACHE_SECONDS) + ", immutable")
+        elif self.cache_seconds > 0:
+            self.set_header("Cache-Control", "public, max-age=" + str(self.cache_seconds))
+        else:
+            self.set_header("Cache-Control", "no-cache")
+
+    ################################################################################################
+    def get_cache_time(self, path, modified, mime_type):
+        """ Gets how long the file can be cached for, which sets the Expires header.
+
+        Args:
+            path (str): The requested path.
+            modified (datetime.datetime): When the file was last modified.
+            mime_type (str): The MIME type of the file.
+
+        Returns:
+            int: The number of seconds.
+        """
+        if FINGERPRINT.search(path):
+            return IMMUTABLE_CACHE_SECONDS
+        return self.cache_seconds
+
+    ################################################################################################
+    @classmethod
+    def get_content(cls, abspath, start=None, end=None):
+        """ Gets the contents of a file, from memory if the file is small enough.
+
+        Args:
+            abspath (str): The absolute path of the file.
+            start (int): The first byte to get.
+            end (int): The byte after the last byte to get.
+
+        Returns:
+            The contents, either bytes or an iterator of bytes.
+        """
+        contents = cls.memory_cache.get(abspath)
+        if contents is None:
+            return super(StaticFileHandler, cls).get_content(abspath, start, end)
+        if start is None and end is None:
+            return contents
+        return contents[start:end]
@@ -1,33 +1,313 @@
 import datetime
-import json
+import struct
+import time
+import tornado.escape
+import tornado.ioloop
+import tornado.iostream
 import tornado.websocket
 import traceback
 
+from . import codec
 import configuration.settings as settings
+from database import leaderboard
 
 logger = settings.setup_custom_logger(__name__)
 
 
 ####################################################################################################
-clients = {}
+class Client(object):
+    """ A websocket connection, the user it belongs to once it has sent a message, and how far
+    behind it has fallen. """
+    __slots__ = ("handler", "username", "access_token", "behind_since", "dropped_messages")
+
+    ################################################################################################
+    def __init__(self, handler):
+        """ Constructor.
+
+        Args:
+            handler (UpdateHandler): The connection.
+        """
+        self.handler = handler
+        self.username = None
+        self.access_token = None
+        # When the connection fell behind, None if it is keeping up, see
+        # ClientRegistry.check_backlog.
+        self.behind_since = None
+        # The broadcasts dropped since it fell behind.
+        self.dropped_messages = 0
+
+
+# What to do with a broadcast of the results to a connection, see ClientRegistry.check_backlog.
+SEND = "send"
+DROP = "drop"
+CATCH_UP = "catch_up"
+CLOSE = "close"
+
+
+####################################################################################################
+class ClientRegistry(object):
+    """ The open websocket connections, indexed by access token and username so the connections of
+    one user can be found without looking at every connection. Only used on the IOLoop, so there is
+    no lock. """
+    ################################################################################################
+    def __init__(self):
+        """ Constructor. """
+        # Connection to its Client.
+        self.__clients = {}
+        # Access token, or username, to the set of connections that have sent it.
+        self.__by_access_token = {}
+        self.__by_username = {}
+        # The broadcasts dropped, and connections closed, as they had fallen behind.
+        self.__dropped_messages = 0
+        self.__closed_connections = 0
+
+    ################################################################################################
+    def __len__(self):
+        """ Gets the number of connections.
+
+        Returns:
+            int: The number of connections.
+        """
+        return len(self.__clients)
+
+    ################################################################################################
+    def __contains__(self, handler):
+        """ Checks if a connection is open.
+
+        Args:
+            handler (UpdateHandler): The connection.
+
+        Returns:
+            bool: True if the connection has been added and not removed.
+        """
+        return handler in self.__clients
+
+    ################################################################################################
+    def add(self, handler):
+        """ Adds a connection that has just been opened.
+
+        Args:
+            handler (UpdateHandler): The connection.
+        """
+        self.__clients[handler] = Client(handler)
+
+    ################################################################################################
+    def identify(self, handler, username, access_token):
+        """ Records the user of a connection. Only the first username and access token a connection
+        sends are recorded.
+
+        Args:
+            handler (UpdateHandler): The connection.
+            username (str): The user's username.
+            access_token (str): The access token the connection has sent.
+        """
+        client = self.__clients.get(handler)
+        if client is None:
+            return
+        if client.username is None:
+            client.username = username
+            self.__by_username.setdefault(username, set()).add(handler)
+        if client.access_token is None:
+            client.access_token = access_token
+            self.__by_access_token.setdefault(access_token, set()).add(handler)
+
+    ################################################################################################
+    def remove(self, handler):
+        """ Removes a connection.
+
+        Args:
+            handler (UpdateHandler): The connection.
+
+        Returns:
+            bool: True if the connection was removed, False if it had already been.
+        """
+        client = self.__clients.pop(handler, None)
+        if client is None:
+            return False
+        self.__discard(self.__by_username, client.username, handler)
+        self.__discard(self.__by_access_token, client.access_token, handler)
+        return True
+
+    ################################################################################################
+    @staticmethod
+    def __discard(index, key, handler):
+        """ Removes a connection from an index.
+
+        Args:
+            index (dict): The index.
+            key (str): The connection's key in the index, None if it has not got one.
+            handler (UpdateHandler): The connection.
+        """
+        handlers = index.get(key)
+        if handlers is not None:
+            handlers.discard(handler)
+            if not handlers:
+                del index[key]
+
+    ################################################################################################
+    def clear(self):
+        """ Removes every connection, without closing them. """
+        self.__clients.clear()
+        self.__by_access_token.clear()
+        self.__by_username.clear()
+
+    ################################################################################################
+    def check_backlog(self, handler, now):
+        """ Checks if a connection has fallen behind, i.e. it has more than
+        settings.WEBSOCKET_MAXIMUM_BUFFER_BYTES waiting to be sent, before it is sent a broadcast of
+        the results or the leaderboard. The broadcasts to a connection that is behind are dropped,
+        and once it has caught up it is sent a snapshot in their place. A connection that stays
+        behind for settings.WEBSOCKET_STALLED_SECONDS is closed.
+
+        Args:
+            handler (UpdateHandler): The connection.
+            now (float): The time, from time.monotonic.
+
+        Returns:
+            str: SEND if the broadcast should be sent, DROP if it should be dropped, CATCH_UP if the
+            connection should be sent a snapshot instead, or CLOSE if it should be closed.
+        """
+        client = self.__clients.get(handler)
+        if client is None:
+            return SEND
+
+        if handler.get_buffered_bytes() > settings.WEBSOCKET_MAXIMUM_BUFFER_BYTES:
+            if client.behind_since is None:
+                client.behind_since = now
+            elif now - client.behind_since >= settings.WEBSOCKET_STALLED_SECONDS:
+                self.__closed_connections += 1
+                return CLOSE
+            client.dropped_messages += 1
+            self.__dropped_messages += 1
+            return DROP
+
+        if client.behind_since is not None:
+            client.behind_since = None
+            client.dropped_messages = 0
+            return CATCH_UP
+        return SEND
+
+    ################################################################################################
+    def get_statistics(self):
+        """ Gets statistics about the connections falling behind.
+
+        Returns:
+            dict: The "buffered_bytes" waiting to be sent to every connection, the
+            "maximum_buffered_bytes" waiting to be sent to one connection, the number of connections
+            "behind", and the total "dropped_messages" and "closed_connections".
+        """
+        buffered_bytes = [handler.get_buffered_bytes() for handler in self.__clients]
+        return {
+            "buffered_bytes": sum(buffered_bytes),
+            "maximum_buffered_bytes": max(buffered_bytes) if buffered_bytes else 0,
+            "behind": sum(1 for client in self.__clients.values()
+                          if client.behind_since is not None),
+            "dropped_messages": self.__dropped_messages,
+            "closed_connections": self.__closed_connections
+        }
+
+    ################################################################################################
+    def get(self, handler):
+        """ Gets the Client of a connection.
+
+        Args:
+            handler (UpdateHandler): The connection.
+
+        Returns:
+            Client: The client, None if the connection is not open.
+        """
+        return self.__clients.get(handler)
+
+    ################################################################################################
+    def get_by_access_token(self, access_token):
+        """ Gets the connections that have sent an access token.
+
+        Args:
+            access_token (str): The access token.
+
+        Returns:
+            list: The connections.
+        """
+        return list(self.__by_access_token.get(access_token, ()))
+
+    ################################################################################################
+    def get_by_username(self, username):
+        """ Gets the connections of a user.
+
+        Args:
+            username (str): The user's username.
+
+        Returns:
+            list: The connections.
+        """
+        return list(self.__by_username.get(username, ()))
+
+    ################################################################################################
+    def get_identified(self):
+        """ Gets the connections that have sent an access token.
+
+        Returns:
+            list: The connections.
+        """
+        return [handler for handlers in self.__by_access_token.values() for handler in handlers]
+
+
+####################################################################################################
+clients = ClientRegistry()
+
+# The IOLoop the clients belong to. Set when the first connection is opened so that connections can
+# be closed from the threads the database queries run on.
+io_loop = None
+
+# Passes broadcasts and closes to the clients of the other processes, see set_broker.
+broker = None
+
+# The last leaderboard message broadcast, so it is only sent again when the ranking changes.
+last_leaderboard_message = None
+
+# Whether limit_compression_window has warned that it cannot limit the window.
+compression_window_warned = False
+
+# The names of the events sent to the other processes.
+BROADCAST_EVENT = "broadcast"
+CLOSE_CONNECTIONS_EVENT = "close_connections"
 
 
 ####################################################################################################
 class UpdateHandler(tornado.websocket.WebSocketHandler):
     ################################################################################################
-    def open(self, *args):
+    def initialize(self):
+        """ Initialises the handler. """
+        # The bytes written to the connection that are waiting to be sent, see get_buffered_bytes.
+        self.__buffered_bytes = 0
+
+    ################################################################################################
+    def get_compression_options(self):
+        """ Compresses the messages sent to clients that offer permessage-deflate, if
+        settings.WEBSOCKET_COMPRESSION is set.
+
+        Returns:
+            dict: The compression options, None to not compress.
+        """
+        if not settings.WEBSOCKET_COMPRESSION:
+            return None
+        return {
+            "compression_level": settings.WEBSOCKET_COMPRESSION_LEVEL,
+            "mem_level": settings.WEBSOCKET_COMPRESSION_MEMORY_LEVEL
+        }
+
+    ################################################################################################
+    async def open(self, *args):
+        global io_loop
         try:
             # Setting this can reduce performance, but messages are sent straight away. We are not
             # sending lots of data so we should be fine.
-            self.stream.set_nodelay(True)
-            clients[self] = {}
-            results = self.application.database_connector.generate_results_dictionary(
-                settings.country_codes)
-
-            self.write_message(json.dumps({
-                "type": "results",
-                "results": results
-            }))
+            self.set_nodelay(True)
+            limit_compression_window(self.ws_connection,
+                                     settings.WEBSOCKET_COMPRESSION_WINDOW_BITS)
+            io_loop = tornado.ioloop.IOLoop.current()
+            clients.add(self)
+            await self.send_snapshot()
 
             logger.debug("Connection opened.")
         except Exception as err:
@@ -37,34 +317,112 @@ class UpdateHandler(tornado.websocket.WebSocketHandler):
     ################################################################################################
     def on_close(self):
         try:
-            if self in clients:
+            if clients.remove(self):
                 logger.debug("Connection closed.")
-                del clients[self]
         except Exception as err:
             logger.error(traceback.format_exc())
             raise err
 
     ################################################################################################
-    def on_message(self, message):
+    def write_frame(self, frame):
+        """ Writes a message that has already been framed, see frame_message, so a broadcast is only
+        framed once however many clients it is sent to. The frame is not compressed, even if the
+        client has negotiated compression, which permessage-deflate allows. Broadcasts are small
+        and compressing them would need a compressor for each client.
+
+        Args:
+            frame (bytes): The framed message.
+
+        Returns:
+            bool: True if the message was written, False if the connection is closed.
+        """
+        connection = self.ws_connection
+        if connection is None or connection.is_closing():
+            return False
+        try:
+            self.__count_buffered_bytes(connection.stream.write(frame), len(frame))
+        except tornado.iostream.StreamClosedError:
+            return False
+        return True
+
+    ################################################################################################
+    def write_message(self, message, binary=False):
+        """ See tornado.websocket.WebSocketHandler.write_message. The message is counted as waiting
+        to be sent until it has been written, see get_buffered_bytes. """
+        if isinstance(message, dict):
+            message = tornado.escape.json_encode(message)
+        future = super(UpdateHandler, self).write_message(message, binary)
+        self.__count_buffered_bytes(future, len(tornado.escape.utf8(message)))
+        return future
+
+    ################################################################################################
+    def __count_buffered_bytes(self, future, size):
+        """ Counts bytes as waiting to be sent until the write sending them has finished, or failed
+        because the connection was closed.
+
+        Args:
+            future (asyncio.Future): The future returned by the write.
+            size (int): The number of bytes written.
+        """
+        self.__buffered_bytes += size
+
+        def written(_):
+            self.__buffered_bytes -= size
+
+        future.add_done_callback(written)
+
+    ################################################################################################
+    def get_buffered_bytes(self):
+        """ Gets the number of bytes written to the connection that are waiting to be sent. Tornado
+        has no public way to get this, so the handler counts the bytes of each write until it has
+        finished. Compressed messages are counted before they are compressed.
+
+        Returns:
+            int: The number of bytes.
+        """
+        return self.__buffered_bytes
+
+    ################################################################################################
+    async def send_snapshot(self):
+        """ Sends the results of every entry and the leaderboard. """
+        await self.__send_results_snapshot()
+        self.write_message(await generate_leaderboard_message(self.application.database_connector))
+
+    ################################################################################################
+    def catch_up(self):
+        """ Sends the results and the leaderboard in place of the broadcasts that were dropped while
+        the connection was behind, see ClientRegistry.check_backlog. """
+        async def send_snapshot():
+            try:
+                await self.send_snapshot()
+            except tornado.websocket.WebSocketClosedError:
+                pass
+            except Exception:
+                logger.error(traceback.format_exc())
+
+        tornado.ioloop.IOLoop.current().spawn_callback(send_snapshot)
+
+    ################################################################################################
+    async def on_message(self, message):
         logger.debug("Websocket message received: " + str(message))
 
-        message_json = json.loads(message)
+        message_json = codec.loads(message)
         access_token = message_json["access_token"]
         username = message_json["username"]
 
-        if self.application.database_connector.is_access_token_valid(username, access_token):
+        if await self.application.database_connector.is_access_token_valid(username, access_token):
             # We need to update the information about this client so that we can send messages
             # to particular clients and close connections based on the username and
             # access token.
-            if "username" not in clients[self]:
-                clients[self]["username"] = username
-            if "access_token" not in clients[self]:
-                clients[self]["access_token"] = access_token
+            clients.identify(self, username, access_token)
 
             message_type = message_json["type"]
 
             if message_type == "refresh_token":
-                self.__handle_refresh_token(message_json)
+                await self.__handle_refresh_token(message_json)
+            elif message_type == "results_snapshot":
+                # The client has missed some results changes.
+                await self.__send_results_snapshot()
             else:
                 logger.warn("Unrecognised type in message: " + str(message))
         else:
@@ -72,21 +430,33 @@ class UpdateHandler(tornado.websocket.WebSocketHandler):
             close_connections(access_token="Session Expired")
 
     ################################################################################################
-    def __handle_refresh_token(self, message_json):
+    async def __send_results_snapshot(self):
+        """ Sends the results of every entry. The client applies the resultsDelta messages with
+        later sequence numbers to them. """
+        sequence, results = await self.application.database_connector.get_results_snapshot()
+        self.write_message(codec.dumps({
+            "type": "results",
+            "sequence": sequence,
+            "results": results
+        }))
+
+    ################################################################################################
+    async def __handle_refresh_token(self, message_json):
         refresh_token = message_json["refresh_token"]
         access_token = message_json["access_token"]
         username = message_json["username"]
-        if self.application.database_connector.is_refresh_token_valid(username, refresh_token):
-            self.application.database_connector.extend_access_expiry(username, access_token)
+        database_connector = self.application.database_connector
+        if await database_connector.is_refresh_token_valid(username, refresh_token):
+            await database_connector.extend_access_expiry(username, access_token)
 
-            access_info = self.application.database_connector.get_access_information(username)
+            access_info = await database_connector.get_access_information(username)
 
             current_datetime = datetime.datetime.now()
             expiry_datetime = datetime.datetime.strptime(access_info["access_token_expiry"],
                                                          settings.DATETIME_FORMAT)
             expiry_seconds = (expiry_datetime - current_datetime).total_seconds()
 
-            self.write_message(json.dumps({
+            self.write_message(codec.dumps({
                 "type": "access_token_expiry",
                 "access_token_expiry": expiry_seconds
             }))
@@ -96,42 +466,231 @@ class UpdateHandler(tornado.websocket.WebSocketHandler):
 
 
 ####################################################################################################
-def broadcast_message(message, access_token=None):
-    """ Broadcast a message to all clients.
+def set_broker(new_broker):
+    """ Sends broadcasts and closes to the clients of the other processes as well, and handles the
+    broadcasts and closes from the other processes.
+
+    Args:
+        new_broker (broker.Broker): The broker, not yet started.
+    """
+    global broker
+    broker = new_broker
+    broker.subscribe(BROADCAST_EVENT, broadcast_message_locally)
+    broker.subscribe(CLOSE_CONNECTIONS_EVENT, close_connections_locally)
+
+
+####################################################################################################
+async def generate_leaderboard_message(database_connector):
+    """ Generates the message with the IDs of the entries in rank order by their total and average
+    scores. Clients work out the totals and averages from the results.
+
+    Args:
+        database_connector (async_connector.AsyncDatabaseConnector): Used to get the rankings.
+
+    Returns:
+        bytes: The message.
+    """
+    rankings = {}
+    for order in leaderboard.ORDERS:
+        rankings[order] = [row["id"] for row in await database_connector.get_leaderboard(order)]
+    return codec.dumps({
+        "type": "leaderboard",
+        "leaderboard": rankings
+    })
+
+
+####################################################################################################
+async def broadcast_results(database_connector, entry_ids):
+    """ Broadcasts the changes to the results, and the leaderboard if it has changed, to all
+    clients, including those of the other processes. When the results are kept in memory only the
+    changed counts are sent, in a resultsDelta message, otherwise the results of the entries are.
 
     Args:
-        message (str): The message to broadcast.
+        database_connector (async_connector.AsyncDatabaseConnector): Used to get the results.
+        entry_ids (list): The IDs of the entries whose scores have changed.
+    """
+    global last_leaderboard_message
+    if database_connector.is_results_aggregate_loaded():
+        changes = database_connector.take_results_changes()
+        if changes is None:
+            return
+        sequence, changes = changes
+        broadcast_message(codec.dumps({
+            "type": "resultsDelta",
+            "sequence": sequence,
+            "changes": changes
+        }), replaceable=True)
+    else:
+        results = await database_connector.generate_results_dictionary(entry_ids)
+        broadcast_message(codec.dumps({
+            "type": "results",
+            "results": results
+        }), replaceable=True)
+
+    message = await generate_leaderboard_message(database_connector)
+    if message != last_leaderboard_message:
+        last_leaderboard_message = message
+        broadcast_message(message, replaceable=True)
+
+
+####################################################################################################
+def broadcast_message(message, access_token=None, replaceable=False):
+    """ Broadcast a message to all clients, including those of the other processes.
+
+    Args:
+        message: The message to broadcast, either a string or UTF-8 bytes, e.g. from codec.dumps.
         access_token (str): The access token of the client to send the message to, otherwise a
         message will be sent to every client.
+        replaceable (bool): True if the message is of the results or the leaderboard, so a snapshot
+        can be sent in its place to clients that have fallen behind, see
+        ClientRegistry.check_backlog.
     """
-    for client in clients:
-        client_access_token = clients[client].get("access_token")
-        if (access_token is None and client_access_token is not None) or \
-                access_token == client_access_token:
-            client.write_message(message)
+    broadcast_message_locally(message, access_token, replaceable)
+    if broker is not None:
+        if isinstance(message, bytes):
+            message = message.decode()
+        broker.publish(BROADCAST_EVENT, message, access_token, replaceable)
+
+
+####################################################################################################
+def limit_compression_window(connection, window_bits):
+    """ Limits the window a connection compresses messages with, as Tornado has no option for it.
+    The client can decompress messages compressed with a smaller window than it allows, and a
+    smaller window needs less memory for each connection, 2 ** (window_bits + 2) bytes.
+
+    Args:
+        connection (tornado.websocket.WebSocketProtocol): The connection.
+        window_bits (int): From 9 to 15, the base two logarithm of the window size. None to use the
+        largest window the client allows.
+    """
+    global compression_window_warned
+    compressor = getattr(connection, "_compressor", None)
+    if window_bits is None or compressor is None:
+        return
+    # These are private to Tornado. If a later version does not have them the client's window is
+    # used, which only costs memory, and a warning is logged once.
+    max_window_bits = getattr(compressor, "_max_wbits", None)
+    create_compressor = getattr(compressor, "_create_compressor", None)
+    if not isinstance(max_window_bits, int) or create_compressor is None or \
+            not hasattr(compressor, "_compressor"):
+        if not compression_window_warned:
+            compression_window_warned = True
+            logger.warning("Cannot limit the compression window with Tornado " +
+                           tornado.version + ", WEBSOCKET_COMPRESSION_WINDOW_BITS is ignored.")
+        return
+    if window_bits >= max_window_bits:
+        return
+    compressor._max_wbits = window_bits
+    if compressor._compressor is not None:
+        compressor._compressor = create_compressor()
+
+
+####################################################################################################
+def frame_message(message):
+    """ Frames a message as a websocket text frame, as a server sends them, i.e. unmasked.
+
+    Args:
+        message (bytes): The message, encoded as UTF-8.
+
+    Returns:
+        bytes: The frame.
+    """
+    length = len(message)
+    # The final fragment of a text message.
+    header = b"\x81"
+    if length < 126:
+        header += struct.pack("B", length)
+    elif length <= 0xFFFF:
+        header += struct.pack("!BH", 126, length)
+    else:
+        header += struct.pack("!BQ", 127, length)
+    return header + message
+
+
+####################################################################################################
+def broadcast_message_locally(message, access_token=None, replaceable=False):
+    """ Broadcast a message to the clients of this process. The message is framed once and the
+    same frame is written to every client.
+
+    Args:
+        message: The message to broadcast, either a string or UTF-8 bytes.
+        access_token (str): The access token of the client to send the message to, otherwise a
+        message will be sent to every client.
+        replaceable (bool): True if the message is of the results or the leaderboard, see
+        broadcast_message.
+    """
+    if access_token is None:
+        targets = clients.get_identified()
+    else:
+        targets = clients.get_by_access_token(access_token)
+    if not targets:
+        return
+
+    frame = frame_message(tornado.escape.utf8(message))
+    now = time.monotonic()
+    for client in targets:
+        if replaceable:
+            backlog = clients.check_backlog(client, now)
+            if backlog == DROP:
+                continue
+            elif backlog == CATCH_UP:
+                # The snapshot includes this message.
+                client.catch_up()
+                continue
+            elif backlog == CLOSE:
+                logger.warning("Closing a connection that has stopped reading.")
+                client.close(reason="Connection too slow")
+                clients.remove(client)
+                continue
+        client.write_frame(frame)
 
 
 ####################################################################################################
 def close_connections(username=None, access_token=None, reason=None):
-    """ Close connections.
+    """ Close connections, including those of the other processes.
 
     Args:
         username (str): The username of the clients to close.
         access_token (str): The access_token of the clients to close.
         reason (str): The reason the connections have been closed.
     """
-    clients_to_close = set()
+    close_connections_locally(username, access_token, reason)
+    if broker is not None:
+        broker.publish(CLOSE_CONNECTIONS_EVENT, username, access_token, reason)
 
-    for client in clients:
-        client_username = clients[client].get("username")
-        client_token = clients[client].get("access_token")
 
-        if client_username is not None and username is not None and client_username == username:
-            clients_to_close.add(client)
+####################################################################################################
+def close_connections_locally(username=None, access_token=None, reason=None):
+    """ Close connections of this process.
 
-        if client_token is not None and access_token is not None and client_token == access_token:
-            clients_to_close.add(client)
+    Args:
+        username (str): The username of the clients to close.
+        access_token (str): The access_token of the clients to close.
+        reason (str): The reason the connections have been closed.
+    """
+    clients_to_close = set()
+    if username is not None:
+        clients_to_close.update(clients.get_by_username(username))
+    if access_token is not None:
+        clients_to_close.update(clients.get_by_access_token(access_token))
 
     for client in clients_to_close:
         client.close(reason=reason)
-        clients.pop(client)
+        clients.remove(client)
+
+
+####################################################################################################
+def close_connections_threadsafe(username=None, access_token=None, reason=None):
+    """ Close connections from any thread. The connections are closed on the IOLoop the clients
+    belong to, see close_connections.
+
+    Args:
+        username (str): The username of the clients to close.
+        access_token (str): The access_token of the clients to close.
+        reason (str): The reason the connections have been closed.
+    """
+    if io_loop is None:
+        # No connection has been opened yet so there is nothing to schedule.
+        close_connections(username, access_token, reason)
+    else:
+        io_loop.add_callback(close_connections, username, access_token, reason)
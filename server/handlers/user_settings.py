@@ -1,10 +1,11 @@
-import json
 import tornado.web
 import traceback
 
 from . import authorization
+from . import codec
+from . import payloads
 import configuration.settings as settings
-from database import connector
+from database import connector, versions
 
 __author__ = "Thomas Henry Reeve"
 """ Module for handling requests to entries. """
@@ -24,15 +25,17 @@ class UserSettingsHandler(tornado.web.RequestHandler):
         UserSettingsHandler._handle_request_exception(self, exc)
 
     ################################################################################################
-    def get(self):
+    async def get(self):
         """ Handles getting user settings requests. """
         try:
             access_token = authorization.get_access_token(self.request)
-            user_settings = self.application.database_connector.generate_settings_dictionary(
+            if await payloads.is_not_modified(self, access_token, versions.SETTINGS):
+                return
+            user_settings = await self.application.database_connector.generate_settings_dictionary(
                 access_token)
             self.set_status(200)
-            self.write(json.dumps({"data": user_settings}))
+            self.write(codec.dumps({"data": user_settings}))
         except connector.InvalidAccessTokenException as error:
             logger.error(traceback.format_exc())
             self.set_status(401)
-            self.write(json.dumps(str(error)))
\ No newline at end of file
+            self.write(codec.dumps(str(error)))
\ No newline at end of file
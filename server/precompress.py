@@ -0,0 +1,91 @@
+import gzip
+import os
+from tornado.options import define, options
+
+import configuration.settings as settings
+from handlers import static
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__author__ = "Thomas Henry Reeve"
+""" Writes gzip and, if the brotli package is installed, brotli copies of the static files so the
+server does not have to compress them for each request. Run after the UI has been built, e.g.
+"python3 precompress.py --directory=dist". """
+
+logger = settings.setup_custom_logger(__name__)
+
+define("directory", default="dist", type=str, help="The directory of static files to compress.")
+
+# The types of file worth compressing. Images such as the flags are already compressed.
+COMPRESSIBLE_EXTENSIONS = {".css", ".eot", ".html", ".ico", ".js", ".json", ".map", ".otf",
+                           ".svg", ".ttf", ".txt", ".xml"}
+
+# Files smaller than this fit in a single packet anyway.
+MINIMUM_SIZE = 1024
+
+# Copies that do not save at least this fraction of the file are not kept.
+MINIMUM_SAVING = 0.1
+
+
+####################################################################################################
+def compress(contents, encoding):
+    """ Compresses the contents of a file as much as possible.
+
+    Args:
+        contents (bytes): The contents.
+        encoding (str): The encoding, either "br" or "gzip".
+
+    Returns:
+        bytes: The compressed contents.
+    """
+    if encoding == "br":
+        return brotli.compress(contents, quality=11)
+    return gzip.compress(contents, compresslevel=9)
+
+
+####################################################################################################
+def precompress_directory(directory):
+    """ Writes the compressed copies of every compressible file in a directory, and its
+    subdirectories, next to the file.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        int: The number of compressed copies written.
+    """
+    encodings = [(encoding, extension) for encoding, extension in static.ENCODINGS
+                 if encoding != "br" or brotli is not None]
+    number_written = 0
+
+    for path, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+
+            file_path = os.path.join(path, file_name)
+            with open(file_path, "rb") as file:
+                contents = file.read()
+            if len(contents) < MINIMUM_SIZE:
+                continue
+
+            for encoding, extension in encodings:
+                compressed = compress(contents, encoding)
+                if len(compressed) > len(contents) * (1 - MINIMUM_SAVING):
+                    continue
+                with open(file_path + extension, "wb") as file:
+                    file.write(compressed)
+                number_written += 1
+
+    return number_written
+
+
+####################################################################################################
+if __name__ == '__main__':
+    options.parse_command_line()
+    if brotli is None:
+        logger.warning("The brotli package is not installed, only gzip copies will be written.")
+    logger.info("Wrote " + str(precompress_directory(options.directory)) + " compressed files.")
@@ -1,13 +1,19 @@
-import MySQLdb
+import concurrent.futures
+import os
+import tempfile
 import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
 from tornado.options import define, options
+import tornado.process
 import tornado.web
 
 import configuration.settings as settings
 # Set up the logging configuration.
-from database import connector
-from handlers import entries, update, index, authorization, user_settings
+from database import access_cache, async_connector, connector, passwords, pool, versions
+from database.backends import mysql, sqlite
+from handlers import entries, update, index, authorization, broker, coalescer, leaderboard, \
+    metrics, payloads, static, user_settings
 
 __author__ = "Thomas Henry Reeve"
 """ Initialises the Vision database. """
@@ -15,18 +21,68 @@ __author__ = "Thomas Henry Reeve"
 logger = settings.setup_custom_logger(__name__)
 
 define("reset_database", default=False, type=bool, help="Whether the database should be reset.")
+define("database_backend", default=settings.DATABASE_BACKEND, type=str,
+       help="The database backend to use, either \"mysql\" or \"sqlite\".")
+define("processes", default=settings.PROCESSES, type=int,
+       help="The number of processes to serve requests with, 0 for one per CPU.")
 
 
 ####################################################################################################
-def start_server():
-    """ Starts the server using command line options and entries in the settings file. """
-    options.parse_command_line()
+def create_backend(name):
+    """ Creates the database backend.
 
-    database_connection = MySQLdb.connect(host=settings.DATABASE_HOST,
-                                          user=settings.DATABASE_USER,
-                                          passwd=settings.DATABASE_PASSWORD)
-    database_connector = connector.DatabaseConnector(database_connection)
+    Args:
+        name (str): The name of the backend, either "mysql" or "sqlite".
 
+    Returns:
+        base.Backend: The backend.
+    """
+    if name == "mysql":
+        return mysql.MySQLBackend(settings.DATABASE_HOST, settings.DATABASE_USER,
+                                  settings.DATABASE_PASSWORD)
+    elif name == "sqlite":
+        return sqlite.SQLiteBackend(settings.DATABASE_SQLITE_DIRECTORY)
+    else:
+        raise ValueError("Unknown database backend: '" + name + "'.")
+
+
+####################################################################################################
+def create_database_connector(backend, broker=None, boot_id=None):
+    """ Creates the database connector and its connection pool.
+
+    Args:
+        backend (base.Backend): The database backend.
+        broker (broker.Broker): Used to keep the other processes up to date, if there are any.
+        boot_id (str): The ID in the ETags, shared by every process. If None a new ID is generated.
+
+    Returns:
+        tuple: The connector.DatabaseConnector and the pool.ConnectionPool it uses.
+    """
+    maximum_size = settings.DATABASE_POOL_MAXIMUM_SIZE
+    if backend.maximum_connections is not None:
+        maximum_size = min(maximum_size, backend.maximum_connections)
+    connection_pool = pool.ConnectionPool(
+        backend.connect,
+        minimum_size=min(settings.DATABASE_POOL_MINIMUM_SIZE, maximum_size),
+        maximum_size=maximum_size,
+        acquire_timeout=settings.DATABASE_POOL_ACQUIRE_TIMEOUT_SECONDS,
+        idle_timeout=settings.DATABASE_POOL_IDLE_TIMEOUT_SECONDS,
+        health_check_interval=settings.DATABASE_POOL_HEALTH_CHECK_SECONDS)
+    token_cache = access_cache.AccessTokenCache(settings.ACCESS_TOKEN_CACHE_SIZE,
+                                                settings.ACCESS_TOKEN_CACHE_SECONDS)
+    database_connector = connector.DatabaseConnector(connection_pool, token_cache, backend, broker,
+                                                     boot_id)
+    return database_connector, connection_pool
+
+
+####################################################################################################
+def set_up_database(database_connector):
+    """ Creates the database if it does not exist, or the reset_database option is set, and
+    migrates it to the current version.
+
+    Args:
+        database_connector (connector.DatabaseConnector): The connector.
+    """
     database_exists = database_connector.does_database_exist(settings.DATABASE_NAME)
 
     if not database_exists or options.reset_database:
@@ -36,31 +92,110 @@ def start_server():
         database_connector.use_database(settings.DATABASE_NAME)
 
         database_connector.create_users_table()
-        database_connector.create_scores_table(settings.country_codes)
+        database_connector.create_scores_table()
         database_connector.create_access_table()
 
     # Regardless of whether we reset the database we still need to use the database.
     database_connector.use_database(settings.DATABASE_NAME)
 
-    # Setup the app.
+    # Databases created by older versions have a scores column per entry.
+    if database_connector.migrate_scores_table():
+        logger.info("Migrated the scores table.")
+
+
+####################################################################################################
+def start_server():
+    """ Starts the server using command line options and entries in the settings file. """
+    options.parse_command_line()
+
+    backend = create_backend(options.database_backend)
+    number_of_processes = options.processes or tornado.process.cpu_count()
+    sockets = tornado.netutil.bind_sockets(settings.PORT)
+
+    process_broker = None
+    task_id = 0
+    # Generated before forking so an ETag given out by one process matches in the others.
+    boot_id = versions.generate_boot_id()
+    if number_of_processes > 1:
+        if options.database_backend == "sqlite" and settings.DATABASE_SQLITE_DIRECTORY is None:
+            raise ValueError("Each process would have its own in memory SQLite database, set "
+                             "DATABASE_SQLITE_DIRECTORY to use several processes.")
+
+        # Only one process should create or migrate the database, so it is done before forking.
+        database_connector, connection_pool = create_database_connector(backend)
+        set_up_database(database_connector)
+        connection_pool.close()
+
+        broker_path = os.path.join(tempfile.mkdtemp(), "broker.sock")
+        task_id = tornado.process.fork_processes(number_of_processes)
+        logger.info("Started process " + str(task_id) + ".")
+        process_broker = broker.Broker(broker_path, is_hub=task_id == 0)
+        update.set_broker(process_broker)
+
+    # Start the password hashing processes before anything else starts any threads.
+    password_executor = None
+    if settings.PASSWORD_HASHING_PROCESSES > 0:
+        password_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASHING_PROCESSES)
+    password_hasher = passwords.PasswordHasher(password_executor,
+                                               settings.PASSWORD_HASHING_QUEUE_SIZE)
+    password_hasher.start()
+
+    database_connector, connection_pool = create_database_connector(backend, process_broker,
+                                                                    boot_id)
+    if process_broker is None:
+        set_up_database(database_connector)
+
+        # Count the results once, they are kept up to date in memory from then on. With several
+        # processes each would only see its own changes, so the results are counted in the
+        # database instead.
+        database_connector.load_results_aggregate()
+    else:
+        database_connector.use_database(settings.DATABASE_NAME)
+
+    # Setup the app. The requests to each route are counted and timed, separately in each process.
+    request_metrics = metrics.RequestMetrics()
     application = tornado.web.Application([
-        (r'/constants.js()', tornado.web.StaticFileHandler, {"path": "dist/constants.js"}),
-        (r'/assets/(.*)', tornado.web.StaticFileHandler, {"path": "dist/assets"}),
-        (r'/fonts/(.*)', tornado.web.StaticFileHandler, {"path": "dist/fonts"}),
-        (r'/images/(.*)', tornado.web.StaticFileHandler, {"path": "dist/images"}),
+        # The constants are mounted into the container, so they are never precompressed.
+        (r'/constants.js()', static.StaticFileHandler,
+         {"path": "dist/constants.js", "precompressed": False}),
+        (r'/assets/(.*)', static.StaticFileHandler, {"path": "dist/assets"}),
+        (r'/fonts/(.*)', static.StaticFileHandler, {"path": "dist/fonts"}),
+        (r'/images/(.*)', static.StaticFileHandler,
+         {"path": "dist/images", "cache_seconds": settings.STATIC_CACHE_SECONDS}),
         (r'/api/token', authorization.TokenHandler),
         (r'/api/register', authorization.RegisterHandler),
         (r'/api/settings', user_settings.UserSettingsHandler),
         (r'/api/entries', entries.EntriesHandler),
         (r'/api/entries/(.*)', entries.EntryHandler),
+        (r'/api/leaderboard', leaderboard.LeaderboardHandler),
+        (r'/api/metrics', metrics.MetricsHandler,
+         {"request_metrics": request_metrics, "process": task_id}),
         (r'/update', update.UpdateHandler),
         (r'/.*', index.IndexHandler)
-    ])
+    ], log_function=request_metrics.log_request)
+
+    # The entries are only serialised once, the user's scores are written in for each request.
+    application.entries_payload = payloads.EntriesPayload(settings.entries,
+                                                          maximum_score=settings.MAXIMUM_SCORE)
 
-    application.database_connector = database_connector
+    # The handlers use the asynchronous connector so queries do not block the IOLoop.
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=settings.DATABASE_EXECUTOR_THREADS)
+    application.database_connector = async_connector.AsyncDatabaseConnector(
+        database_connector, executor, password_hasher)
+    application.score_coalescer = coalescer.ScoreCoalescer(application.database_connector,
+                                                           settings.SCORE_COALESCING_SECONDS)
 
     http_server = tornado.httpserver.HTTPServer(application)
-    http_server.listen(settings.PORT)
+    http_server.add_sockets(sockets)
+
+    if process_broker is not None:
+        process_broker.start()
+
+    # Close connections that are no longer needed after a busy period.
+    tornado.ioloop.PeriodicCallback(connection_pool.reap_idle_connections,
+                                    settings.DATABASE_POOL_REAP_INTERVAL_SECONDS * 1000).start()
 
     logger.info("Starting Server")
 
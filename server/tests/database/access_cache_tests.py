@@ -0,0 +1,118 @@
+import datetime
+from mock import patch
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.access_cache as access_cache
+
+""" This module contains the unit tests for the AccessTokenCache class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+def in_an_hour():
+    """ Gets an access token expiry an hour from now.
+
+    Returns:
+        datetime.datetime: The expiry.
+    """
+    return datetime.datetime.now() + datetime.timedelta(hours=1)
+
+
+####################################################################################################
+class AccessTokenCacheTests(unittest.TestCase):
+    """ Unit tests for the AccessTokenCache class. """
+    ################################################################################################
+    def test_get_and_put(self):
+        """ Test usernames are returned for cached access tokens only. """
+        subject = access_cache.AccessTokenCache(maximum_size=10, time_to_live=60)
+
+        self.assertIsNone(subject.get("token"))
+        subject.put("token", "dave", in_an_hour(), subject.get_generation())
+        self.assertEqual("dave", subject.get("token"))
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["hits"])
+        self.assertEqual(1, statistics["misses"])
+        self.assertEqual(1, statistics["size"])
+
+    ################################################################################################
+    def test_least_recently_used_tokens_are_evicted(self):
+        """ Test the least recently used access token is forgotten when the cache is full. """
+        subject = access_cache.AccessTokenCache(maximum_size=2, time_to_live=60)
+
+        subject.put("token_1", "dave", in_an_hour(), subject.get_generation())
+        subject.put("token_2", "fred", in_an_hour(), subject.get_generation())
+        subject.get("token_1")
+        subject.put("token_3", "jane", in_an_hour(), subject.get_generation())
+
+        self.assertEqual("dave", subject.get("token_1"))
+        self.assertIsNone(subject.get("token_2"))
+        self.assertEqual("jane", subject.get("token_3"))
+        self.assertEqual(1, subject.get_statistics()["evicted"])
+
+    ################################################################################################
+    def test_tokens_expire(self):
+        """ Test access tokens are forgotten after the time to live or their expiry. """
+        subject = access_cache.AccessTokenCache(maximum_size=10, time_to_live=60)
+
+        with patch('database.access_cache.time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            subject.put("token_1", "dave", in_an_hour(), subject.get_generation())
+            subject.put("token_2", "fred", datetime.datetime.now() + datetime.timedelta(
+                seconds=30), subject.get_generation())
+
+            mock_time.return_value = 1029.0
+            self.assertEqual("dave", subject.get("token_1"))
+            self.assertEqual("fred", subject.get("token_2"))
+
+            mock_time.return_value = 1031.0
+            self.assertEqual("dave", subject.get("token_1"))
+            self.assertIsNone(subject.get("token_2"))
+
+            mock_time.return_value = 1061.0
+            self.assertIsNone(subject.get("token_1"))
+
+        # Tokens that have already expired are not cached.
+        subject.put("token_3", "jane", datetime.datetime.now() - datetime.timedelta(seconds=1),
+                    subject.get_generation())
+        self.assertIsNone(subject.get("token_3"))
+        self.assertEqual(2, subject.get_statistics()["expired"])
+
+    ################################################################################################
+    def test_invalidate_user(self):
+        """ Test invalidating a user forgets their access tokens and stops racing reads from being
+        cached. """
+        subject = access_cache.AccessTokenCache(maximum_size=10, time_to_live=60)
+
+        subject.put("token_1", "dave", in_an_hour(), subject.get_generation())
+        subject.put("token_2", "fred", in_an_hour(), subject.get_generation())
+
+        generation = subject.get_generation()
+        subject.invalidate_user("dave")
+        self.assertIsNone(subject.get("token_1"))
+        self.assertEqual("fred", subject.get("token_2"))
+
+        # The database was read before the invalidation, so the result may be stale.
+        subject.put("token_1", "dave", in_an_hour(), generation)
+        self.assertIsNone(subject.get("token_1"))
+
+        subject.clear()
+        self.assertIsNone(subject.get("token_2"))
+        self.assertEqual(0, subject.get_statistics()["size"])
+
+    ################################################################################################
+    def test_nothing_is_cached_when_the_size_is_zero(self):
+        """ Test a cache with a maximum size of zero does not cache anything. """
+        subject = access_cache.AccessTokenCache(maximum_size=0)
+
+        subject.put("token", "dave", in_an_hour(), subject.get_generation())
+        self.assertIsNone(subject.get("token"))
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import concurrent.futures
+from mock import MagicMock, patch
+import sys
+import threading
+import tornado.gen
+import tornado.testing
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.async_connector as async_connector
+import database.passwords as passwords
+
+""" This module contains the unit tests for the AsyncDatabaseConnector class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class AsyncDatabaseConnectorTests(tornado.testing.AsyncTestCase):
+    """ Unit tests for the AsyncDatabaseConnector class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        super(AsyncDatabaseConnectorTests, self).setUp()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.database_connector = MagicMock()
+        self.subject = async_connector.AsyncDatabaseConnector(self.database_connector,
+                                                              self.executor)
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        self.executor.shutdown()
+        super(AsyncDatabaseConnectorTests, self).tearDown()
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_queries_run_on_the_executor(self):
+        """ Test the connector methods are called on an executor thread. """
+        threads = []
+
+        def get_score(access_token, entry_id):
+            threads.append(threading.current_thread())
+            return 7
+
+        self.database_connector.get_score.side_effect = get_score
+
+        score = await self.subject.get_score("token", "1")
+
+        self.assertEqual(7, score)
+        self.database_connector.get_score.assert_called_once_with("token", "1")
+        self.assertIsNot(threading.current_thread(), threads[0])
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_exceptions_are_raised(self):
+        """ Test exceptions raised by the connector are raised by the coroutine. """
+        self.database_connector.check_new_user.side_effect = LookupError("User: 'dave' already "
+                                                                         "exists.")
+
+        with self.assertRaises(LookupError) as lookup_error:
+            await self.subject.register_user("dave", "password")
+        self.assertEqual("User: 'dave' already exists.", str(lookup_error.exception))
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_passwords_are_hashed_between_the_queries(self):
+        """ Test passwords are hashed and verified by the password hasher, not on the database
+        executor's threads, and the queries are given the results. """
+        database_threads = set()
+        hash_threads = []
+
+        def record_database_thread(*args):
+            database_threads.add(threading.current_thread())
+            return "stored_hash"
+
+        def hash_password(password):
+            hash_threads.append(threading.current_thread())
+            return "hash_of_" + password
+
+        def verify_password(password, password_hash):
+            hash_threads.append(threading.current_thread())
+            return password_hash == "stored_hash"
+
+        for method in ["check_new_user", "register_user", "get_password_hash",
+                       "login_verified_user"]:
+            getattr(self.database_connector, method).side_effect = record_database_thread
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as hash_executor:
+            self.subject = async_connector.AsyncDatabaseConnector(
+                self.database_connector, self.executor, passwords.PasswordHasher(hash_executor))
+            with patch('database.passwords.hash_password', hash_password), \
+                    patch('database.passwords.verify_password', verify_password):
+                await self.subject.register_user("dave", "password")
+                await self.subject.login_user("dave", "password")
+
+        self.database_connector.register_user.assert_called_once_with("dave", "password",
+                                                                      "hash_of_password")
+        self.database_connector.login_verified_user.assert_called_once_with("dave")
+        self.assertEqual(2, len(hash_threads))
+        self.assertFalse(database_threads & set(hash_threads))
+        statistics = self.subject.get_statistics()["password_hasher"]
+        self.assertEqual((1, 1), (statistics["hashed"], statistics["verified"]))
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_ioloop_is_not_blocked(self):
+        """ Test the IOLoop keeps running while a query is in flight. """
+        query_started = threading.Event()
+        finish_query = threading.Event()
+
+        def update_score(access_token, column, score):
+            query_started.set()
+            finish_query.wait(5)
+
+        self.database_connector.update_score.side_effect = update_score
+
+        update = tornado.gen.convert_yielded(self.subject.update_score("token", "1", 5))
+        # Allow the IOLoop to run other callbacks while the query is blocked.
+        while not query_started.is_set():
+            await tornado.gen.sleep(0.001)
+        await tornado.gen.sleep(0.001)
+
+        finish_query.set()
+        await update
+        self.database_connector.update_score.assert_called_once_with("token", "1", 5)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
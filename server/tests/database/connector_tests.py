@@ -1,16 +1,25 @@
-# Test imports.
-import utilities
-
 from datetime import datetime
 from mock import patch, MagicMock
-import MySQLdb
+import sqlite3
 import sys
+import time
 import unittest
 
+try:
+    import MySQLdb
+except ImportError:
+    MySQLdb = None
+
 sys.path.append('../..')
 
+# Test imports.
+from tests.database import utilities
+
 # Source imports.
+import database.access_cache as access_cache
 import database.connector as connector
+import database.pool as pool
+from database.backends import mysql, sqlite
 import configuration.settings as settings
 
 """ This module contains the DatabaseConnector class, which is used for interacting with a
@@ -20,16 +29,32 @@ __author__ = "Thomas Reeve"
 
 ####################################################################################################
 class DatabaseConnectorTests(unittest.TestCase):
-    """ Unit tests for the DatabaseConnector class. """
+    """ Unit tests for the DatabaseConnector class, using a SQLite database in memory. They are run
+    against a MySQL server as well by MySQLDatabaseConnectorTests. """
+    # The error raised when inserting a row with the same primary key as another, and its message.
+    integrity_error = sqlite3.IntegrityError
+    duplicate_entry_message = "UNIQUE constraint failed: access.username"
+
+    ################################################################################################
+    def create_backend(self):
+        """ Creates the backend the tests are run against.
+
+        Returns:
+            base.Backend: The backend.
+        """
+        return sqlite.SQLiteBackend()
+
     ################################################################################################
     def setUp(self):
         """ Method run before every test. """
         self.database_name = "UNITTEST_DATABASE"
 
-        self.database_connection = MySQLdb.connect(host=settings.DATABASE_HOST,
-                                                   user=settings.DATABASE_USER,
-                                                   passwd=settings.DATABASE_PASSWORD)
-        self.subject = connector.DatabaseConnector(self.database_connection)
+        self.backend = self.create_backend()
+        self.database_connection = self.backend.connect()
+        # A pool of one connection so the tests can check the tables using the same connection.
+        self.connection_pool = pool.ConnectionPool(lambda: self.database_connection,
+                                                   minimum_size=1, maximum_size=1)
+        self.subject = connector.DatabaseConnector(self.connection_pool, backend=self.backend)
 
         if self.subject.does_database_exist(self.database_name):
             raise Exception("Database " + self.database_name + " already exists.")
@@ -58,7 +83,7 @@ class DatabaseConnectorTests(unittest.TestCase):
         """ Test the creation of the users table. """
         self.subject.create_users_table()
 
-        utilities.check_users_table(self.database_connection, self.database_name, self)
+        utilities.check_users_table(self.database_connection, self)
 
     ################################################################################################
     def test_create_access_table(self):
@@ -66,19 +91,49 @@ class DatabaseConnectorTests(unittest.TestCase):
         self.subject.create_users_table()  # Need to add users table for foreign key constraint.
         self.subject.create_access_table()
 
-        utilities.check_users_table(self.database_connection, self.database_name, self)
-        utilities.check_access_table(self.database_connection, self.database_name, self)
+        utilities.check_users_table(self.database_connection, self)
+        utilities.check_access_table(self.database_connection, self)
 
     ################################################################################################
     def test_create_scores_table(self):
         """ Test the creation of the scores table. """
         self.subject.create_users_table() # Need to add users table for foreign key constraint.
-        scores_columns = ["1-1", "1-2", "1-3"]
-        self.subject.create_scores_table(scores_columns)
+        self.subject.create_scores_table()
 
-        utilities.check_users_table(self.database_connection, self.database_name, self)
-        utilities.check_scores_table(self.database_connection, self.database_name, self,
-                                     scores_columns)
+        utilities.check_users_table(self.database_connection, self)
+        utilities.check_scores_table(self.database_connection, self)
+
+    ################################################################################################
+    def test_migrate_scores_table(self):
+        """ Test migrating a scores table with a column per entry to a row per score. """
+        self.subject.create_users_table()
+        self.subject.create_access_table()
+        self.subject.execute("""
+            CREATE TABLE scores (
+            username VARCHAR(%s) NOT NULL,
+            `1` INT NOT NULL DEFAULT -1,
+            `2` INT NOT NULL DEFAULT -1,
+            PRIMARY KEY (username),
+            FOREIGN KEY (username) REFERENCES users(username)
+            )
+        """ % settings.MAX_USERNAME_LENGTH)
+
+        for username in ["dave", "steve"]:
+            self.subject.execute("INSERT INTO users (username, password) VALUES (%s, 'pass')",
+                                 (username, ))
+        self.subject.execute("INSERT INTO scores (username, `1`, `2`) VALUES ('dave', 4, -1)")
+        self.subject.execute("INSERT INTO scores (username, `1`, `2`) VALUES ('steve', 10, 0)")
+
+        self.assertTrue(self.subject.migrate_scores_table())
+        # The table has already been migrated.
+        self.assertFalse(self.subject.migrate_scores_table())
+
+        utilities.check_scores_table(self.database_connection, self)
+
+        cursor = self.database_connection.cursor()
+        cursor.execute("SELECT username, entry_id, score FROM scores ORDER BY username, entry_id")
+        self.assertSequenceEqual((("dave", "1", 4), ("steve", "1", 10), ("steve", "2", 0)),
+                                 cursor.fetchall())
 
     ################################################################################################
     def test_generate_token(self):
@@ -93,7 +148,7 @@ class DatabaseConnectorTests(unittest.TestCase):
             mock_time.return_value = 4
             expiry = connector.DatabaseConnector.calculate_expiry(3)
 
-        self.assertEqual("1970-01-01 01:00:07", expiry)
+        self.assertEqual(time.strftime(settings.DATETIME_FORMAT, time.localtime(7)), expiry)
 
     ################################################################################################
     def test_hash_and_salt_password(self):
@@ -105,7 +160,7 @@ class DatabaseConnectorTests(unittest.TestCase):
         # - U+00AC
         password = "135AFNcbr!\"$%^&*(){};'#:@~,./<>?|\\`/*"
 
-        with patch('database.connector.settings') as mock_settings:
+        with patch('database.passwords.settings') as mock_settings:
             mock_settings.PASSWORD_SALTING_ROUNDS = salting_rounds
             mock_settings.PASSWORD_SALTING_SIZE = salting_size
 
@@ -114,7 +169,7 @@ class DatabaseConnectorTests(unittest.TestCase):
             # Check the length is what we say it is in the settings.
             self.assertEqual(68, len(result))
 
-            with patch('database.connector.pbkdf2_sha256.using') as mock_using:
+            with patch('database.passwords.pbkdf2_sha256.using') as mock_using:
                 mock_return = "hashed_and_salted_password"
                 mock_hash = MagicMock()
                 mock_hash.hash.return_value = mock_return
@@ -128,7 +183,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_register_user(self):
         """ Test registering a user adds entries to the users, scores and access tables. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         expected_username = "dave"
         expected_password = "password"
@@ -137,7 +192,7 @@ class DatabaseConnectorTests(unittest.TestCase):
         refresh_expiry = self.subject.calculate_expiry(20000)
         expected_uuid = "7acb7e47-d8af-4b94-b096-2f5f7e1f99c7"
 
-        with patch('database.connector.pbkdf2_sha256.using') as mock_using:
+        with patch('database.passwords.pbkdf2_sha256.using') as mock_using:
             mock_hash = MagicMock()
             mock_hash.hash.return_value = expected_hashed_and_salted_password
             mock_using.return_value = mock_hash
@@ -177,12 +232,7 @@ class DatabaseConnectorTests(unittest.TestCase):
             },
             "scores": {
                 "primary_key": "username",
-                "data": [
-                    {
-                        "username": expected_username,
-                        "1": -1
-                    }
-                ]
+                "data": []
             },
             "access": {
                 "primary_key": "username",
@@ -202,7 +252,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_cannot_register_the_same_user(self):
         """ Test cannot add the same user twice. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         self.subject.register_user("dave", "pass")
 
@@ -213,7 +263,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_register_user_for_invalid_username_and_password(self):
         """ Test register user for invalid username and passwords. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         with self.assertRaises(ValueError) as value_error:
             self.subject.register_user(None, "password")
@@ -251,7 +301,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_register_user_access_expiry_does_not_exceed_refresh_expiry(self):
         """ Test register user access expiry does not exceed refresh expiry. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "username"
 
@@ -266,7 +316,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_delete_user(self):
         """ Test deleting a user from the users table. """
-        utilities.create_tables(self.subject, ["1", "2"])
+        utilities.create_tables(self.subject)
 
         expected_user_1 = "dave"
         mock_uuid_1 = "7acb7e47-d8af-4b94-b096-2f5f7e1f99c7"
@@ -280,6 +330,11 @@ class DatabaseConnectorTests(unittest.TestCase):
             mock_uuid4.return_value = mock_uuid_2
             self.subject.register_user(expected_user_2, "password")
 
+        access_token_1 = self.subject.get_access_information(expected_user_1)["access_token"]
+        access_token_2 = self.subject.get_access_information(expected_user_2)["access_token"]
+        self.subject.update_score(access_token_1, "1", 5)
+        self.subject.update_score(access_token_2, "2", 3)
+
         expected_data = {
             "users": {
                 "primary_key": "username",
@@ -297,17 +352,17 @@ class DatabaseConnectorTests(unittest.TestCase):
                 ]
             },
             "scores": {
-                "primary_key": "username",
+                "primary_key": "entry_id",
                 "data": [
                     {
                         "username": expected_user_1,
-                        "1": -1,
-                        "2": -1
+                        "entry_id": "1",
+                        "score": 5
                     },
                     {
                         "username": expected_user_2,
-                        "1": -1,
-                        "2": -1
+                        "entry_id": "2",
+                        "score": 3
                     }
                 ]
             },
@@ -342,12 +397,12 @@ class DatabaseConnectorTests(unittest.TestCase):
                 ]
             },
             "scores": {
-                "primary_key": "username",
+                "primary_key": "entry_id",
                 "data": [
                     {
                         "username": expected_user_1,
-                        "1": -1,
-                        "2": -1
+                        "entry_id": "1",
+                        "score": 5
                     }
                 ]
             },
@@ -370,10 +425,49 @@ class DatabaseConnectorTests(unittest.TestCase):
         utilities.check_number_of_rows_in_table(self.database_connection, self, "scores", 0)
         utilities.check_number_of_rows_in_table(self.database_connection, self, "access", 0)
 
+    ################################################################################################
+    def test_number_of_commits(self):
+        """ Test the statements changing a user are committed together. """
+        utilities.create_tables(self.subject)
+
+        username = "dave"
+        # Checking the user does not exist is committed separately as the password is hashed
+        # before the transaction starts.
+        expected_commit_counts = [
+            (lambda: self.subject.register_user(username, "password"), 2),
+            (lambda: self.subject.login_user(username, "password"), 2),
+            (lambda: self.subject.deactivate_user(username), 1),
+            (lambda: self.subject.activate_user(username), 1),
+            (lambda: self.subject.delete_user(username), 1)
+        ]
+
+        for operation, expected_commit_count in expected_commit_counts:
+            commit_count = self.subject.get_commit_count()
+            operation()
+            self.assertEqual(expected_commit_count, self.subject.get_commit_count() - commit_count)
+
+    ################################################################################################
+    def test_transaction_is_rolled_back(self):
+        """ Test nothing is committed if a transaction fails part way through. """
+        utilities.create_tables(self.subject)
+        self.subject.load_results_aggregate()
+
+        with patch.object(self.subject, 'insert_access') as mock_insert_access:
+            mock_insert_access.side_effect = Exception("Failed")
+            with self.assertRaises(Exception) as exception:
+                self.subject.register_user("dave", "password")
+            self.assertEqual("Failed", str(exception.exception))
+
+        self.assertFalse(self.subject.user_exists("dave"))
+        utilities.check_number_of_rows_in_table(self.database_connection, self, "users", 0)
+        # The results aggregate is only updated once the transaction has been committed.
+        self.assertEqual(0, sum(self.subject.generate_results_dictionary(
+            settings.country_codes)[settings.country_codes[0]].values()))
+
     ################################################################################################
     def test_cannot_delete_user_that_does_not_exist(self):
         """ Test cannot delete a user that doesn't exist. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         with self.assertRaises(LookupError) as lookup_error:
             self.subject.delete_user("not_a_user")
@@ -382,7 +476,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_get_username_from_access_token(self):
         """ Test get username from access token. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         with self.assertRaises(connector.InvalidAccessTokenException) as exception:
             self.subject.get_username("not_a_UUID")
@@ -396,10 +490,37 @@ class DatabaseConnectorTests(unittest.TestCase):
 
         self.assertEqual(username, self.subject.get_username(access_token))
 
+    ################################################################################################
+    def test_get_username_is_cached(self):
+        """ Test the username is cached until the user's access changes. """
+        token_cache = access_cache.AccessTokenCache()
+        self.subject = connector.DatabaseConnector(self.connection_pool,
+                                                   access_token_cache=token_cache,
+                                                   backend=self.backend)
+        utilities.create_tables(self.subject)
+
+        username = "username"
+        self.subject.register_user(username, "password")
+        access_token = self.subject.get_access_information(username)["access_token"]
+
+        with patch.object(self.subject, 'execute', wraps=self.subject.execute) as mock_execute:
+            self.assertEqual(username, self.subject.get_username(access_token))
+            self.assertEqual(username, self.subject.get_username(access_token))
+            self.assertEqual(1, mock_execute.call_count)
+
+        self.subject.extend_access_expiry(username, access_token)
+        with patch.object(self.subject, 'execute', wraps=self.subject.execute) as mock_execute:
+            self.assertEqual(username, self.subject.get_username(access_token))
+            self.assertEqual(1, mock_execute.call_count)
+
+        self.subject.deactivate_user(username)
+        with self.assertRaises(connector.InvalidAccessTokenException):
+            self.subject.get_username(access_token)
+
     ################################################################################################
     def test_adding_scores_to_the_scores_table(self):
         """ Test adding a score to the scores table. """
-        utilities.create_tables(self.subject, ["1", "2", "3"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         self.subject.register_user(username, "password")
@@ -407,20 +528,32 @@ class DatabaseConnectorTests(unittest.TestCase):
 
         with patch('database.connector.settings') as mock_settings:
             mock_settings.MAXIMUM_SCORE = 10
+            mock_settings.country_codes = ["1", "2", "3"]
 
             self.subject.update_score(access_token, "1", 0)
             self.subject.update_score(access_token, "2", 5)
             self.subject.update_score(access_token, "3", 10)
+            # Updating a score again replaces it.
+            self.subject.update_score(access_token, "3", 9)
 
         expected_data = {
             "scores": {
-                "primary_key": "username",
+                "primary_key": "entry_id",
                 "data": [
                     {
                         "username": username,
-                        "1": 0,
-                        "2": 5,
-                        "3": 10
+                        "entry_id": "1",
+                        "score": 0
+                    },
+                    {
+                        "username": username,
+                        "entry_id": "2",
+                        "score": 5
+                    },
+                    {
+                        "username": username,
+                        "entry_id": "3",
+                        "score": 9
                     }
                 ]
             }
@@ -428,10 +561,44 @@ class DatabaseConnectorTests(unittest.TestCase):
 
         utilities.check_data_in_tables(self.database_connection, self, expected_data)
 
+    ################################################################################################
+    def test_updating_several_scores(self):
+        """ Test updating several scores in one transaction. """
+        utilities.create_tables(self.subject)
+        self.subject.load_results_aggregate()
+
+        username = "dave"
+        self.subject.register_user(username, "password")
+        access_token = self.subject.get_access_information(username)["access_token"]
+
+        with patch('database.connector.settings') as mock_settings:
+            mock_settings.MAXIMUM_SCORE = 10
+            mock_settings.country_codes = ["1", "2", "3"]
+
+            self.subject.update_score(access_token, "1", 2)
+
+            # Looking up the username is committed separately from the scores.
+            commit_count = self.subject.get_commit_count()
+            self.subject.update_scores(access_token, [("1", 4), ("2", 5), ("1", 6)])
+            self.assertEqual(commit_count + 2, self.subject.get_commit_count())
+
+            # Nothing is updated if any of the scores are invalid.
+            with self.assertRaises(ValueError):
+                self.subject.update_scores(access_token, [("3", 1), ("4", 1)])
+            with self.assertRaises(ValueError):
+                self.subject.update_scores(access_token, [("3", 1), ("2", 11)])
+
+            self.assertEqual({"1": 6, "2": 5}, self.subject.get_user_scores(access_token))
+            results = self.subject.generate_results_dictionary(["1", "2", "3"])
+        self.assertEqual(1, results["1"][6])
+        self.assertEqual(0, results["1"][2])
+        self.assertEqual(1, results["2"][5])
+        self.assertEqual(1, results["3"][-1])
+
     ################################################################################################
     def test_adding_a_score_when_access_token_is_incorrect(self):
         """ Test adding a score when the access token is incorrect. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         self.subject.register_user(username, "password")
@@ -441,27 +608,29 @@ class DatabaseConnectorTests(unittest.TestCase):
         self.assertEqual("Access token is invalid.", str(exception.exception))
 
     ################################################################################################
-    def test_adding_a_score_when_column_does_not_exist(self):
-        """ Test adding a score when the column for a user does not exist. """
-        utilities.create_tables(self.subject, ["1"])
+    def test_adding_a_score_when_entry_does_not_exist(self):
+        """ Test adding a score when the entry does not exist. """
+        utilities.create_tables(self.subject)
 
         username = "dave"
         self.subject.register_user(username, "password")
 
         with patch('database.connector.settings') as mock_settings:
             mock_settings.MAXIMUM_SCORE = 10
+            mock_settings.country_codes = ["1"]
 
-            # "GR" has not been added to the scores columns.
-            with self.assertRaises(MySQLdb.OperationalError) as operational_error:
+            # "2" is not one of the entries.
+            with self.assertRaises(ValueError) as value_error:
                 access_token = self.subject.get_access_information(username)["access_token"]
                 self.subject.update_score(access_token, "2", 5)
-            expected_message = "Unknown column '2' in 'field list'"
-            self.assertEqual(expected_message, operational_error.exception.args[1])
+            self.assertEqual("Entry ID is invalid.", str(value_error.exception))
+
+        utilities.check_number_of_rows_in_table(self.database_connection, self, "scores", 0)
 
     ################################################################################################
     def test_adding_scores_outside_allowed_range(self):
         """ Test adding scores outside the allowed range. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         self.subject.register_user(username, "password")
@@ -469,6 +638,7 @@ class DatabaseConnectorTests(unittest.TestCase):
 
         with patch('database.connector.settings') as mock_settings:
             mock_settings.MAXIMUM_SCORE = 5
+            mock_settings.country_codes = ["1"]
 
             with self.assertRaises(ValueError) as value_error:
                 self.subject.update_score(access_token, "1", -1)
@@ -481,7 +651,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_cannot_check_user_is_activated_if_user_does_not_exist(self):
         """ Test cannot check user is activated if the user does not exist. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         with self.assertRaises(LookupError) as lookup_error:
             self.subject.is_user_activated("username")
@@ -490,7 +660,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_deactivating_a_users_account(self):
         """ Test deactivating a user's account. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         deactivated_username = "dave"
         other_username = "steve"
@@ -536,7 +706,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_reactivating_a_users_account(self):
         """ Test reactivating a user's account. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         reactivated_username = "dave"
         mock_uuid = "7acb7e47-d8af-4b94-b096-2f5f7e1f99c7"
@@ -577,7 +747,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_get_access_information(self):
         """ Test getting the access information. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         # Set the expiry to 10 seconds.
@@ -600,7 +770,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_is_refresh_token_valid(self):
         """ Test is the refresh token valid. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         expected_uuid = "7acb7e47-d8af-4b94-b096-2f5f7e1f99c8"
@@ -649,7 +819,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_is_access_token_valid(self):
         """ Test is access token valid. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         expected_uuid = "7acb7e47-d8af-4b94-b096-2f5f7e1f99c8"
@@ -681,10 +851,34 @@ class DatabaseConnectorTests(unittest.TestCase):
         # Check the entry has been deleted from the access table as it was after the expiry.
         utilities.check_number_of_rows_in_table(self.database_connection, self, "access", 0)
 
+    ################################################################################################
+    def test_number_of_queries_to_check_tokens(self):
+        """ Test checking tokens takes one query, plus one to update the access expiry. """
+        utilities.create_tables(self.subject)
+
+        username = "dave"
+        self.subject.register_user(username, "password")
+        access_information = self.subject.get_access_information(username)
+        access_token = access_information["access_token"]
+        refresh_token = access_information["refresh_token"]
+
+        expected_query_counts = [
+            (lambda: self.subject.is_access_token_valid(username, access_token), 1),
+            (lambda: self.subject.is_refresh_token_valid(username, refresh_token), 1),
+            (lambda: self.subject.get_access_information(username), 1),
+            (lambda: self.subject.is_user_activated(username), 1),
+            (lambda: self.subject.extend_access_expiry(username, access_token), 2)
+        ]
+
+        for operation, expected_query_count in expected_query_counts:
+            with patch.object(self.subject, 'execute', wraps=self.subject.execute) as mock_execute:
+                operation()
+                self.assertEqual(expected_query_count, mock_execute.call_count)
+
     ################################################################################################
     def test_extend_access_token(self):
         """ Test extending the access token. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
 
@@ -710,7 +904,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_cannot_extend_access_expiry(self):
         """ Test when you cannot extend the access expiry. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
 
@@ -739,7 +933,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_deleting_and_inserting_access_token(self):
         """ Test adding an access token. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         expected_expiry = self.subject.calculate_expiry(10000)
@@ -776,15 +970,15 @@ class DatabaseConnectorTests(unittest.TestCase):
                 utilities.check_data_in_tables(self.database_connection, self, expected_data)
 
                 # Check an IntegrityError is thrown if an access entry already exists.
-                with self.assertRaises(MySQLdb.IntegrityError) as integrity_error:
+                with self.assertRaises(self.integrity_error) as integrity_error:
                     self.subject.insert_access(username)
-                expected_message = "Duplicate entry 'dave' for key 'PRIMARY'"
-                self.assertEqual(expected_message, str(integrity_error.exception.args[1]))
+                self.assertEqual(self.duplicate_entry_message,
+                                 str(integrity_error.exception.args[-1]))
 
     ################################################################################################
     def test_cannot_insert_access_when_user_does_not_exist(self):
         """ Test cannot insert access when the user does not exist. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         with self.assertRaises(LookupError) as lookup_error:
@@ -794,7 +988,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_delete_access_when_user_does_not_exist(self):
         """ Test cannot delete access when the user does not exist. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         # Note no exception will be thrown if the user does not exist.
@@ -803,7 +997,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_login_user(self):
         """ Test login user. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -832,7 +1026,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_login_creates_a_new_refresh_token_when_it_expires(self):
         """ Test login creates a new refresh token when it expires. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -885,7 +1079,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_login_creates_an_access_token(self):
         """ Test login creates an access token. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -923,7 +1117,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_login_extends_access_token_expiry(self):
         """ Test login extends the access token expiry. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -958,7 +1152,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_cannot_extend_access_expiry_beyond_the_refresh_expiry(self):
         """ Test cannot extend access expiry beyond the refresh expiry. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         # Set the expiry to 10 seconds time
@@ -982,7 +1176,7 @@ class DatabaseConnectorTests(unittest.TestCase):
     ################################################################################################
     def test_do_not_extend_access_expiry_if_current_expiry_is_larger(self):
         """ Test we do not extend the access expiry if the current expiry is larger. """
-        utilities.create_tables(self.subject, ["1"])
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -1019,7 +1213,7 @@ class DatabaseConnectorTests(unittest.TestCase):
         """ Test getting the results dictionary. """
         country_codes = ["1", "2", "3"]
 
-        utilities.create_tables(self.subject, country_codes)
+        utilities.create_tables(self.subject)
 
         username_1 = "username1"
         username_2 = "username2"
@@ -1035,6 +1229,7 @@ class DatabaseConnectorTests(unittest.TestCase):
 
         with patch('database.connector.settings') as mock_settings:
             mock_settings.MAXIMUM_SCORE = 10
+            mock_settings.country_codes = country_codes
 
             self.subject.update_score(access_token_1, "1", 3)
             self.subject.update_score(access_token_1, "2", 10)
@@ -1077,46 +1272,55 @@ class DatabaseConnectorTests(unittest.TestCase):
         self.assertEqual(expected_results, results)
 
     ################################################################################################
-    def test_get_entry(self):
-        """ Test get entry. """
-        country_codes = ["1"]
+    def test_results_aggregate_is_kept_up_to_date(self):
+        """ Test the results kept in memory match the results counted from the scores table. """
+        country_codes = ["1", "2"]
 
-        utilities.create_tables(self.subject, country_codes)
+        utilities.create_tables(self.subject)
 
-        username = "dave"
         password = "password"
 
-        self.subject.register_user(username, password)
-
-        access_token = self.subject.get_access_information(username)["access_token"]
+        self.subject.register_user("username1", password)
+        access_token_1 = self.subject.get_access_information("username1")["access_token"]
+        self.subject.update_score(access_token_1, "1", 3)
 
-        with patch('database.connector.settings') as mock_settings:
-            mock_settings.country_codes = ["1"]
+        with patch('database.connector.settings.country_codes', country_codes):
+            self.subject.load_results_aggregate()
+        self.assertTrue(self.subject.is_results_aggregate_loaded())
 
-            mock_settings.entries = [
-                {
-                    "id": "1",
-                    "attributes": {}
-                }
-            ]
+        self.subject.register_user("username2", password)
+        access_token_2 = self.subject.get_access_information("username2")["access_token"]
+        self.subject.register_user("username3", password)
 
-            result_entry = self.subject.get_entry(access_token, "1")
+        self.subject.update_score(access_token_1, "1", 7)
+        self.subject.update_score(access_token_2, "1", 7)
+        self.subject.update_score(access_token_2, "2", 10)
+        self.subject.delete_user("username3")
 
-        expected_entry = {
-            "id": "1",
-            "attributes": {
-                "score": -1
+        expected_results = {
+            "1": {
+                -1: 0, 0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 2, 8: 0, 9: 0, 10: 0
+            },
+            "2": {
+                -1: 1, 0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, 8: 0, 9: 0, 10: 1
             }
         }
 
-        self.assertEqual(expected_entry, result_entry)
+        with patch.object(self.subject, 'execute') as mock_execute:
+            self.assertEqual(expected_results,
+                             self.subject.generate_results_dictionary(country_codes))
+            # The results come from memory.
+            mock_execute.assert_not_called()
 
-    ################################################################################################
-    def test_get_entry_when_entry_id_is_not_valid(self):
-        """ Test get entry when if is not valid. """
-        country_codes = ["1"]
+        # Check against the results counted from the scores table.
+        with patch('database.connector.settings.country_codes', country_codes):
+            self.subject.load_results_aggregate()
+        self.assertEqual(expected_results, self.subject.generate_results_dictionary(country_codes))
 
-        utilities.create_tables(self.subject, country_codes)
+    ################################################################################################
+    def test_get_score_when_entry_id_is_not_valid(self):
+        """ Test getting a score when the entry ID is not valid. """
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -1138,75 +1342,13 @@ class DatabaseConnectorTests(unittest.TestCase):
             injection_string = "; select * from access;"
 
             with self.assertRaises(ValueError) as value_error:
-                self.subject.get_entry(access_token, injection_string)
+                self.subject.get_score(access_token, injection_string)
             self.assertEqual("Entry ID is invalid.", str(value_error.exception))
 
-    ################################################################################################
-    def test_generate_entries_dictionary(self):
-        """ Test generate_entries_dictionary. """
-        country_codes = ["1", "2", "3"]
-
-        utilities.create_tables(self.subject, country_codes)
-
-        username = "dave"
-        password = "password"
-
-        self.subject.register_user(username, password)
-
-        access_token = self.subject.get_access_information(username)["access_token"]
-
-        self.subject.update_score(access_token, "1", 7)
-        self.subject.update_score(access_token, "2", 10)
-
-        with patch('database.connector.settings') as mock_settings:
-            mock_settings.MAXIMUM_SCORE = 10
-
-            mock_settings.entries = [
-                {
-                    "id": "1",
-                    "attributes": {}
-                },
-                {
-                    "id": "2",
-                    "attributes": {}
-                },
-                {
-                    "id": "3",
-                    "attributes": {}
-                }
-            ]
-
-            result_entries = self.subject.generate_entries_dictionary(access_token)
-
-        expected_entries = [
-            {
-                "id": "1",
-                "attributes": {
-                    "score": 7
-                }
-            },
-            {
-                "id": "2",
-                "attributes": {
-                    "score": 10
-                }
-            },
-            {
-                "id": "3",
-                "attributes": {
-                    "score": -1
-                }
-            }
-        ]
-
-        self.assertEqual(expected_entries, result_entries)
-
     ################################################################################################
     def test_generate_settings_dictionary(self):
         """ Test generate_settings_dictionary. """
-        country_codes = ["1"]
-
-        utilities.create_tables(self.subject, country_codes)
+        utilities.create_tables(self.subject)
 
         username = "dave"
         password = "password"
@@ -1243,6 +1385,20 @@ class DatabaseConnectorTests(unittest.TestCase):
         self.assertEqual(expected_settings, settings)
 
 
+####################################################################################################
+@unittest.skipIf(MySQLdb is None, "MySQLdb is not installed.")
+class MySQLDatabaseConnectorTests(DatabaseConnectorTests):
+    """ Unit tests for the DatabaseConnector class, using the MySQL server in the settings. """
+    integrity_error = getattr(MySQLdb, "IntegrityError", None)
+    duplicate_entry_message = "Duplicate entry 'dave' for key 'PRIMARY'"
+
+    ################################################################################################
+    def create_backend(self):
+        """ See DatabaseConnectorTests.create_backend. """
+        return mysql.MySQLBackend(settings.DATABASE_HOST, settings.DATABASE_USER,
+                                  settings.DATABASE_PASSWORD)
+
+
 ####################################################################################################
 if __name__ == '__main__':
     unittest.main()
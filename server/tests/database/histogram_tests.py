@@ -0,0 +1,53 @@
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.histogram as histogram
+
+""" This module contains the unit tests for the Histogram class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class HistogramTests(unittest.TestCase):
+    """ Unit tests for the Histogram class. """
+    ################################################################################################
+    def test_snapshot(self):
+        """ Test the snapshot counts observations cumulatively, including the bucket's bound. """
+        subject = histogram.Histogram(buckets=[1, 2])
+        for value in [0.5, 1, 1.5, 3]:
+            subject.observe(value)
+
+        snapshot = subject.get_snapshot()
+        self.assertEqual([(1, 2), (2, 3), (None, 4)], snapshot["buckets"])
+        self.assertEqual(6, snapshot["sum"])
+        self.assertEqual(4, snapshot["count"])
+
+    ################################################################################################
+    def test_get_quantile(self):
+        """ Test quantiles are interpolated within the bucket they fall in. """
+        subject = histogram.Histogram(buckets=[1, 2, 4])
+        for value in [0.5] * 50 + [1.5] * 40 + [3] * 10:
+            subject.observe(value)
+        snapshot = subject.get_snapshot()
+
+        self.assertAlmostEqual(1.0, histogram.get_quantile(snapshot, 0.5))
+        self.assertAlmostEqual(1.75, histogram.get_quantile(snapshot, 0.8))
+        self.assertAlmostEqual(3.6, histogram.get_quantile(snapshot, 0.98))
+
+    ################################################################################################
+    def test_get_quantile_edge_cases(self):
+        """ Test there is no quantile without observations, and observations above every bucket
+        are estimated as the largest bound. """
+        subject = histogram.Histogram(buckets=[1, 2])
+        self.assertIsNone(histogram.get_quantile(subject.get_snapshot(), 0.5))
+
+        subject.observe(10)
+        self.assertEqual(2, histogram.get_quantile(subject.get_snapshot(), 0.99))
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
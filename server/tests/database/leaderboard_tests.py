@@ -0,0 +1,107 @@
+import random
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.leaderboard as leaderboard
+
+""" This module contains the unit tests for the Leaderboard and IndexableSkiplist classes. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class IndexableSkiplistTests(unittest.TestCase):
+    """ Unit tests for the IndexableSkiplist class. """
+    ################################################################################################
+    def test_matches_a_sorted_list(self):
+        """ Test random inserts and removes keep the values sorted and indexable. """
+        random.seed(1)
+        subject = leaderboard.IndexableSkiplist(maximum_levels=4)
+        expected = []
+        for _ in range(2000):
+            if expected and random.random() < 0.4:
+                value = random.choice(expected)
+                expected.remove(value)
+                subject.remove(value)
+            else:
+                value = random.random()
+                expected.append(value)
+                subject.insert(value)
+            expected.sort()
+
+            self.assertEqual(len(expected), len(subject))
+            start = random.randint(0, len(expected))
+            stop = random.randint(start, len(expected) + 1)
+            self.assertEqual(expected[start:stop], subject.get_range(start, stop))
+
+        self.assertEqual(expected, subject.get_range())
+
+    ################################################################################################
+    def test_remove_missing_value(self):
+        """ Test removing a value that is not in the list raises an error. """
+        subject = leaderboard.IndexableSkiplist()
+        subject.insert(1)
+        with self.assertRaises(ValueError):
+            subject.remove(2)
+        self.assertEqual([1], subject.get_range())
+
+
+####################################################################################################
+class LeaderboardTests(unittest.TestCase):
+    """ Unit tests for the Leaderboard class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        # "a" has 2 votes totalling 10, "b" has 4 totalling 12, "c" has no votes.
+        self.subject = leaderboard.Leaderboard({
+            "a": {-1: 3, 4: 1, 6: 1},
+            "b": {-1: 1, 3: 4},
+            "c": {-1: 5, 0: 0}
+        })
+
+    ################################################################################################
+    def test_get_ranking(self):
+        """ Test entries are ranked by total and by average, with entries without votes last. """
+        self.assertEqual([
+            {"id": "b", "rank": 1, "total": 12, "votes": 4, "average": 3.0},
+            {"id": "a", "rank": 2, "total": 10, "votes": 2, "average": 5.0},
+            {"id": "c", "rank": 3, "total": 0, "votes": 0, "average": None}
+        ], self.subject.get_ranking(leaderboard.TOTAL))
+        self.assertEqual(["a", "b", "c"],
+                         [row["id"] for row in self.subject.get_ranking(leaderboard.AVERAGE)])
+
+    ################################################################################################
+    def test_get_part_of_the_ranking(self):
+        """ Test part of the ranking can be got, keeping each entry's rank. """
+        self.assertEqual([("a", 2)], [(row["id"], row["rank"])
+                                      for row in self.subject.get_ranking(start=1, count=1)])
+        self.assertEqual([], self.subject.get_ranking(start=3))
+
+    ################################################################################################
+    def test_change_score(self):
+        """ Test changing scores moves entries, and ties are broken by votes then entry ID. """
+        self.subject.change_score("c", -1, 10)
+        self.assertEqual(["b", "c", "a"], [row["id"] for row in self.subject.get_ranking()])
+        self.assertEqual(["c", "a", "b"],
+                         [row["id"] for row in self.subject.get_ranking(leaderboard.AVERAGE)])
+
+        self.subject.change_score("c", 10, 2)
+        self.subject.change_score("c", -1, 0)
+        self.subject.change_score("a", 4, -1)
+        self.assertEqual([("b", 12), ("a", 6), ("c", 2)],
+                         [(row["id"], row["total"]) for row in self.subject.get_ranking()])
+        self.assertEqual(["a", "b", "c"],
+                         [row["id"] for row in self.subject.get_ranking(leaderboard.AVERAGE)])
+
+    ################################################################################################
+    def test_unknown_order(self):
+        """ Test an unknown order is rejected. """
+        with self.assertRaises(ValueError):
+            self.subject.get_ranking("median")
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import concurrent.futures
+from mock import patch
+import sys
+import threading
+import tornado.gen
+import tornado.testing
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.passwords as passwords
+
+""" This module contains the unit tests for the PasswordHasher class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class PasswordHasherTests(tornado.testing.AsyncTestCase):
+    """ Unit tests for the PasswordHasher class. """
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_hash_and_verify_on_the_default_executor(self):
+        """ Test hashing and verifying without an executor. """
+        subject = passwords.PasswordHasher()
+
+        with patch('database.passwords.settings') as mock_settings:
+            mock_settings.PASSWORD_SALTING_ROUNDS = 3
+            mock_settings.PASSWORD_SALTING_SIZE = 5
+            password_hash = await subject.hash("password")
+
+        self.assertTrue(await subject.verify("password", password_hash))
+        self.assertFalse(await subject.verify("other_password", password_hash))
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["hashed"])
+        self.assertEqual(2, statistics["verified"])
+        self.assertEqual(0, statistics["queue_depth"])
+        self.assertEqual(1, statistics["maximum_queue_depth"])
+
+    ################################################################################################
+    @tornado.testing.gen_test(timeout=30)
+    async def test_hash_and_verify_on_a_process_pool(self):
+        """ Test hashing and verifying on a process pool. """
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            subject = passwords.PasswordHasher(executor)
+            subject.start()
+
+            password_hash = await subject.hash("password")
+            self.assertTrue(await subject.verify("password", password_hash))
+            self.assertFalse(await subject.verify("other_password", password_hash))
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_hashing_is_rejected_when_the_queue_is_full(self):
+        """ Test passwords are rejected once the maximum number are waiting to be hashed, without
+        blocking the IOLoop while they wait. """
+        hash_started = threading.Event()
+        finish_hash = threading.Event()
+
+        def blocking_hash(password):
+            hash_started.set()
+            finish_hash.wait(5)
+            return "hash"
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            subject = passwords.PasswordHasher(executor, maximum_queue_size=1)
+
+            with patch('database.passwords.hash_password', blocking_hash):
+                waiting_hash = tornado.gen.convert_yielded(subject.hash("password"))
+                while not hash_started.is_set():
+                    await tornado.gen.sleep(0.001)
+
+                with self.assertRaises(passwords.PasswordHasherBusyException) as busy:
+                    await subject.hash("password")
+                self.assertEqual("Server is busy, please try again.", str(busy.exception))
+
+                finish_hash.set()
+                self.assertEqual("hash", await waiting_hash)
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["hashed"])
+        self.assertEqual(1, statistics["rejected"])
+        self.assertEqual(0, statistics["queue_depth"])
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_hashing_latency_is_recorded(self):
+        """ Test the time spent waiting for hashes is recorded. """
+        subject = passwords.PasswordHasher()
+
+        with patch('database.passwords.hash_password') as mock_hash:
+            mock_hash.return_value = "hash"
+            with patch('database.passwords.time.time') as mock_time:
+                mock_time.side_effect = [10.0, 10.5, 20.0, 20.25]
+                await subject.hash("password")
+                await subject.hash("password")
+
+        statistics = subject.get_statistics()
+        self.assertEqual(0.75, statistics["total_seconds"])
+        self.assertEqual(0.5, statistics["maximum_seconds"])
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
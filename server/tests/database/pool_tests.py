@@ -0,0 +1,298 @@
+from mock import patch, MagicMock
+import sys
+import threading
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.pool as pool
+
+""" This module contains the unit tests for the ConnectionPool class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class ConnectionPoolTests(unittest.TestCase):
+    """ Unit tests for the ConnectionPool class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.connections = []
+
+        def connect():
+            connection = MagicMock()
+            self.connections.append(connection)
+            return connection
+
+        self.connect = connect
+
+    ################################################################################################
+    def test_minimum_connections_are_created(self):
+        """ Test the minimum number of connections are opened when the pool is created. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=2, maximum_size=4)
+
+        self.assertEqual(2, len(self.connections))
+        statistics = subject.get_statistics()
+        self.assertEqual(2, statistics["size"])
+        self.assertEqual(2, statistics["idle"])
+        self.assertEqual(0, statistics["in_use"])
+
+    ################################################################################################
+    def test_invalid_sizes(self):
+        """ Test the pool cannot be created with invalid sizes. """
+        with self.assertRaises(ValueError):
+            pool.ConnectionPool(self.connect, minimum_size=3, maximum_size=2)
+        with self.assertRaises(ValueError):
+            pool.ConnectionPool(self.connect, minimum_size=0, maximum_size=0)
+
+    ################################################################################################
+    def test_acquire_and_release(self):
+        """ Test connections are reused once released and created on demand. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2)
+
+        first = subject.acquire()
+        second = subject.acquire()
+        self.assertIsNot(first, second)
+        self.assertEqual(2, len(self.connections))
+        self.assertEqual(2, subject.get_statistics()["in_use"])
+
+        subject.release(first)
+        self.assertIs(first, subject.acquire())
+        self.assertEqual(2, len(self.connections))
+
+    ################################################################################################
+    def test_acquire_times_out_when_pool_is_exhausted(self):
+        """ Test acquiring a connection times out when every connection is in use. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=1,
+                                      acquire_timeout=0.01)
+        subject.acquire()
+
+        with self.assertRaises(pool.ConnectionPoolTimeoutException):
+            subject.acquire()
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["waited"])
+        self.assertEqual(1, statistics["timed_out"])
+
+    ################################################################################################
+    def test_connection_is_discarded_when_connection_is_lost(self):
+        """ Test a connection is closed rather than reused after the server has gone away. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=1)
+
+        with self.assertRaises(Exception):
+            with subject.connection():
+                raise Exception(2006, "MySQL server has gone away")
+
+        self.connections[0].close.assert_called_once_with()
+        self.assertEqual(0, subject.get_statistics()["size"])
+
+        with subject.connection() as connection:
+            self.assertIs(self.connections[1], connection)
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["reconnected"])
+        self.assertEqual(1, statistics["idle"])
+
+    ################################################################################################
+    def test_connection_is_released_on_other_errors(self):
+        """ Test a connection is returned to the pool after an unrelated error. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=1)
+
+        with self.assertRaises(ValueError):
+            with subject.connection():
+                raise ValueError("Not a connection error.")
+
+        self.connections[0].close.assert_not_called()
+        self.assertEqual(1, subject.get_statistics()["idle"])
+
+    ################################################################################################
+    def test_stale_connection_is_replaced(self):
+        """ Test a connection that fails its health check is replaced by a new connection. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=1,
+                                      health_check_interval=0)
+        self.connections[0].ping.side_effect = Exception(2006, "MySQL server has gone away")
+
+        with patch('database.pool.time.time') as mock_time:
+            mock_time.return_value = 1e10
+            connection = subject.acquire()
+
+        self.assertIs(self.connections[1], connection)
+        self.connections[0].close.assert_called_once_with()
+        self.assertEqual(1, subject.get_statistics()["reconnected"])
+
+    ################################################################################################
+    def test_stale_connection_is_closed_once_when_reconnecting_fails(self):
+        """ Test a stale connection is closed once, and its place in the pool given up, if a new
+        connection cannot be opened. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=1,
+                                      health_check_interval=0)
+        self.connections[0].ping.side_effect = Exception(2006, "MySQL server has gone away")
+
+        with patch('database.pool.time.time') as mock_time, \
+                patch.object(subject, '_ConnectionPool__connect',
+                             side_effect=Exception(2003, "Can't connect to MySQL server")):
+            mock_time.return_value = 1e10
+            with self.assertRaises(Exception):
+                subject.acquire()
+
+        self.connections[0].close.assert_called_once_with()
+        statistics = subject.get_statistics()
+        self.assertEqual(0, statistics["size"])
+        self.assertEqual(1, statistics["closed"])
+        self.assertEqual(1, statistics["reconnected"])
+
+        # The pool opens a connection again once the database is back.
+        connection = subject.acquire()
+        self.assertIs(self.connections[1], connection)
+        self.assertEqual(1, subject.get_statistics()["size"])
+
+    ################################################################################################
+    def test_connections_are_opened_without_holding_up_other_threads(self):
+        """ Test a connection being opened does not stop other threads acquiring and releasing
+        connections, and still counts towards the maximum size. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2,
+                                      acquire_timeout=0)
+        first = subject.acquire()
+        connecting = threading.Event()
+        finish_connecting = threading.Event()
+
+        def connect():
+            connecting.set()
+            finish_connecting.wait(5)
+            return self.connect()
+
+        with patch.object(subject, '_ConnectionPool__connect', connect):
+            thread = threading.Thread(target=subject.acquire)
+            thread.start()
+            self.assertTrue(connecting.wait(5))
+
+            subject.release(first)
+            self.assertIs(first, subject.acquire())
+            with self.assertRaises(pool.ConnectionPoolTimeoutException):
+                subject.acquire()
+
+            finish_connecting.set()
+            thread.join(5)
+        self.assertEqual(2, subject.get_statistics()["in_use"])
+
+    ################################################################################################
+    def test_connections_use_the_database(self):
+        """ Test connections switch to the database set on the pool when they are acquired. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2)
+        subject.use_database("visiondb")
+
+        first = subject.acquire()
+        second = subject.acquire()
+        first.select_db.assert_called_once_with("visiondb")
+        second.select_db.assert_called_once_with("visiondb")
+
+        # The database is only selected again if it changes.
+        subject.release(first)
+        self.assertIs(first, subject.acquire())
+        first.select_db.assert_called_once_with("visiondb")
+
+    ################################################################################################
+    def test_exclusive_waits_for_the_connections_in_use(self):
+        """ Test the exclusive context manager waits for every connection to be released, and stops
+        other threads acquiring connections until it exits. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2,
+                                      acquire_timeout=5)
+        first = subject.acquire()
+        entered = threading.Event()
+        leave = threading.Event()
+        acquired = []
+
+        def exclusive():
+            with subject.exclusive():
+                entered.set()
+                # The current thread can still use the pool.
+                subject.release(subject.acquire())
+                leave.wait(5)
+
+        exclusive_thread = threading.Thread(target=exclusive)
+        exclusive_thread.start()
+        acquire_thread = threading.Thread(target=lambda: acquired.append(subject.acquire()))
+        acquire_thread.start()
+        self.assertFalse(entered.wait(0.05))
+
+        subject.release(first)
+        self.assertTrue(entered.wait(5))
+        acquire_thread.join(0.05)
+        self.assertEqual([], acquired)
+
+        leave.set()
+        exclusive_thread.join(5)
+        acquire_thread.join(5)
+        self.assertEqual(1, len(acquired))
+
+    ################################################################################################
+    def test_exclusive_times_out(self):
+        """ Test the exclusive context manager gives up if a connection is not released in time,
+        and other threads can then acquire connections again. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2,
+                                      acquire_timeout=0.01)
+        first = subject.acquire()
+
+        with self.assertRaises(pool.ConnectionPoolTimeoutException):
+            with subject.exclusive():
+                pass
+
+        subject.release(subject.acquire())
+        subject.release(first)
+        self.assertEqual(1, subject.get_statistics()["timed_out"])
+
+    ################################################################################################
+    def test_reap_idle_connections(self):
+        """ Test idle connections are closed, leaving the minimum number of connections open. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=3,
+                                      idle_timeout=10)
+        connections = [subject.acquire() for _ in range(3)]
+        for connection in connections:
+            subject.release(connection)
+
+        # Nothing has been idle for long enough yet.
+        self.assertEqual(0, subject.reap_idle_connections())
+
+        with patch('database.pool.time.time') as mock_time:
+            mock_time.return_value = 1e10
+            self.assertEqual(2, subject.reap_idle_connections())
+
+        statistics = subject.get_statistics()
+        self.assertEqual(1, statistics["size"])
+        self.assertEqual(2, statistics["reaped"])
+
+    ################################################################################################
+    def test_connections_are_closed_without_holding_up_other_threads(self):
+        """ Test a connection being closed does not stop other threads acquiring and releasing
+        connections, and its place in the pool is given up straight away. """
+        subject = pool.ConnectionPool(self.connect, minimum_size=1, maximum_size=2,
+                                      acquire_timeout=0)
+        lost = subject.acquire()
+        closing = threading.Event()
+        finish_closing = threading.Event()
+
+        def close():
+            closing.set()
+            finish_closing.wait(5)
+
+        lost.close.side_effect = close
+        thread = threading.Thread(target=subject.discard, args=(lost,))
+        thread.start()
+        self.assertTrue(closing.wait(5))
+
+        first = subject.acquire()
+        second = subject.acquire()
+        subject.release(first)
+        subject.release(second)
+        self.assertEqual(2, subject.get_statistics()["size"])
+        self.assertTrue(thread.is_alive())
+
+        finish_closing.set()
+        thread.join(5)
+        self.assertEqual(1, subject.get_statistics()["closed"])
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.results as results
+
+""" This module contains the unit tests for the ResultsAggregate class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+def default_scores(maximum_score=3):
+    """ Gets results where nobody has given any score.
+
+    Args:
+        maximum_score (int): The maximum score.
+
+    Returns:
+        dict: Dictionary of score to the number of times it has been given.
+    """
+    return dict((score, 0) for score in range(-1, maximum_score + 1))
+
+
+####################################################################################################
+class ResultsAggregateTests(unittest.TestCase):
+    """ Unit tests for the ResultsAggregate class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.initial_results = {
+            "1": default_scores(),
+            "2": default_scores()
+        }
+        self.subject = results.ResultsAggregate(self.initial_results)
+
+    ################################################################################################
+    def test_add_and_remove_users(self):
+        """ Test adding users counts them as not having scored any entries. """
+        self.subject.add_user()
+        self.subject.add_user()
+
+        expected_results = {
+            "1": {-1: 2, 0: 0, 1: 0, 2: 0, 3: 0},
+            "2": {-1: 2, 0: 0, 1: 0, 2: 0, 3: 0}
+        }
+        self.assertEqual(expected_results, self.subject.get_results(["1", "2"]))
+
+        self.subject.change_score("1", -1, 3)
+        self.subject.remove_user({"1": 3, "2": -1})
+
+        expected_results = {
+            "1": {-1: 1, 0: 0, 1: 0, 2: 0, 3: 0},
+            "2": {-1: 1, 0: 0, 1: 0, 2: 0, 3: 0}
+        }
+        self.assertEqual(expected_results, self.subject.get_results(["1", "2"]))
+
+    ################################################################################################
+    def test_change_score(self):
+        """ Test changing a score moves the vote from the old score to the new score. """
+        self.subject.add_user()
+        self.subject.add_user()
+
+        self.subject.change_score("1", -1, 2)
+        self.subject.change_score("1", -1, 2)
+        self.subject.change_score("1", 2, 0)
+        self.subject.change_score("2", -1, 3)
+        self.subject.change_score("2", 3, 3)
+
+        expected_results = {
+            "1": {-1: 0, 0: 1, 1: 0, 2: 1, 3: 0},
+            "2": {-1: 1, 0: 0, 1: 0, 2: 0, 3: 1}
+        }
+        self.assertEqual(expected_results, self.subject.get_results(["1", "2"]))
+
+    ################################################################################################
+    def test_results_are_copied(self):
+        """ Test changing the returned results or the initial results does not change the
+        aggregate. """
+        self.initial_results["1"][0] = 10
+
+        results_copy = self.subject.get_results(["1"])
+        results_copy["1"][0] = 20
+
+        self.assertEqual({"1": default_scores()}, self.subject.get_results(["1"]))
+
+
+    ################################################################################################
+    def test_get_ranking(self):
+        """ Test the ranking follows score changes and removed users. """
+        self.subject.add_user()
+        self.subject.add_user()
+        self.subject.change_score("1", -1, 1)
+        self.subject.change_score("2", -1, 3)
+        self.assertEqual(["2", "1"], [row["id"] for row in self.subject.get_ranking()])
+
+        self.subject.change_score("1", 1, 2)
+        self.subject.change_score("1", -1, 2)
+        self.assertEqual(["1", "2"], [row["id"] for row in self.subject.get_ranking("total")])
+        self.assertEqual(["2", "1"], [row["id"] for row in self.subject.get_ranking("average")])
+
+        self.subject.remove_user({"1": 2})
+        self.assertEqual([("2", 3, 1), ("1", 2, 1)],
+                         [(row["id"], row["total"], row["votes"])
+                          for row in self.subject.get_ranking()])
+
+
+    ################################################################################################
+    def test_take_changes(self):
+        """ Test the changes are taken once, with increasing sequence numbers, and changes that
+        cancel out are not taken. """
+        self.assertIsNone(self.subject.take_changes())
+
+        self.subject.add_user()
+        self.subject.change_score("1", -1, 2)
+        self.assertEqual((1, [("2", -1, 1), ("1", 2, 1)]), self.subject.take_changes())
+        self.assertIsNone(self.subject.take_changes())
+
+        self.subject.change_score("1", 2, 3)
+        self.assertEqual((2, [("1", 2, -1), ("1", 3, 1)]), self.subject.take_changes())
+
+    ################################################################################################
+    def test_get_snapshot(self):
+        """ Test the snapshot does not include changes that have not been taken yet. """
+        self.subject.add_user()
+        self.subject.take_changes()
+        self.subject.change_score("1", -1, 2)
+
+        sequence, snapshot = self.subject.get_snapshot(["1", "2"])
+        self.assertEqual(1, sequence)
+        self.assertEqual({-1: 1, 0: 0, 1: 0, 2: 0, 3: 0}, snapshot["1"])
+
+        sequence, changes = self.subject.take_changes()
+        self.assertEqual(2, sequence)
+        for entry_id, score, count in changes:
+            snapshot[entry_id][score] += count
+        self.assertEqual(self.subject.get_results(["1", "2"]), snapshot)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,289 @@
+from datetime import datetime
+from mock import patch
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+import uuid
+
+sys.path.append('../..')
+
+# Test imports.
+from tests.database import utilities
+
+# Source imports.
+from database.backends import sqlite
+import configuration.settings as settings
+
+""" This module contains the unit tests for the SQLiteBackend class, including running the
+DatabaseConnector on it. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class SQLiteBackendTests(unittest.TestCase):
+    """ Unit tests for the SQLiteBackend class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.directory = tempfile.mkdtemp()
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        shutil.rmtree(self.directory)
+
+    ################################################################################################
+    def test_translate_query(self):
+        """ Test MySQLdb placeholders are translated to SQLite placeholders. """
+        self.assertEqual("SELECT * FROM users WHERE username = ? AND theme LIKE '%'",
+                         sqlite.translate_query("SELECT * FROM users WHERE username = %s AND "
+                                                "theme LIKE '%%'"))
+
+    ################################################################################################
+    def test_databases_in_memory_and_in_files(self):
+        """ Test creating, using and dropping databases. """
+        for backend in [sqlite.SQLiteBackend(), sqlite.SQLiteBackend(self.directory)]:
+            connection = backend.connect()
+
+            def execute(*args):
+                cursor = connection.cursor()
+                cursor.execute(*args)
+                return cursor
+
+            self.assertEqual([], backend.get_all_databases(execute))
+            self.assertIsNone(backend.get_current_database(execute))
+
+            with self.assertRaises(sqlite3.OperationalError):
+                connection.select_db("database")
+
+            backend.create_database(execute, "database")
+            self.assertEqual(["database"], backend.get_all_databases(execute))
+
+            connection.select_db("database")
+            self.assertEqual("database", backend.get_current_database(execute))
+            execute("CREATE TABLE test (a INT, b VARCHAR(10))")
+            self.assertEqual(["a", "b"], backend.get_columns(execute, "test"))
+            self.assertEqual(["test"], backend.get_tables(execute))
+
+            # Other connections see the same database.
+            other_connection = backend.connect()
+            other_connection.select_db("database")
+            self.assertIsNotNone(other_connection.cursor().execute("SELECT * FROM test"))
+
+            backend.drop_database(execute, "database")
+            self.assertEqual([], backend.get_all_databases(execute))
+            self.assertIsNone(backend.get_current_database(execute))
+
+            # A new database with the same name starts empty.
+            backend.create_database(execute, "database")
+            connection.select_db("database")
+            self.assertEqual([], backend.get_columns(execute, "test"))
+
+    ################################################################################################
+    def test_cursors_fetch_every_row(self):
+        """ Test rows can be read after the connection has been used again. """
+        connection = sqlite.SQLiteBackend().connect()
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE test (a INT)")
+        for value in range(3):
+            cursor.execute("INSERT INTO test (a) VALUES (%s)", (value, ))
+            self.assertEqual(1, cursor.rowcount)
+
+        first_cursor = connection.cursor()
+        first_cursor.execute("SELECT a FROM test ORDER BY a")
+        connection.cursor().execute("DELETE FROM test")
+
+        self.assertEqual((0, ), first_cursor.fetchone())
+        self.assertEqual([(1, ), (2, )], first_cursor.fetchall())
+        self.assertIsNone(first_cursor.fetchone())
+
+    ################################################################################################
+    def test_types(self):
+        """ Test datetimes and UUIDs can be stored and DATETIME columns are read as datetimes. """
+        connection = sqlite.SQLiteBackend().connect()
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE test (token VARCHAR(36), expiry DATETIME)")
+
+        token = uuid.uuid4()
+        cursor.execute("INSERT INTO test (token, expiry) VALUES (%s, %s)",
+                       (token, datetime(2018, 5, 12, 20, 0, 0)))
+        cursor.execute("INSERT INTO test (token, expiry) VALUES (%s, %s)",
+                       (token, "2018-05-12 21:00:00"))
+
+        cursor.execute("SELECT token, expiry FROM test")
+        self.assertEqual([(str(token), datetime(2018, 5, 12, 20, 0, 0)),
+                          (str(token), datetime(2018, 5, 12, 21, 0, 0))], cursor.fetchall())
+
+    ################################################################################################
+    def test_upsert(self):
+        """ Test the upsert statement inserts and then updates a row. """
+        backend = sqlite.SQLiteBackend()
+        connection = backend.connect()
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE test (a INT, b INT, PRIMARY KEY (a))")
+
+        command = backend.upsert("test", ("a", "b"), ("a", ))
+        cursor.execute(command, (1, 2))
+        cursor.execute(command, (1, 3))
+
+        cursor.execute("SELECT a, b FROM test")
+        self.assertEqual([(1, 3)], cursor.fetchall())
+
+
+####################################################################################################
+class SQLiteDatabaseConnectorTests(unittest.TestCase):
+    """ Unit tests for the DatabaseConnector class running on the SQLiteBackend. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.subject, self.connection_pool, self.backend = utilities.create_sqlite_connector()
+
+        self.settings_patch = utilities.patch_password_salting()
+        self.settings_patch.start()
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        self.settings_patch.stop()
+        self.subject.drop_database("UNITTEST_DATABASE")
+        self.connection_pool.close()
+
+    ################################################################################################
+    def test_register_login_and_delete_user(self):
+        """ Test a user can register, log in and be deleted. """
+        self.subject.register_user("dave", "password")
+        self.assertTrue(self.subject.user_exists("dave"))
+        self.assertTrue(self.subject.is_user_activated("dave"))
+
+        access_information = self.subject.get_access_information("dave")
+        self.assertEqual("dave", self.subject.get_username(access_information["access_token"]))
+        self.assertTrue(self.subject.is_access_token_valid("dave",
+                                                           access_information["access_token"]))
+        self.assertTrue(self.subject.is_refresh_token_valid("dave",
+                                                            access_information["refresh_token"]))
+
+        with self.assertRaises(ValueError):
+            self.subject.login_user("dave", "wrong_password")
+        self.subject.login_user("dave", "password")
+
+        self.subject.deactivate_user("dave")
+        with self.assertRaises(Exception) as exception:
+            self.subject.get_access_information("dave")
+        self.assertEqual("Account has been deactivated.", str(exception.exception))
+
+        self.subject.delete_user("dave")
+        self.assertFalse(self.subject.user_exists("dave"))
+
+    ################################################################################################
+    def test_scores_and_results(self):
+        """ Test updating scores and counting the results. """
+        entry_ids = settings.country_codes[:2]
+
+        for username in ["dave", "fred"]:
+            self.subject.register_user(username, "password")
+        access_token = self.subject.get_access_information("dave")["access_token"]
+
+        self.subject.update_score(access_token, entry_ids[0], 4)
+        self.subject.update_score(access_token, entry_ids[0], 6)
+        self.assertEqual(6, self.subject.get_score(access_token, entry_ids[0]))
+        self.assertEqual(-1, self.subject.get_score(access_token, entry_ids[1]))
+
+        results = self.subject.generate_results_dictionary(entry_ids)
+        self.assertEqual(1, results[entry_ids[0]][6])
+        self.assertEqual(1, results[entry_ids[0]][-1])
+        self.assertEqual(2, results[entry_ids[1]][-1])
+
+        self.subject.load_results_aggregate()
+        self.assertEqual(results, self.subject.generate_results_dictionary(entry_ids))
+
+    ################################################################################################
+    def test_leaderboard(self):
+        """ Test the leaderboard is the same whether it is counted or kept in memory. """
+        entry_ids = settings.country_codes[:2]
+        self.subject.register_user("dave", "password")
+        access_token = self.subject.get_access_information("dave")["access_token"]
+        self.subject.update_scores(access_token, [(entry_ids[0], 4), (entry_ids[1], 6)])
+
+        leaderboard = self.subject.get_leaderboard()
+        self.assertEqual([(entry_ids[1], 6), (entry_ids[0], 4)],
+                         [(row["id"], row["total"]) for row in leaderboard[:2]])
+
+        self.subject.load_results_aggregate()
+        self.assertEqual(leaderboard, self.subject.get_leaderboard())
+        self.subject.update_score(access_token, entry_ids[0], 10)
+        self.assertEqual(entry_ids[0], self.subject.get_leaderboard("average", 0, 1)[0]["id"])
+
+    ################################################################################################
+    def test_transaction_is_rolled_back(self):
+        """ Test nothing is committed if a transaction fails part way through. """
+        with patch.object(self.subject, 'insert_access') as mock_insert_access:
+            mock_insert_access.side_effect = Exception("Failed")
+            with self.assertRaises(Exception):
+                self.subject.register_user("dave", "password")
+
+        self.assertFalse(self.subject.user_exists("dave"))
+
+    ################################################################################################
+    def create_scores_by_column_table(self):
+        """ Replaces the scores table with one that has a column per entry, as used by older
+        versions, with some scores in it. """
+        self.subject.execute("DROP TABLE scores")
+        self.subject.execute("""
+            CREATE TABLE scores (
+            username VARCHAR(20) NOT NULL,
+            `1` INT NOT NULL DEFAULT -1,
+            `2` INT NOT NULL DEFAULT -1,
+            PRIMARY KEY (username),
+            FOREIGN KEY (username) REFERENCES users(username)
+            )
+        """)
+        for username in ["dave", "steve"]:
+            self.subject.execute("INSERT INTO users (username, password) VALUES (%s, 'pass')",
+                                 (username, ))
+        self.subject.execute("INSERT INTO scores (username, `1`, `2`) VALUES ('dave', 4, -1)")
+        self.subject.execute("INSERT INTO scores (username, `1`, `2`) VALUES ('steve', 10, 0)")
+
+    ################################################################################################
+    def check_migrated_scores(self):
+        """ Checks the scores table has a row per score, and the old table has been dropped. """
+        cursor = self.subject.execute("SELECT username, entry_id, score FROM scores "
+                                      "ORDER BY username, entry_id")
+        self.assertEqual([("dave", "1", 4), ("steve", "1", 10), ("steve", "2", 0)],
+                         cursor.fetchall())
+        self.assertNotIn("scores_by_column", self.backend.get_tables(self.subject.execute))
+
+    ################################################################################################
+    def test_migrate_scores_table(self):
+        """ Test migrating a scores table with a column per entry to a row per score. """
+        self.create_scores_by_column_table()
+
+        self.assertTrue(self.subject.migrate_scores_table())
+        self.assertFalse(self.subject.migrate_scores_table())
+
+        self.check_migrated_scores()
+
+    ################################################################################################
+    def test_migrate_scores_table_after_a_migration_stopped(self):
+        """ Test a migration that stopped after the old table was renamed is finished, whether or
+        not the new table was created and some scores copied. """
+        for scores_copied in [False, True]:
+            self.create_scores_by_column_table()
+            self.subject.execute("ALTER TABLE scores RENAME TO scores_by_column")
+            if scores_copied:
+                self.subject.create_scores_table()
+                self.subject.execute("INSERT INTO scores (username, entry_id, score) "
+                                     "VALUES ('dave', '1', 4)")
+
+            self.assertTrue(self.subject.migrate_scores_table())
+            self.assertFalse(self.subject.migrate_scores_table())
+
+            self.check_migrated_scores()
+            self.subject.execute("DELETE FROM scores")
+            self.subject.execute("DELETE FROM users")
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,18 @@
+from mock import patch
+import re
 import sys
 import uuid
 
 sys.path.append('../..')
 
 import configuration.settings as settings
+import database.connector as connector
+import database.pool as pool
+from database.backends import sqlite
 
 
-""" This module contains the DatabaseTestUtilities class, which is used for checking properties of
-the database. """
+""" This module contains the functions used for checking properties of the database, whether it is
+a SQLite database or on a MySQL server. """
 __author__ = "Thomas Reeve"
 
 
@@ -35,162 +40,178 @@ def sequences_to_dictionary(sequence, index):
 
 
 ####################################################################################################
-def check_users_table(database_connection, database_name, tester):
-    """ Checks the users table.
-    
+def is_sqlite(database_connection):
+    """ Checks if a connection is to a SQLite database, rather than a MySQL server.
+
     Args:
-        database_connection (object): The database connector.
-        database_name (str): The name of the database we are checking in.
-        tester (unittest.TestCase): The unittest.TestCase object.
+        database_connection (object): The database connection.
+
+    Returns:
+        bool: True if the connection is to a SQLite database, False otherwise.
     """
-    cursor = database_connection.cursor()
+    return isinstance(database_connection, sqlite.SQLiteConnection)
 
-    cursor.execute("SHOW COLUMNS FROM users")
-    columns_info = cursor.fetchall()
 
-    tester.assertEqual(6, len(columns_info))
+####################################################################################################
+def get_columns(database_connection, table_name):
+    """ Gets the columns of a table, with their types written the same way for every backend, i.e.
+    in lower case with MySQL's display widths removed.
 
-    columns_dict = sequences_to_dictionary(columns_info, 0)
-    
-    username_type = 'varchar(%s)' % settings.MAX_USERNAME_LENGTH
-    tester.assertSequenceEqual(('username', username_type, 'NO', 'PRI', None, ''),
-                               columns_dict["username"])
+    Args:
+        database_connection (object): The database connection.
+        table_name (str): The name of the table.
 
-    password_type = 'varchar(%s)' % settings.PASSWORD_HASH_LENGTH
-    tester.assertSequenceEqual(('password', password_type, 'NO', '', None, ''),
-                               columns_dict["password"])
+    Returns:
+        dict: The type, whether it can be NULL and the default of each column, by column name.
+    """
+    cursor = database_connection.cursor()
+    columns = {}
+    if is_sqlite(database_connection):
+        cursor.execute("PRAGMA table_info(`%s`)" % table_name)
+        for _, name, column_type, not_null, default, _ in cursor.fetchall():
+            if default is not None:
+                default = default.strip("'")
+            columns[name] = (column_type.lower(), not not_null, default)
+    else:
+        cursor.execute("SHOW COLUMNS FROM `%s`" % table_name)
+        for name, column_type, null, _, default, _ in cursor.fetchall():
+            column_type = column_type.lower()
+            if column_type == "tinyint(1)":
+                column_type = "boolean"
+            columns[name] = (re.sub(r"^int\(\d+\)$", "int", column_type), null == "YES", default)
+    return columns
 
-    refresh_token_type = 'varchar(%s)' % settings.UUID_LENGTH
-    tester.assertSequenceEqual(('refresh_token', refresh_token_type, 'YES', '', None, ''),
-                               columns_dict["refresh_token"])
 
-    refresh_token_expiry_type = 'datetime'
-    tester.assertSequenceEqual(('refresh_token_expiry', refresh_token_expiry_type, 'YES', '', None,
-                                ''),
-                               columns_dict["refresh_token_expiry"])
+####################################################################################################
+def get_primary_key(database_connection, table_name):
+    """ Gets the columns in the primary key of a table.
 
-    activated_type = 'tinyint(1)'
-    tester.assertSequenceEqual(('activated', activated_type, 'NO', '', '0', ''),
-                               columns_dict["activated"])
+    Args:
+        database_connection (object): The database connection.
+        table_name (str): The name of the table.
 
-    theme_type = 'varchar(%s)' % settings.THEME_LENGTH
-    tester.assertSequenceEqual(('theme', theme_type, 'NO', '', 'ocean', ''),
-                               columns_dict["theme"])
+    Returns:
+        list(str): The names of the columns, in order.
+    """
+    cursor = database_connection.cursor()
+    if is_sqlite(database_connection):
+        cursor.execute("PRAGMA table_info(`%s`)" % table_name)
+        return [row[1] for row in sorted(cursor.fetchall(), key=lambda row: row[5]) if row[5] > 0]
 
-    schema_query = """
-        SELECT *
+    cursor.execute("""
+        SELECT COLUMN_NAME
         FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-        WHERE `TABLE_SCHEMA` = '%s' AND
-              `TABLE_NAME` = 'users'
-    """ % (database_name, )
-    cursor.execute(schema_query)
-    users_schema = cursor.fetchall()
-
-    tester.assertEqual(1, len(users_schema))
-    schema_dict = sequences_to_dictionary(users_schema, 6)
-
-    expected_schema = ('def', 'UNITTEST_DATABASE', 'PRIMARY', 'def', 'UNITTEST_DATABASE',
-                       'users', 'username', 1, None, None, None, None)
-    tester.assertSequenceEqual(expected_schema, schema_dict["username"])
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+    """, (table_name, ))
+    return [row[0] for row in cursor.fetchall()]
 
 
 ####################################################################################################
-def check_access_table(database_connection, database_name, tester):
-    """ Checks the access table.
-    
+def get_foreign_keys(database_connection, table_name):
+    """ Gets the foreign keys of a table.
+
     Args:
-        database_connection (object): The database connector.
-        database_name (str): The name of the database we are checking in.
-        tester (unittest.TestCase): The unittest.TestCase object.
+        database_connection (object): The database connection.
+        table_name (str): The name of the table.
+
+    Returns:
+        list(tuple): The column, the table it references and the column in that table, of each
+        foreign key.
     """
     cursor = database_connection.cursor()
+    if is_sqlite(database_connection):
+        cursor.execute("PRAGMA foreign_key_list(`%s`)" % table_name)
+        return sorted((row[3], row[2], row[4]) for row in cursor.fetchall())
 
-    cursor.execute("SHOW COLUMNS FROM access")
-    columns_info = cursor.fetchall()
-
-    tester.assertEqual(3, len(columns_info))
-
-    columns_dict = sequences_to_dictionary(columns_info, 0)
-
-    username_type = 'varchar(%s)' % settings.MAX_USERNAME_LENGTH
-    tester.assertSequenceEqual(('username', username_type, 'NO', 'PRI', None, ''),
-                               columns_dict["username"])
-
-    access_token_type = 'varchar(%s)' % settings.UUID_LENGTH
-    tester.assertSequenceEqual(('access_token', access_token_type, 'NO', '', None, ''),
-                               columns_dict["access_token"])
+    cursor.execute("""
+        SELECT COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (table_name, ))
+    return sorted(tuple(row) for row in cursor.fetchall())
 
-    tester.assertSequenceEqual(('access_token_expiry', 'datetime', 'NO', '', None, ''),
-                               columns_dict["access_token_expiry"])
 
-    schema_query = """
-        SELECT *
-        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-        WHERE `TABLE_SCHEMA` = '%s' AND
-              `TABLE_NAME` = 'access'
-    """ % (database_name, )
-    cursor.execute(schema_query)
-    access_schema = cursor.fetchall()
+####################################################################################################
+def get_index_columns(database_connection, table_name, index_name):
+    """ Gets the columns in an index.
 
-    tester.assertEqual(2, len(access_schema))
-    schema_dict = sequences_to_dictionary(access_schema, 2)
+    Args:
+        database_connection (object): The database connection.
+        table_name (str): The name of the table the index is on.
+        index_name (str): The name of the index.
 
-    expected_primary_schema = ('def', 'UNITTEST_DATABASE', 'PRIMARY', 'def', 'UNITTEST_DATABASE',
-                               'access', 'username', 1, None, None, None, None)
-    tester.assertSequenceEqual(expected_primary_schema, schema_dict["PRIMARY"])
+    Returns:
+        list(str): The names of the columns, in order.
+    """
+    cursor = database_connection.cursor()
+    if is_sqlite(database_connection):
+        cursor.execute("PRAGMA index_info(`%s`)" % index_name)
+        return [row[2] for row in sorted(cursor.fetchall())]
 
-    expected_username_schema = ('def', 'UNITTEST_DATABASE', 'access_ibfk_1', 'def',
-                                'UNITTEST_DATABASE', 'access', 'username', 1, 1,
-                                'UNITTEST_DATABASE', 'users', 'username')
-    tester.assertSequenceEqual(expected_username_schema, schema_dict["access_ibfk_1"])
+    cursor.execute("SHOW INDEX FROM `%s` WHERE Key_name = %%s" % table_name, (index_name, ))
+    return [row[4] for row in sorted(cursor.fetchall(), key=lambda row: row[3])]
 
 
 ####################################################################################################
-def check_scores_table(database_connection, database_name, tester, columns):
-    """ Checks the scores table.
+def check_users_table(database_connection, tester):
+    """ Checks the users table.
     
     Args:
         database_connection (object): The database connector.
-        database_name (str): The name of the database we are checking in.
         tester (unittest.TestCase): The unittest.TestCase object.
-        columns: Sequence of strings that are the column names. 
     """
-    cursor = database_connection.cursor()
-
-    cursor.execute("SHOW COLUMNS FROM scores")
-    columns_info = cursor.fetchall()
+    tester.assertEqual({
+        "username": ('varchar(%s)' % settings.MAX_USERNAME_LENGTH, False, None),
+        "password": ('varchar(%s)' % settings.PASSWORD_HASH_LENGTH, False, None),
+        "refresh_token": ('varchar(%s)' % settings.UUID_LENGTH, True, None),
+        "refresh_token_expiry": ('datetime', True, None),
+        "activated": ('boolean', False, '0'),
+        "theme": ('varchar(%s)' % settings.THEME_LENGTH, False, 'ocean')
+    }, get_columns(database_connection, "users"))
 
-    tester.assertEqual(1 + len(columns), len(columns_info))
+    tester.assertEqual(["username"], get_primary_key(database_connection, "users"))
+    tester.assertEqual([], get_foreign_keys(database_connection, "users"))
 
-    columns_dict = sequences_to_dictionary(columns_info, 0)
 
-    for column in columns:
-        tester.assertSequenceEqual((column, 'int(11)', 'NO', '', '-1', ''), columns_dict[column])
-
-    username_type = 'varchar(%s)' % settings.MAX_USERNAME_LENGTH
-    tester.assertSequenceEqual(('username', username_type, 'NO', 'PRI', None, ''),
-                                columns_dict["username"])
+####################################################################################################
+def check_access_table(database_connection, tester):
+    """ Checks the access table.
+    
+    Args:
+        database_connection (object): The database connector.
+        tester (unittest.TestCase): The unittest.TestCase object.
+    """
+    tester.assertEqual({
+        "username": ('varchar(%s)' % settings.MAX_USERNAME_LENGTH, False, None),
+        "access_token": ('varchar(%s)' % settings.UUID_LENGTH, False, None),
+        "access_token_expiry": ('datetime', False, None)
+    }, get_columns(database_connection, "access"))
 
-    schema_query = """
-        SELECT *
-        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-        WHERE `TABLE_SCHEMA` = '%s' AND
-              `TABLE_NAME` = 'scores'
-    """ % (database_name, )
-    cursor.execute(schema_query)
-    scores_schema = cursor.fetchall()
+    tester.assertEqual(["username"], get_primary_key(database_connection, "access"))
+    tester.assertEqual([("username", "users", "username")],
+                       get_foreign_keys(database_connection, "access"))
 
-    tester.assertEqual(2, len(scores_schema))
-    schema_dict = sequences_to_dictionary(scores_schema, 2)
 
-    expected_primary_schema = ('def', 'UNITTEST_DATABASE', 'PRIMARY', 'def', 'UNITTEST_DATABASE',
-                               'scores', 'username', 1, None, None, None, None)
-    tester.assertSequenceEqual(expected_primary_schema, schema_dict["PRIMARY"])
+####################################################################################################
+def check_scores_table(database_connection, tester):
+    """ Checks the scores table.
+    
+    Args:
+        database_connection (object): The database connector.
+        tester (unittest.TestCase): The unittest.TestCase object.
+    """
+    tester.assertEqual({
+        "username": ('varchar(%s)' % settings.MAX_USERNAME_LENGTH, False, None),
+        "entry_id": ('varchar(%s)' % settings.ENTRY_ID_LENGTH, False, None),
+        "score": ('int', False, None)
+    }, get_columns(database_connection, "scores"))
 
-    expected_foreign_schema = ('def', 'UNITTEST_DATABASE', 'scores_ibfk_1', 'def',
-                               'UNITTEST_DATABASE', 'scores', 'username', 1, 1,
-                               'UNITTEST_DATABASE', 'users', 'username')
-    tester.assertSequenceEqual(expected_foreign_schema, schema_dict["scores_ibfk_1"])
+    tester.assertEqual(["username", "entry_id"], get_primary_key(database_connection, "scores"))
+    tester.assertEqual([("username", "users", "username")],
+                       get_foreign_keys(database_connection, "scores"))
+    tester.assertEqual(["entry_id", "score"],
+                       get_index_columns(database_connection, "scores", "scores_entry_id_score"))
 
 
 ####################################################################################################
@@ -214,15 +235,57 @@ def check_is_uuid(tester, string):
 
 
 ####################################################################################################
-def create_tables(database_connector, scores_columns):
+def patch_password_salting():
+    """ Patches the settings used to salt and hash passwords, so that passwords are hashed quickly.
+
+    Returns:
+        The patch, which can be used as a context manager or started and stopped.
+    """
+    return patch('database.passwords.settings', PASSWORD_SALTING_ROUNDS=3,
+                 PASSWORD_SALTING_SIZE=5)
+
+
+####################################################################################################
+def create_sqlite_connector(access_token_cache=None, load_results_aggregate=False, usernames=()):
+    """ Creates a DatabaseConnector using a SQLite database in memory, called UNITTEST_DATABASE,
+    with every table created. The database must be dropped and the pool closed after the test.
+
+    Args:
+        access_token_cache (access_cache.AccessTokenCache): The connector's access token cache. If
+        None access tokens are not cached.
+        load_results_aggregate (bool): Whether to load the results aggregate, before the users are
+        registered.
+        usernames: Sequence of the users to register, each with the password "password".
+
+    Returns:
+        tuple: The connector.DatabaseConnector, the pool.ConnectionPool it uses and the
+        sqlite.SQLiteBackend.
+    """
+    backend = sqlite.SQLiteBackend()
+    connection_pool = pool.ConnectionPool(backend.connect, minimum_size=1, maximum_size=1)
+    database_connector = connector.DatabaseConnector(
+        connection_pool, access_token_cache=access_token_cache, backend=backend)
+    database_connector.create_database("UNITTEST_DATABASE")
+    database_connector.use_database("UNITTEST_DATABASE")
+    create_tables(database_connector)
+    if load_results_aggregate:
+        database_connector.load_results_aggregate()
+
+    with patch_password_salting():
+        for username in usernames:
+            database_connector.register_user(username, "password")
+    return database_connector, connection_pool, backend
+
+
+####################################################################################################
+def create_tables(database_connector):
     """ Creates all the required tables.
 
     Args:
         database_connector (DatabaseConnector): Connector used to create the tables.
-        scores_columns (list(str)): List of columns to put into the scores table.
     """
     database_connector.create_users_table()
-    database_connector.create_scores_table(scores_columns)
+    database_connector.create_scores_table()
     database_connector.create_access_table()
 
 
@@ -0,0 +1,76 @@
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import database.versions as versions
+
+""" This module contains the unit tests for the UserVersions class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class UserVersionsTests(unittest.TestCase):
+    """ Unit tests for the UserVersions class. """
+    ################################################################################################
+    def test_bump(self):
+        """ Test bumping increments the versions of the user's resources only. """
+        subject = versions.UserVersions()
+        self.assertEqual(0, subject.get("dave", versions.ENTRIES))
+
+        subject.bump("dave", versions.ENTRIES)
+        subject.bump("dave", versions.ENTRIES, versions.SETTINGS)
+
+        self.assertEqual(2, subject.get("dave", versions.ENTRIES))
+        self.assertEqual(1, subject.get("dave", versions.SETTINGS))
+        self.assertEqual(0, subject.get("fred", versions.ENTRIES))
+
+    ################################################################################################
+    def test_get_etag(self):
+        """ Test the ETag changes with the version, user, resource and server. """
+        subject = versions.UserVersions()
+        etag = subject.get_etag("dave", versions.ENTRIES)
+
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.assertEqual(etag, subject.get_etag("dave", versions.ENTRIES))
+        self.assertNotEqual(etag, subject.get_etag("fred", versions.ENTRIES))
+        self.assertNotEqual(etag, subject.get_etag("dave", versions.SETTINGS))
+        self.assertNotEqual(etag, versions.UserVersions().get_etag("dave", versions.ENTRIES))
+
+        subject.bump("dave", versions.ENTRIES)
+        self.assertNotEqual(etag, subject.get_etag("dave", versions.ENTRIES))
+
+    ################################################################################################
+    def test_processes_share_the_boot_id(self):
+        """ Test the ETags of counters sharing a boot ID match, as they do in each process. """
+        boot_id = versions.generate_boot_id()
+        subject = versions.UserVersions(boot_id)
+        other_process = versions.UserVersions(boot_id)
+        self.assertEqual(subject.get_etag("dave", versions.ENTRIES),
+                         other_process.get_etag("dave", versions.ENTRIES))
+
+        subject.bump("dave", versions.ENTRIES)
+        other_process.bump("dave", versions.ENTRIES)
+        self.assertEqual(subject.get_etag("dave", versions.ENTRIES),
+                         other_process.get_etag("dave", versions.ENTRIES))
+
+        # After a reset bumps may have been missed, so the ETags no longer match.
+        subject.reset()
+        self.assertNotEqual(subject.get_etag("dave", versions.ENTRIES),
+                            other_process.get_etag("dave", versions.ENTRIES))
+
+    ################################################################################################
+    def test_reset(self):
+        """ Test no ETag matches after a reset. """
+        subject = versions.UserVersions()
+        etag = subject.get_etag("dave", versions.ENTRIES)
+
+        subject.reset()
+        self.assertNotEqual(etag, subject.get_etag("dave", versions.ENTRIES))
+        self.assertEqual(0, subject.get("dave", versions.ENTRIES))
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
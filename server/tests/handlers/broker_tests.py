@@ -0,0 +1,119 @@
+import os
+import shutil
+import sys
+import tempfile
+import tornado.gen
+import tornado.testing
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+from handlers import broker
+
+""" This module contains the unit tests for the Broker class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class BrokerTests(tornado.testing.AsyncTestCase):
+    """ Unit tests for the Broker class, with every process's broker on the same IOLoop. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        super(BrokerTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "broker.sock")
+        self.events = {}
+        self.resynchronised = {}
+        self.brokers = []
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        for process_broker in self.brokers:
+            process_broker.stop()
+        super(BrokerTests, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    ################################################################################################
+    def start_broker(self, name, is_hub):
+        """ Starts a broker that records the events it receives.
+
+        Args:
+            name (str): The name of the process.
+            is_hub (bool): Whether the process is the hub.
+
+        Returns:
+            broker.Broker: The broker.
+        """
+        process_broker = broker.Broker(self.path, is_hub, reconnect_seconds=0.01)
+        self.events[name] = []
+        self.resynchronised[name] = 0
+        process_broker.subscribe("event", lambda *args: self.events[name].append(list(args)))
+
+        def resynchronise():
+            self.resynchronised[name] += 1
+        process_broker.add_resynchronise_callback(resynchronise)
+
+        process_broker.start()
+        self.brokers.append(process_broker)
+        return process_broker
+
+    ################################################################################################
+    async def wait_for(self, condition):
+        """ Waits until a condition is true.
+
+        Args:
+            condition (function): Returns whether the condition is true.
+        """
+        for _ in range(500):
+            if condition():
+                return
+            await tornado.gen.sleep(0.01)
+        self.fail("Timed out.")
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_events_are_sent_to_every_other_process(self):
+        """ Test events reach every process apart from the one that published them. """
+        hub = self.start_broker("hub", True)
+        first = self.start_broker("first", False)
+        second = self.start_broker("second", False)
+        await self.wait_for(lambda: self.resynchronised["first"] and self.resynchronised["second"])
+
+        first.publish("event", "from first", None)
+        hub.publish("event", "from hub", 1)
+        second.publish("unknown", "ignored")
+        second.publish("event", "from second", [2])
+
+        await self.wait_for(lambda: len(self.events["hub"]) == 2 and
+                            len(self.events["first"]) == 2 and len(self.events["second"]) == 2)
+        # Events from different processes can arrive in any order.
+        self.assertCountEqual([["from first", None], ["from second", [2]]], self.events["hub"])
+        self.assertCountEqual([["from hub", 1], ["from second", [2]]], self.events["first"])
+        self.assertCountEqual([["from first", None], ["from hub", 1]], self.events["second"])
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_hub_restarting(self):
+        """ Test processes resynchronise when the hub restarts, and events published while they
+        are not connected are sent once they are. """
+        hub = self.start_broker("hub", True)
+        worker = self.start_broker("worker", False)
+        await self.wait_for(lambda: self.resynchronised["worker"] == 1)
+
+        hub.stop()
+        self.brokers.remove(hub)
+        await tornado.gen.sleep(0.05)
+        worker.publish("event", "while the hub is stopped")
+
+        self.start_broker("hub", True)
+        await self.wait_for(lambda: self.resynchronised["worker"] == 2)
+        await self.wait_for(lambda: len(self.events["hub"]) == 1)
+        self.assertEqual([["while the hub is stopped"]], self.events["hub"])
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import datetime
+import json
+from mock import patch
+import sys
+import tornado.gen
+import tornado.testing
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import configuration.settings as settings
+from handlers import coalescer
+
+""" This module contains the unit tests for the ScoreCoalescer class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class FakeDatabaseConnector(object):
+    """ Records the scores written instead of writing them to a database. """
+    ################################################################################################
+    def __init__(self):
+        """ Constructor. """
+        self.writes = []
+        self.error = None
+        # Writes including this entry fail, as if it had been deleted.
+        self.deleted_entry_id = None
+
+    ################################################################################################
+    async def update_scores(self, access_token, scores):
+        """ Records the scores, or raises a copy of the error if one has been set. """
+        await tornado.gen.sleep(0.01)
+        if self.error is not None:
+            raise type(self.error)(*self.error.args)
+        if self.deleted_entry_id in [entry_id for entry_id, _ in scores]:
+            raise ValueError("Entry " + self.deleted_entry_id + " does not exist.")
+        self.writes.append((access_token, scores))
+
+    ################################################################################################
+    def is_results_aggregate_loaded(self):
+        """ The results are counted from the database. """
+        return False
+
+    ################################################################################################
+    async def generate_results_dictionary(self, entry_ids):
+        """ Gets empty results for the entries. """
+        return {entry_id: {} for entry_id in entry_ids}
+
+    ################################################################################################
+    async def get_leaderboard(self, order):
+        """ Gets an empty leaderboard. """
+        return []
+
+
+####################################################################################################
+class ScoreCoalescerTests(tornado.testing.AsyncTestCase):
+    """ Unit tests for the ScoreCoalescer class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        super(ScoreCoalescerTests, self).setUp()
+        self.database_connector = FakeDatabaseConnector()
+        self.subject = coalescer.ScoreCoalescer(self.database_connector, 0.05)
+        self.first_id, self.second_id = settings.country_codes[:2]
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_updates_within_the_window_are_written_once(self):
+        """ Test only the latest score for each entry is written and broadcast, and every update is
+        answered with the score that was written. """
+        with patch('handlers.coalescer.update.last_leaderboard_message', None), \
+                patch('handlers.coalescer.update.broadcast_message') as mock_broadcast_message:
+            scores = yield [
+                self.subject.update_score("token", "dave", self.first_id, 3),
+                self.subject.update_score("token", "dave", self.first_id, 4),
+                self.subject.update_score("token", "dave", self.second_id, 1),
+                self.subject.update_score("token", "dave", self.first_id, 5)
+            ]
+
+            self.assertEqual([5, 5, 1, 5], scores)
+            self.assertEqual([("token", [(self.second_id, 1), (self.first_id, 5)])],
+                             self.database_connector.writes)
+            self.assertEqual(["results", "leaderboard", "scoreUpdates"],
+                             [json.loads(call[0][0])["type"]
+                              for call in mock_broadcast_message.call_args_list])
+        self.assertEqual({"updates": 4, "writes": 1, "failed_writes": 0, "pending_users": 0},
+                         self.subject.get_statistics())
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_users_are_written_separately_and_in_order(self):
+        """ Test each user's updates are written separately, and a user's later window is written
+        after their earlier one. """
+        with patch('handlers.coalescer.update.broadcast_message'):
+            first = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 3))
+            other_user = tornado.gen.convert_yielded(
+                self.subject.update_score("other", "fred", self.first_id, 7))
+            yield tornado.gen.sleep(0.055)
+            second = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 4))
+            scores = yield [first, other_user, second]
+
+        self.assertEqual([3, 7, 4], scores)
+        self.assertEqual([("token", [(self.first_id, 3)]), ("other", [(self.first_id, 7)]),
+                          ("token", [(self.first_id, 4)])], self.database_connector.writes)
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_several_scores_join_the_window(self):
+        """ Test several scores are written in the same write as the window they join, after the
+        earlier updates in it. """
+        with patch('handlers.coalescer.update.broadcast_message'):
+            single = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 3))
+            several = tornado.gen.convert_yielded(
+                self.subject.update_scores("token", "dave", [(self.first_id, 9),
+                                                             (self.second_id, 2)]))
+            scores = yield [single, several]
+
+        self.assertEqual([9, {self.first_id: 9, self.second_id: 2}], scores)
+        self.assertEqual([("token", [(self.first_id, 9), (self.second_id, 2)])],
+                         self.database_connector.writes)
+
+        # Invalid scores are rejected without joining a window, and an empty update is not written.
+        with self.assertRaises(ValueError):
+            yield self.subject.update_scores("token", "dave", [(self.first_id, 3),
+                                                               ("not_an_entry", 3)])
+        self.assertEqual({}, (yield self.subject.update_scores("token", "dave", [])))
+        self.assertEqual(0, self.subject.get_statistics()["pending_users"])
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_write_errors_are_raised_for_every_update(self):
+        """ Test every update in a window fails if the write fails, and nothing is broadcast. """
+        self.database_connector.error = ValueError("Invalid")
+        with patch('handlers.coalescer.update.broadcast_message') as mock_broadcast_message:
+            first = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 3))
+            second = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.second_id, 4))
+            for update in [first, second]:
+                with self.assertRaises(ValueError):
+                    yield update
+            mock_broadcast_message.assert_not_called()
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_updates_only_fail_because_of_their_own_scores(self):
+        """ Test an update that cannot be written does not fail the other updates in its window, or
+        another user's updates. """
+        third_id = settings.country_codes[2]
+        self.database_connector.deleted_entry_id = self.second_id
+        with patch('handlers.coalescer.update.broadcast_message') as mock_broadcast_message:
+            first = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 3))
+            deleted = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.second_id, 4))
+            other_user = tornado.gen.convert_yielded(
+                self.subject.update_score("other", "fred", third_id, 7))
+
+            self.assertEqual(3, (yield first))
+            with self.assertRaises(ValueError):
+                yield deleted
+            self.assertEqual(7, (yield other_user))
+            self.assertCountEqual([("token", [(self.first_id, 3)]), ("other", [(third_id, 7)])],
+                                  self.database_connector.writes)
+            self.assertEqual(2, [json.loads(call[0][0])["type"]
+                                 for call in mock_broadcast_message.call_args_list]
+                             .count("scoreUpdate"))
+
+        statistics = self.subject.get_statistics()
+        self.assertEqual(2, statistics["writes"])
+        self.assertEqual(2, statistics["failed_writes"])
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_several_scores_close_the_window(self):
+        """ Test several scores are written straight away rather than waiting for the window to
+        close. """
+        self.subject = coalescer.ScoreCoalescer(self.database_connector, 10)
+        with patch('handlers.coalescer.update.broadcast_message'):
+            single = tornado.gen.convert_yielded(
+                self.subject.update_score("token", "dave", self.first_id, 3))
+            several = self.subject.update_scores("token", "dave", [(self.second_id, 2)])
+            scores = yield tornado.gen.with_timeout(
+                datetime.timedelta(seconds=1), tornado.gen.multi([single, several]))
+
+        self.assertEqual([3, {self.second_id: 2}], scores)
+        self.assertEqual([("token", [(self.first_id, 3), (self.second_id, 2)])],
+                         self.database_connector.writes)
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_invalid_scores_are_rejected_straight_away(self):
+        """ Test an invalid score or entry is rejected without joining the window. """
+        with self.assertRaises(ValueError):
+            yield self.subject.update_score("token", "dave", self.first_id,
+                                            settings.MAXIMUM_SCORE + 1)
+        with self.assertRaises(ValueError):
+            yield self.subject.update_score("token", "dave", "not_an_entry", 3)
+        self.assertEqual(0, self.subject.get_statistics()["pending_users"])
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import configuration.settings as settings
+import handlers.codec as codec
+
+""" This module contains the unit tests for the codec module. """
+__author__ = "Thomas Reeve"
+
+# Documents like those the server sends, with scores as keys and text that is not ASCII.
+DOCUMENTS = [
+    {"type": "results", "results": {"1": {-1: 3, 0: 1, 10: 2}}},
+    {"data": settings.entries},
+    {"data": [{"id": "1", "attributes": {"country": "España", "link": "https://a/b"}}]},
+    "Access token is invalid.",
+    ["invalidate_user", ["dave", None, True, 1.5]]
+]
+
+
+####################################################################################################
+class CodecTests(unittest.TestCase):
+    """ Unit tests for the codec module, run with every installed library. """
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        codec.use_codec(settings.JSON_CODEC)
+
+    ################################################################################################
+    def test_every_codec_encodes_the_same(self):
+        """ Test every library encodes documents to the same bytes as the json module. """
+        codec.use_codec("json")
+        expected = [codec.dumps(document) for document in DOCUMENTS]
+        self.assertIsInstance(expected[0], bytes)
+        self.assertEqual(b'{"type":"results","results":{"1":{"-1":3,"0":1,"10":2}}}', expected[0])
+
+        for codec_name in codec.CODECS:
+            codec.use_codec(codec_name)
+            self.assertEqual(codec_name, codec.name)
+            self.assertEqual(expected, [codec.dumps(document) for document in DOCUMENTS])
+
+    ################################################################################################
+    def test_loads(self):
+        """ Test every library decodes bytes and strings, and rejects invalid JSON. """
+        for codec_name in codec.CODECS:
+            codec.use_codec(codec_name)
+            self.assertEqual({"score": 5}, codec.loads(b'{"score": 5}'))
+            self.assertEqual(["España"], codec.loads('["España"]'))
+            with self.assertRaises(ValueError):
+                codec.loads(b'{"score": ')
+
+    ################################################################################################
+    def test_use_codec(self):
+        """ Test the fastest library is used by default, and missing libraries are rejected. """
+        codec.use_codec()
+        self.assertEqual(next(name for name in codec.PREFERENCE if name in codec.CODECS),
+                         codec.name)
+
+        with self.assertRaises(ValueError):
+            codec.use_codec("not_a_codec")
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
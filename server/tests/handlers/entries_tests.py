@@ -0,0 +1,275 @@
+import concurrent.futures
+import json
+from mock import patch
+import sys
+import tornado.gen
+import tornado.testing
+import tornado.web
+import unittest
+
+sys.path.append('../..')
+
+# Test imports.
+from tests.database import utilities
+
+# Source imports.
+import configuration.settings as settings
+import database.access_cache as access_cache
+import database.async_connector as async_connector
+from handlers import coalescer, entries, leaderboard, payloads, user_settings
+
+""" This module contains the unit tests for the entries and settings handlers. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class EntriesHandlerTests(tornado.testing.AsyncHTTPTestCase):
+    """ Unit tests for the entries and settings handlers, using a database in memory. """
+    ################################################################################################
+    def get_app(self):
+        """ Creates the application to test.
+
+        Returns:
+            tornado.web.Application: The application.
+        """
+        self.database_connector, self.connection_pool, _ = utilities.create_sqlite_connector(
+            access_cache.AccessTokenCache(), load_results_aggregate=True, usernames=["dave"])
+        self.access_token = self.database_connector.get_access_information("dave")["access_token"]
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        application = tornado.web.Application([
+            (r'/api/settings', user_settings.UserSettingsHandler),
+            (r'/api/entries', entries.EntriesHandler),
+            (r'/api/entries/(.*)', entries.EntryHandler),
+            (r'/api/leaderboard', leaderboard.LeaderboardHandler)
+        ])
+        application.database_connector = async_connector.AsyncDatabaseConnector(
+            self.database_connector, self.executor)
+        application.entries_payload = payloads.EntriesPayload(
+            settings.entries, maximum_score=settings.MAXIMUM_SCORE)
+        application.score_coalescer = coalescer.ScoreCoalescer(application.database_connector,
+                                                               0.01)
+        return application
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        super(EntriesHandlerTests, self).tearDown()
+        self.executor.shutdown()
+        self.database_connector.drop_database("UNITTEST_DATABASE")
+        self.connection_pool.close()
+
+    ################################################################################################
+    def get(self, path, etag=None):
+        """ Sends a GET request.
+
+        Args:
+            path (str): The path.
+            etag (str): The ETag to send in the If-None-Match header.
+
+        Returns:
+            tornado.httpclient.HTTPResponse: The response.
+        """
+        headers = {"Authorization": "Bearer " + self.access_token}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        return self.fetch(path, headers=headers)
+
+    ################################################################################################
+    def test_entries_are_not_sent_again_until_a_score_changes(self):
+        """ Test the entries are only sent if the client's copy is out of date. """
+        entry_id = settings.country_codes[0]
+
+        response = self.get("/api/entries")
+        self.assertEqual(200, response.code)
+        etag = response.headers["Etag"]
+
+        with patch.object(self.database_connector, 'get_user_scores') as mock_get_user_scores:
+            response = self.get("/api/entries", etag)
+            self.assertEqual(304, response.code)
+            self.assertEqual(b"", response.body)
+            mock_get_user_scores.assert_not_called()
+
+        self.assertEqual(304, self.get("/api/entries/" + entry_id, etag).code)
+
+        response = self.fetch("/api/entries/" + entry_id, method="PATCH",
+                              headers={"Authorization": "Bearer " + self.access_token},
+                              body=json.dumps({"update": "score", "score": 8}))
+        self.assertEqual(200, response.code)
+        self.assertEqual({"id": entry_id, "score": 8}, json.loads(response.body.decode()))
+
+        response = self.get("/api/entries", etag)
+        self.assertEqual(200, response.code)
+        self.assertNotEqual(etag, response.headers["Etag"])
+        self.assertEqual(8, json.loads(response.body.decode())["data"][0]["attributes"]["score"])
+
+    ################################################################################################
+    def patch_scores(self, scores):
+        """ Sends a request to update several scores.
+
+        Args:
+            scores (list): The {"id": ..., "score": ...} of each update.
+
+        Returns:
+            tornado.httpclient.HTTPResponse: The response.
+        """
+        return self.fetch("/api/entries", method="PATCH",
+                          headers={"Authorization": "Bearer " + self.access_token},
+                          body=json.dumps({"update": "score", "scores": scores}))
+
+    ################################################################################################
+    def test_updating_several_scores(self):
+        """ Test several scores are updated with one request and one results broadcast. """
+        first_id, second_id = settings.country_codes[:2]
+        # Registering the user has changed the results as well.
+        self.assertEqual(1, self.database_connector.take_results_changes()[0])
+
+        with patch('handlers.update.last_leaderboard_message', None), \
+                patch('handlers.update.broadcast_message') as mock_broadcast_message:
+            response = self.patch_scores([{"id": first_id, "score": 3},
+                                          {"id": second_id, "score": 7}])
+            self.assertEqual(200, response.code)
+
+            self.assertEqual(3, mock_broadcast_message.call_count)
+            results_message = json.loads(mock_broadcast_message.call_args_list[0][0][0])
+            self.assertEqual("resultsDelta", results_message["type"])
+            self.assertEqual(2, results_message["sequence"])
+            self.assertCountEqual([[first_id, -1, -1], [first_id, 3, 1], [second_id, -1, -1],
+                                   [second_id, 7, 1]], results_message["changes"])
+            leaderboard_message = json.loads(mock_broadcast_message.call_args_list[1][0][0])
+            self.assertEqual("leaderboard", leaderboard_message["type"])
+            self.assertEqual(second_id, leaderboard_message["leaderboard"]["total"][0])
+            score_updates_message = json.loads(mock_broadcast_message.call_args_list[2][0][0])
+            self.assertEqual("scoreUpdates", score_updates_message["type"])
+
+        self.assertEqual({first_id: 3, second_id: 7},
+                         self.database_connector.get_user_scores(self.access_token))
+
+    ################################################################################################
+    def test_updating_several_scores_when_one_is_invalid(self):
+        """ Test no scores are updated if any of them are invalid. """
+        first_id, second_id = settings.country_codes[:2]
+
+        response = self.patch_scores([{"id": first_id, "score": 3},
+                                      {"id": second_id, "score": settings.MAXIMUM_SCORE + 1}])
+        self.assertEqual(400, response.code)
+
+        response = self.patch_scores([{"id": first_id, "score": 3},
+                                      {"id": "not_an_entry", "score": 3}])
+        self.assertEqual(400, response.code)
+        self.assertEqual("Entry not_an_entry does not exist.", json.loads(response.body.decode()))
+
+        response = self.patch_scores([{"id": first_id, "score": "3"}])
+        self.assertEqual(400, response.code)
+
+        self.assertEqual({}, self.database_connector.get_user_scores(self.access_token))
+
+    ################################################################################################
+    def test_updating_several_scores_with_a_malformed_body(self):
+        """ Test a malformed body is rejected with a message. """
+        headers = {"Authorization": "Bearer " + self.access_token}
+        for body in ['{"update": "score"}', '{"update": "score", "scores": "3"}',
+                     '{"update": "score", "scores": [3]}', '{"update": "score", "scores": [{}]}',
+                     '[]', '{"scores": []}', 'not json']:
+            response = self.fetch("/api/entries", method="PATCH", headers=headers, body=body)
+            self.assertEqual(400, response.code, body)
+            self.assertIsInstance(json.loads(response.body.decode()), str)
+
+        self.assertEqual({}, self.database_connector.get_user_scores(self.access_token))
+
+    ################################################################################################
+    def test_updating_no_scores(self):
+        """ Test an empty list of scores is accepted without writing or broadcasting anything. """
+        etag = self.get("/api/entries").headers["Etag"]
+
+        with patch('handlers.update.broadcast_message') as mock_broadcast_message, \
+                patch.object(self._app.score_coalescer, 'update_scores') as mock_update_scores:
+            self.assertEqual(200, self.patch_scores([]).code)
+            mock_update_scores.assert_not_called()
+            mock_broadcast_message.assert_not_called()
+
+        self.assertEqual(304, self.get("/api/entries", etag).code)
+
+    ################################################################################################
+    def test_updating_several_scores_after_a_single_score(self):
+        """ Test several scores sent while a single score is waiting to be written are written after
+        it. """
+        entry_id = settings.country_codes[0]
+        self._app.score_coalescer = coalescer.ScoreCoalescer(self._app.database_connector, 0.2)
+        headers = {"Authorization": "Bearer " + self.access_token}
+
+        single = self.http_client.fetch(self.get_url("/api/entries/" + entry_id), method="PATCH",
+                                        headers=headers,
+                                        body=json.dumps({"update": "score", "score": 3}))
+        several = self.http_client.fetch(self.get_url("/api/entries"), method="PATCH",
+                                         headers=headers,
+                                         body=json.dumps({"update": "score",
+                                                          "scores": [{"id": entry_id,
+                                                                      "score": 9}]}))
+        responses = self.io_loop.run_sync(lambda: tornado.gen.multi([single, several]))
+
+        self.assertEqual([200, 200], [response.code for response in responses])
+        self.assertEqual({"id": entry_id, "score": 9}, json.loads(responses[0].body.decode()))
+        self.assertEqual({entry_id: 9}, self.database_connector.get_user_scores(self.access_token))
+
+    ################################################################################################
+    def test_updating_a_score_with_an_invalid_score(self):
+        """ Test a score that is not an integer or out of range is rejected. """
+        entry_id = settings.country_codes[0]
+        for score in ["3", settings.MAXIMUM_SCORE + 1]:
+            response = self.fetch("/api/entries/" + entry_id, method="PATCH",
+                                  headers={"Authorization": "Bearer " + self.access_token},
+                                  body=json.dumps({"update": "score", "score": score}))
+            self.assertEqual(400, response.code)
+
+        self.assertEqual({}, self.database_connector.get_user_scores(self.access_token))
+
+    ################################################################################################
+    def test_leaderboard(self):
+        """ Test the leaderboard ranks the entries, and can be paged. """
+        first_id, second_id = settings.country_codes[:2]
+        self.assertEqual(200, self.patch_scores([{"id": first_id, "score": 3},
+                                                 {"id": second_id, "score": 7}]).code)
+
+        response = self.get("/api/leaderboard")
+        self.assertEqual(200, response.code)
+        document = json.loads(response.body.decode())
+        self.assertEqual("total", document["order"])
+        self.assertEqual(len(settings.country_codes), len(document["leaderboard"]))
+        self.assertEqual({"id": second_id, "rank": 1, "total": 7, "votes": 1, "average": 7.0},
+                         document["leaderboard"][0])
+
+        response = self.get("/api/leaderboard?order=average&start=1&count=1")
+        self.assertEqual(200, response.code)
+        self.assertEqual([(first_id, 2)], [(row["id"], row["rank"]) for row in
+                                           json.loads(response.body.decode())["leaderboard"]])
+
+        for query in ["order=median", "start=-1", "count=ten"]:
+            self.assertEqual(400, self.get("/api/leaderboard?" + query).code)
+
+        self.access_token = "not_a_token"
+        self.assertEqual(401, self.get("/api/leaderboard").code)
+
+    ################################################################################################
+    def test_settings_are_not_sent_again(self):
+        """ Test the settings are only sent if the client's copy is out of date. """
+        response = self.get("/api/settings")
+        self.assertEqual(200, response.code)
+
+        response = self.get("/api/settings", response.headers["Etag"])
+        self.assertEqual(304, response.code)
+
+    ################################################################################################
+    def test_invalid_access_token(self):
+        """ Test an invalid access token is rejected before the ETag is checked. """
+        etag = self.get("/api/entries").headers["Etag"]
+        self.access_token = "not_a_token"
+
+        response = self.get("/api/entries", etag)
+        self.assertEqual(401, response.code)
+        self.assertNotIn("Etag", response.headers)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import tornado.testing
+import tornado.web
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+from handlers import index
+
+""" This module contains the unit tests for the index handler. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class IndexHandlerTests(tornado.testing.AsyncHTTPTestCase):
+    """ Unit tests for the IndexHandler class. """
+    ################################################################################################
+    def get_app(self):
+        """ Creates the application to test, serving an index page in a temporary directory.
+
+        Returns:
+            tornado.web.Application: The application.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "index.html")
+        self.write_page(b"<html>" + b"<p>Vision</p>" * 100 + b"</html>")
+        return tornado.web.Application([(r'/.*', index.IndexHandler, {"path": self.path})])
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        super(IndexHandlerTests, self).tearDown()
+        index.IndexHandler.pages.clear()
+        shutil.rmtree(self.directory)
+
+    ################################################################################################
+    def write_page(self, body):
+        """ Writes the index page.
+
+        Args:
+            body (bytes): The page.
+        """
+        with open(self.path, "wb") as file:
+            file.write(body)
+        self.body = body
+
+    ################################################################################################
+    def test_index_page(self):
+        """ Test the page is sent for any path, compressed if the client accepts it. """
+        response = self.fetch("/entries/1", headers={"Accept-Encoding": "identity"},
+                              decompress_response=False)
+        self.assertEqual(200, response.code)
+        self.assertEqual(self.body, response.body)
+        self.assertEqual("no-cache", response.headers["Cache-Control"])
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        response = self.fetch("/", headers={"Accept-Encoding": "gzip, br"},
+                              decompress_response=False)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertLess(len(response.body), len(self.body))
+        self.assertEqual(self.body, gzip.decompress(response.body))
+
+    ################################################################################################
+    def test_not_modified(self):
+        """ Test the page is not sent again until it is modified. """
+        etag = self.fetch("/").headers["Etag"]
+
+        response = self.fetch("/", headers={"If-None-Match": etag})
+        self.assertEqual(304, response.code)
+
+        self.write_page(b"<html>New build</html>")
+        os.utime(self.path, (0, 0))
+        response = self.fetch("/", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.code)
+        self.assertEqual(self.body, response.body)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import concurrent.futures
+from mock import patch
+import sys
+import tornado.testing
+import tornado.web
+import unittest
+
+sys.path.append('../..')
+
+# Test imports.
+from tests.database import utilities
+
+# Source imports.
+import configuration.settings as settings
+import database.access_cache as access_cache
+import database.async_connector as async_connector
+from handlers import entries, metrics, payloads
+
+""" This module contains the unit tests for the metrics module. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class MetricsHandlerTests(tornado.testing.AsyncHTTPTestCase):
+    """ Unit tests for the MetricsHandler and RequestMetrics classes, using a database in
+    memory. """
+    ################################################################################################
+    def get_app(self):
+        """ Creates the application to test.
+
+        Returns:
+            tornado.web.Application: The application.
+        """
+        self.database_connector, self.connection_pool, _ = utilities.create_sqlite_connector(
+            access_cache.AccessTokenCache())
+
+        self.request_metrics = metrics.RequestMetrics()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        application = tornado.web.Application([
+            (r'/api/entries', entries.EntriesHandler),
+            (r'/api/entries/(.*)', entries.EntryHandler),
+            (r'/api/metrics', metrics.MetricsHandler,
+             {"request_metrics": self.request_metrics, "process": 3})
+        ], log_function=self.request_metrics.log_request)
+        application.database_connector = async_connector.AsyncDatabaseConnector(
+            self.database_connector, self.executor)
+        application.entries_payload = payloads.EntriesPayload(
+            settings.entries, maximum_score=settings.MAXIMUM_SCORE)
+        return application
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        super(MetricsHandlerTests, self).tearDown()
+        self.executor.shutdown()
+        self.database_connector.drop_database("UNITTEST_DATABASE")
+        self.connection_pool.close()
+
+    ################################################################################################
+    def get_metrics(self):
+        """ Gets the metrics.
+
+        Returns:
+            dict: The name and labels of each sample to its value.
+        """
+        response = self.fetch("/api/metrics")
+        self.assertEqual(200, response.code)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+
+        samples = {}
+        for line in response.body.decode().splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return samples
+
+    ################################################################################################
+    def test_requests_are_counted_by_route(self):
+        """ Test requests to different entries are counted together, by method and status. """
+        headers = {"Authorization": "Bearer not_a_token"}
+        self.fetch("/api/entries/" + settings.country_codes[0], headers=headers)
+        self.fetch("/api/entries/" + settings.country_codes[1], headers=headers)
+        self.fetch("/api/entries", headers=headers)
+        self.fetch("/missing")
+
+        samples = self.get_metrics()
+
+        self.assertEqual(2, samples['vision_requests_total{process="3",route="/api/entries/(.*)",'
+                                    'method="GET",status="401"}'])
+        self.assertEqual(1, samples['vision_requests_total{process="3",route="/api/entries",'
+                                    'method="GET",status="401"}'])
+        self.assertEqual(1, samples['vision_requests_total{process="3",route="other",'
+                                    'method="GET",status="404"}'])
+        self.assertEqual(2, samples['vision_request_duration_seconds_count{process="3",'
+                                    'route="/api/entries/(.*)",method="GET"}'])
+        self.assertEqual(2, samples['vision_request_duration_seconds_bucket{process="3",'
+                                    'route="/api/entries/(.*)",method="GET",le="+Inf"}'])
+        for quantile in ["0.5", "0.95", "0.99"]:
+            self.assertIn('vision_request_duration_seconds_quantile{process="3",'
+                          'route="/api/entries/(.*)",method="GET",quantile="' + quantile + '"}',
+                          samples)
+
+    ################################################################################################
+    def test_database_metrics(self):
+        """ Test the database statements and commits are counted, and component statistics are
+        included. """
+        samples = self.get_metrics()
+
+        self.assertEqual(samples['vision_database_commits_total{process="3"}'],
+                         samples['vision_database_query_duration_seconds_count{process="3"}'])
+        self.assertGreater(samples['vision_database_commits_total{process="3"}'], 0)
+        self.assertEqual(1, samples['vision_database_pool_maximum_size{process="3"}'])
+        self.assertIn('vision_access_token_cache_hits{process="3"}', samples)
+        self.assertIn('vision_static_memory_cache_size{process="3"}', samples)
+        self.assertEqual(0, samples['vision_websocket_clients{process="3"}'])
+        self.assertEqual(0, samples['vision_websocket_dropped_messages{process="3"}'])
+
+    ################################################################################################
+    def test_other_addresses_are_refused(self):
+        """ Test the metrics are only served to the allowed addresses. """
+        with patch('handlers.metrics.settings.METRICS_ALLOWED_ADDRESSES', ["192.0.2.1"]):
+            response = self.fetch("/api/metrics")
+        self.assertEqual(403, response.code)
+        self.assertNotIn(b"vision_", response.body)
+
+        with patch('handlers.metrics.settings.METRICS_ALLOWED_ADDRESSES', []):
+            self.assertEqual(403, self.fetch("/api/metrics").code)
+
+
+####################################################################################################
+class FormatTests(unittest.TestCase):
+    """ Unit tests for formatting samples. """
+    ################################################################################################
+    def test_format_labels(self):
+        """ Test label values are escaped. """
+        self.assertEqual('{route="a\\"b\\\\c\\n",status="200"}',
+                         metrics.format_labels([("route", 'a"b\\c\n'), ("status", 200)]))
+
+    ################################################################################################
+    def test_format_value(self):
+        """ Test values are formatted as the Prometheus text format expects. """
+        self.assertEqual("3", metrics.format_value(3))
+        self.assertEqual("0.25", metrics.format_value(0.25))
+        self.assertEqual("NaN", metrics.format_value(None))
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
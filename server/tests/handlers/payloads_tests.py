@@ -0,0 +1,79 @@
+import copy
+import sys
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+import configuration.settings as settings
+import handlers.codec as codec
+import handlers.payloads as payloads
+
+""" This module contains the unit tests for the EntriesPayload class. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+def expected_entries(user_scores):
+    """ Gets the entries with the user's scores, built the way the handlers used to build them.
+
+    Args:
+        user_scores (dict): Dictionary of entry ID to score.
+
+    Returns:
+        list: The entries.
+    """
+    entries = copy.deepcopy(settings.entries)
+    for entry in entries:
+        entry["attributes"]["score"] = user_scores.get(entry["id"], -1)
+    return entries
+
+
+####################################################################################################
+class EntriesPayloadTests(unittest.TestCase):
+    """ Unit tests for the EntriesPayload class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.subject = payloads.EntriesPayload(settings.entries,
+                                               maximum_score=settings.MAXIMUM_SCORE)
+
+    ################################################################################################
+    def test_render(self):
+        """ Test the body is the same as serialising the entries with the user's scores. """
+        for user_scores in [{}, {settings.country_codes[0]: 10},
+                            dict((entry_id, 0) for entry_id in settings.country_codes)]:
+            self.assertEqual(codec.dumps({"data": expected_entries(user_scores)}),
+                             self.subject.render(user_scores))
+
+    ################################################################################################
+    def test_render_entry(self):
+        """ Test the body for an entry is the same as serialising the entry with the user's score.
+        """
+        entry_id = settings.country_codes[-1]
+        entry = next(entry for entry in expected_entries({entry_id: 7}) if entry["id"] == entry_id)
+
+        self.assertEqual(codec.dumps({"data": entry}),
+                         self.subject.render_entry(entry_id, 7))
+
+        with self.assertRaises(KeyError):
+            self.subject.render_entry("not_an_entry", 7)
+
+    ################################################################################################
+    def test_entries_are_not_changed(self):
+        """ Test the entries in the settings are not changed. """
+        self.assertNotIn("score", settings.entries[0]["attributes"])
+
+    ################################################################################################
+    def test_entries_containing_the_placeholder(self):
+        """ Test entries cannot contain the score placeholder. """
+        entries = copy.deepcopy(settings.entries)
+        entries[0]["attributes"]["country"] = payloads.SCORE_PLACEHOLDER
+
+        with self.assertRaises(ValueError):
+            payloads.EntriesPayload(entries)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
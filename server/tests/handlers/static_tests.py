@@ -0,0 +1,197 @@
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import tornado.testing
+import tornado.web
+import unittest
+
+sys.path.append('../..')
+
+# Source imports.
+from handlers import static
+import precompress
+
+""" This module contains the unit tests for the static file handler. """
+__author__ = "Thomas Reeve"
+
+FINGERPRINTED_NAME = "vision-0123456789abcdef0123456789abcdef.js"
+
+
+####################################################################################################
+class GetAcceptedEncodingsTests(unittest.TestCase):
+    """ Unit tests for get_accepted_encodings. """
+    ################################################################################################
+    def test_get_accepted_encodings(self):
+        """ Test the encodings are parsed from the header. """
+        self.assertEqual({"gzip", "deflate", "br"},
+                         static.get_accepted_encodings("gzip, deflate, br"))
+        self.assertEqual({"gzip"}, static.get_accepted_encodings("gzip;q=0.5, br;q=0"))
+        self.assertEqual(set(), static.get_accepted_encodings(""))
+
+
+####################################################################################################
+class FileCacheTests(unittest.TestCase):
+    """ Unit tests for the FileCache class. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.directory = tempfile.mkdtemp()
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        shutil.rmtree(self.directory)
+
+    ################################################################################################
+    def write(self, name, contents):
+        """ Writes a file in the temporary directory.
+
+        Args:
+            name (str): The name of the file.
+            contents (bytes): The contents.
+
+        Returns:
+            str: The path of the file.
+        """
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as file:
+            file.write(contents)
+        return path
+
+    ################################################################################################
+    def test_file_cache(self):
+        """ Test small files are kept, changes are noticed, and least recently used files are
+        removed. """
+        file_cache = static.FileCache(10, 6)
+        first = self.write("first", b"12345")
+        second = self.write("second", b"abcde")
+        large = self.write("large", b"1234567")
+
+        self.assertEqual(b"12345", file_cache.get(first))
+        self.assertEqual(b"12345", file_cache.get(first))
+        self.assertIsNone(file_cache.get(large))
+        self.assertEqual(b"abcde", file_cache.get(second))
+
+        statistics = file_cache.get_statistics()
+        self.assertEqual(1, statistics["hits"])
+        self.assertEqual(2, statistics["misses"])
+        self.assertEqual(10, statistics["size"])
+
+        self.write("first", b"123")
+        os.utime(first, (0, 0))
+        self.assertEqual(b"123", file_cache.get(first))
+        self.assertEqual(8, file_cache.get_statistics()["size"])
+
+        third = self.write("third", b"xyz")
+        self.assertEqual(b"xyz", file_cache.get(third))
+        statistics = file_cache.get_statistics()
+        self.assertEqual(1, statistics["evicted"])
+        self.assertEqual(2, statistics["files"])
+        self.assertEqual(6, statistics["size"])
+
+
+####################################################################################################
+class StaticFileHandlerTests(tornado.testing.AsyncHTTPTestCase):
+    """ Unit tests for the StaticFileHandler class. """
+    ################################################################################################
+    def get_app(self):
+        """ Creates the application to test, serving a temporary directory.
+
+        Returns:
+            tornado.web.Application: The application.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.script = b"var vision = 'vision';\n" * 200
+        for name in ["vision.js", FINGERPRINTED_NAME]:
+            with open(os.path.join(self.directory, name), "wb") as file:
+                file.write(self.script)
+        precompress.precompress_directory(self.directory)
+
+        return tornado.web.Application([
+            (r'/assets/(.*)', static.StaticFileHandler, {"path": self.directory}),
+            (r'/images/(.*)', static.StaticFileHandler,
+             {"path": self.directory, "cache_seconds": 60, "precompressed": False})
+        ])
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        super(StaticFileHandlerTests, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    ################################################################################################
+    def test_precompressed_copy_is_sent(self):
+        """ Test the gzip copy is sent to clients that accept it. """
+        response = self.fetch("/assets/vision.js", headers={"Accept-Encoding": "gzip"},
+                              decompress_response=False)
+        self.assertEqual(200, response.code)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", response.headers["Vary"])
+        self.assertIn("javascript", response.headers["Content-Type"])
+        self.assertLess(len(response.body), len(self.script))
+        self.assertEqual(self.script, gzip.decompress(response.body))
+
+        response = self.fetch("/assets/vision.js", headers={"Accept-Encoding": "identity"},
+                              decompress_response=False)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(self.script, response.body)
+
+    ################################################################################################
+    def test_rebuilt_files_are_noticed(self):
+        """ Test precompressed copies that are deleted or rebuilt while the server is running are
+        noticed. """
+        path = os.path.join(self.directory, "vision.js")
+        headers = {"Accept-Encoding": "gzip"}
+        self.assertEqual("gzip", self.fetch("/assets/vision.js", headers=headers,
+                                            decompress_response=False).headers["Content-Encoding"])
+
+        os.remove(path + ".gz")
+        response = self.fetch("/assets/vision.js", headers=headers, decompress_response=False)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(self.script, response.body)
+
+        # The file is rebuilt and precompressed again later on.
+        script = b"var vision = 'rebuilt';\n" * 200
+        with open(path, "wb") as file:
+            file.write(script)
+        modified = os.path.getmtime(path) + 10
+        os.utime(path, (modified, modified))
+        precompress.precompress_directory(self.directory)
+        os.utime(path + ".gz", (modified, modified))
+
+        response = self.fetch("/assets/vision.js", headers=headers, decompress_response=False)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual(script, gzip.decompress(response.body))
+
+    ################################################################################################
+    def test_cache_headers(self):
+        """ Test fingerprinted files are cached forever and other files are checked. """
+        response = self.fetch("/assets/" + FINGERPRINTED_NAME)
+        self.assertEqual("public, max-age=31536000, immutable", response.headers["Cache-Control"])
+
+        response = self.fetch("/assets/vision.js")
+        self.assertEqual("no-cache", response.headers["Cache-Control"])
+
+        response = self.fetch("/assets/vision.js",
+                              headers={"If-None-Match": response.headers["Etag"]})
+        self.assertEqual(304, response.code)
+
+        response = self.fetch("/images/vision.js", headers={"Accept-Encoding": "gzip"},
+                              decompress_response=False)
+        self.assertEqual("public, max-age=60", response.headers["Cache-Control"])
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Vary", response.headers)
+
+    ################################################################################################
+    def test_range_request(self):
+        """ Test part of a file can be requested when it is kept in memory. """
+        response = self.fetch("/images/vision.js", headers={"Range": "bytes=4-9"})
+        self.assertEqual(206, response.code)
+        self.assertEqual(self.script[4:10], response.body)
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,422 @@
+import concurrent.futures
+import json
+import os
+from mock import patch, MagicMock
+import sys
+import tornado.concurrent
+import tornado.gen
+import tornado.iostream
+import tornado.testing
+import tornado.web
+import tornado.websocket
+import unittest
+import zlib
+
+sys.path.append('../..')
+
+# Test imports.
+from tests.database import utilities
+
+# Source imports.
+import configuration.settings as settings
+import database.access_cache as access_cache
+import database.async_connector as async_connector
+from handlers import codec, coalescer, entries, payloads, update
+
+""" This module contains the unit tests for the update websocket handler. """
+__author__ = "Thomas Reeve"
+
+
+####################################################################################################
+class UpdateHandlerTests(tornado.testing.AsyncHTTPTestCase):
+    """ Unit tests for the UpdateHandler, using a database in memory. """
+    ################################################################################################
+    def get_app(self):
+        """ Creates the application to test.
+
+        Returns:
+            tornado.web.Application: The application.
+        """
+        self.database_connector, self.connection_pool, _ = utilities.create_sqlite_connector(
+            access_cache.AccessTokenCache(), load_results_aggregate=True, usernames=["dave"])
+        self.access_information = self.database_connector.get_access_information("dave")
+        # Registering the user has changed the results.
+        self.database_connector.take_results_changes()
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        application = tornado.web.Application([
+            (r'/api/entries/(.*)', entries.EntryHandler),
+            (r'/update', update.UpdateHandler)
+        ])
+        application.database_connector = async_connector.AsyncDatabaseConnector(
+            self.database_connector, self.executor)
+        application.entries_payload = payloads.EntriesPayload(
+            settings.entries, maximum_score=settings.MAXIMUM_SCORE)
+        application.score_coalescer = coalescer.ScoreCoalescer(application.database_connector,
+                                                               0.01)
+        return application
+
+    ################################################################################################
+    def tearDown(self):
+        """ Method run after every test. """
+        update.clients.clear()
+        super(UpdateHandlerTests, self).tearDown()
+        self.executor.shutdown()
+        self.database_connector.drop_database("UNITTEST_DATABASE")
+        self.connection_pool.close()
+
+    ################################################################################################
+    async def connect(self, compression_options=None):
+        """ Opens a websocket and reads the messages sent when it opens.
+
+        Args:
+            compression_options (dict): The client's compression options, None to not offer
+            compression.
+
+        Returns:
+            tuple: The websocket and the results message.
+        """
+        websocket = await tornado.websocket.websocket_connect(
+            "ws://127.0.0.1:" + str(self.get_http_port()) + "/update",
+            compression_options=compression_options)
+        results_message = json.loads(await websocket.read_message())
+        self.assertEqual("results", results_message["type"])
+        self.assertEqual("leaderboard", json.loads(await websocket.read_message())["type"])
+        return websocket, results_message
+
+    ################################################################################################
+    async def send_message(self, websocket, message_type, **kwargs):
+        """ Sends a message, as the client would.
+
+        Args:
+            websocket: The websocket.
+            message_type (str): The type of the message.
+            **kwargs: The rest of the message.
+        """
+        message = {"type": message_type, "username": "dave",
+                   "access_token": self.access_information["access_token"]}
+        message.update(kwargs)
+        await websocket.write_message(json.dumps(message))
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_results_changes_are_sent_after_the_snapshot(self):
+        """ Test the changes to the results are sent with sequence numbers, and applying them to the
+        snapshot sent on open gives the current results. """
+        websocket, results_message = await self.connect()
+        self.assertEqual(1, results_message["sequence"])
+        snapshot = results_message["results"]
+
+        # Clients are only sent broadcasts once they have sent a message.
+        await self.send_message(websocket, "refresh_token",
+                                refresh_token=self.access_information["refresh_token"])
+        self.assertEqual("access_token_expiry", json.loads(await websocket.read_message())["type"])
+
+        entry_id = settings.country_codes[0]
+        for score in [4, 6]:
+            response = await self.http_client.fetch(
+                self.get_url("/api/entries/" + entry_id), method="PATCH",
+                headers={"Authorization": "Bearer " + self.access_information["access_token"]},
+                body=json.dumps({"update": "score", "score": score}))
+            self.assertEqual(200, response.code)
+
+            messages = {}
+            while "scoreUpdate" not in messages:
+                message = await websocket.read_message()
+                messages[json.loads(message)["type"]] = message
+            delta = json.loads(messages["resultsDelta"])
+            self.assertEqual(results_message["sequence"] + 1, delta["sequence"])
+            self.assertLess(len(messages["resultsDelta"]), len(codec.dumps(
+                {"type": "results", "results": {entry_id: snapshot[entry_id]}})))
+            results_message = delta
+
+            for changed_entry_id, score, count in delta["changes"]:
+                snapshot[changed_entry_id][str(score)] += count
+
+        expected_results = self.database_connector.generate_results_dictionary(
+            settings.country_codes)
+        self.assertEqual(json.loads(json.dumps(expected_results)), snapshot)
+
+        # A client that has missed changes asks for a snapshot.
+        await self.send_message(websocket, "results_snapshot")
+        results_message = json.loads(await websocket.read_message())
+        self.assertEqual("results", results_message["type"])
+        self.assertEqual(3, results_message["sequence"])
+        self.assertEqual(snapshot, results_message["results"])
+        websocket.close()
+
+    ################################################################################################
+    @tornado.testing.gen_test
+    async def test_compression(self):
+        """ Test messages to one client are compressed when compression is enabled, and broadcasts
+        are sent uncompressed on the same connection. """
+        with patch.object(settings, "WEBSOCKET_COMPRESSION", True):
+            websocket, results_message = await self.connect(compression_options={})
+        self.assertIsNotNone(websocket.protocol._decompressor)
+        self.assertLess(websocket.protocol._wire_bytes_in,
+                        len(codec.dumps(results_message)))
+        await self.send_message(websocket, "refresh_token",
+                                refresh_token=self.access_information["refresh_token"])
+        self.assertEqual("access_token_expiry", json.loads(await websocket.read_message())["type"])
+
+        update.broadcast_message(codec.dumps({"type": "test", "test": "x" * 200}))
+        self.assertEqual({"type": "test", "test": "x" * 200},
+                         json.loads(await websocket.read_message()))
+        websocket.close()
+
+        # The connection is not compressed unless the client offers it.
+        with patch.object(settings, "WEBSOCKET_COMPRESSION", True):
+            websocket, _ = await self.connect()
+        self.assertIsNone(websocket.protocol._decompressor)
+        websocket.close()
+
+
+####################################################################################################
+class FakeHandler(object):
+    """ Records the messages written to, and the closing of, a websocket connection. """
+    ################################################################################################
+    def __init__(self):
+        """ Constructor. """
+        self.messages = []
+        self.close_reason = None
+        self.buffered_bytes = 0
+        self.snapshots = 0
+
+    ################################################################################################
+    def write_message(self, message):
+        """ Records a message. """
+        self.messages.append(message)
+
+    ################################################################################################
+    def write_frame(self, frame):
+        """ Records a message that has already been framed. The messages in the tests are shorter
+        than 126 bytes, so the header is two bytes. """
+        self.messages.append(frame[2:].decode())
+        return True
+
+    ################################################################################################
+    def get_buffered_bytes(self):
+        """ Gets the bytes waiting to be sent, as set by the test. """
+        return self.buffered_bytes
+
+    ################################################################################################
+    def catch_up(self):
+        """ Records a snapshot being sent. """
+        self.snapshots += 1
+
+    ################################################################################################
+    def close(self, reason=None):
+        """ Records the connection being closed. """
+        self.close_reason = reason
+
+
+####################################################################################################
+class ClientRegistryTests(unittest.TestCase):
+    """ Unit tests for the ClientRegistry class, and the functions that use update.clients. """
+    ################################################################################################
+    def setUp(self):
+        """ Method run before every test. """
+        self.subject = update.ClientRegistry()
+        self.handlers = [FakeHandler() for _ in range(4)]
+        for handler in self.handlers:
+            self.subject.add(handler)
+        self.subject.identify(self.handlers[0], "dave", "token_1")
+        self.subject.identify(self.handlers[1], "dave", "token_2")
+        self.subject.identify(self.handlers[2], "fred", "token_3")
+
+    ################################################################################################
+    def test_indexes(self):
+        """ Test connections are found by access token and username, and only once they have been
+        identified. """
+        self.assertEqual(4, len(self.subject))
+        self.assertEqual([self.handlers[0]], self.subject.get_by_access_token("token_1"))
+        self.assertCountEqual(self.handlers[:2], self.subject.get_by_username("dave"))
+        self.assertCountEqual(self.handlers[:3], self.subject.get_identified())
+        self.assertEqual([], self.subject.get_by_username("bob"))
+
+        # Only the first access token is recorded.
+        self.subject.identify(self.handlers[0], "dave", "token_4")
+        self.assertEqual("token_1", self.subject.get(self.handlers[0]).access_token)
+        self.assertEqual([], self.subject.get_by_access_token("token_4"))
+
+    ################################################################################################
+    def test_remove(self):
+        """ Test removing a connection removes it from the indexes. """
+        self.assertTrue(self.subject.remove(self.handlers[0]))
+        self.assertFalse(self.subject.remove(self.handlers[0]))
+        self.assertNotIn(self.handlers[0], self.subject)
+        self.assertEqual([], self.subject.get_by_access_token("token_1"))
+        self.assertEqual([self.handlers[1]], self.subject.get_by_username("dave"))
+
+        # Identifying a removed connection does not add it back.
+        self.subject.identify(self.handlers[0], "dave", "token_1")
+        self.assertEqual([], self.subject.get_by_access_token("token_1"))
+
+    ################################################################################################
+    def test_broadcast_and_close(self):
+        """ Test broadcasts reach the targeted connections, and closes close every connection of a
+        user. """
+        with patch('handlers.update.clients', self.subject):
+            update.broadcast_message_locally("all")
+            update.broadcast_message_locally("one", "token_2")
+            self.assertEqual([["all"], ["all", "one"], ["all"], []],
+                             [handler.messages for handler in self.handlers])
+
+            update.close_connections_locally(username="dave", access_token="token_3",
+                                             reason="Session Expired")
+        self.assertEqual(["Session Expired", "Session Expired", "Session Expired", None],
+                         [handler.close_reason for handler in self.handlers])
+        self.assertEqual(1, len(self.subject))
+        self.assertEqual([], self.subject.get_identified())
+
+    ################################################################################################
+    @patch('handlers.update.time')
+    def test_slow_connections(self, mock_time):
+        """ Test broadcasts of the results to connections that have fallen behind are dropped, a
+        snapshot is sent once they catch up, and connections that stay behind are closed. """
+        mock_time.monotonic.return_value = 100.0
+        slow_handler = self.handlers[0]
+        slow_handler.buffered_bytes = settings.WEBSOCKET_MAXIMUM_BUFFER_BYTES + 1
+        with patch('handlers.update.clients', self.subject):
+            update.broadcast_message_locally("results_1", replaceable=True)
+            update.broadcast_message_locally("results_2", replaceable=True)
+            # Other messages are still sent.
+            update.broadcast_message_locally("score", "token_1")
+            self.assertEqual(["score"], slow_handler.messages)
+            self.assertEqual(["results_1", "results_2"], self.handlers[1].messages)
+            statistics = self.subject.get_statistics()
+            self.assertEqual(2, statistics["dropped_messages"])
+            self.assertEqual(1, statistics["behind"])
+            self.assertEqual(settings.WEBSOCKET_MAXIMUM_BUFFER_BYTES + 1,
+                             statistics["maximum_buffered_bytes"])
+
+            # The snapshot is sent in place of the broadcast that finds the connection caught up.
+            slow_handler.buffered_bytes = 0
+            update.broadcast_message_locally("results_3", replaceable=True)
+            update.broadcast_message_locally("results_4", replaceable=True)
+            self.assertEqual(["score", "results_4"], slow_handler.messages)
+            self.assertEqual(1, slow_handler.snapshots)
+            self.assertEqual(0, self.subject.get_statistics()["behind"])
+
+            # A connection that stays behind is closed.
+            slow_handler.buffered_bytes = settings.WEBSOCKET_MAXIMUM_BUFFER_BYTES + 1
+            update.broadcast_message_locally("results_5", replaceable=True)
+            mock_time.monotonic.return_value += settings.WEBSOCKET_STALLED_SECONDS
+            update.broadcast_message_locally("results_6", replaceable=True)
+        self.assertIsNotNone(slow_handler.close_reason)
+        self.assertNotIn(slow_handler, self.subject)
+        statistics = self.subject.get_statistics()
+        self.assertEqual(3, statistics["dropped_messages"])
+        self.assertEqual(1, statistics["closed_connections"])
+        self.assertEqual(0, statistics["behind"])
+
+
+####################################################################################################
+class FrameMessageTests(unittest.TestCase):
+    """ Unit tests for the frame_message function. """
+    ################################################################################################
+    def test_frames_match_tornado(self):
+        """ Test messages are framed as Tornado frames them, for each size of length. """
+        for length in [0, 125, 126, 0xFFFF, 0x10000]:
+            message = b"x" * length
+            with patch.object(tornado.websocket.WebSocketProtocol13, "__init__",
+                              lambda protocol: None):
+                protocol = tornado.websocket.WebSocketProtocol13()
+            protocol.mask_outgoing = False
+            protocol._wire_bytes_out = 0
+            protocol.stream = FakeHandler()
+            protocol.stream.write = protocol.stream.write_message
+            protocol._write_frame(True, 0x1, message)
+
+            self.assertEqual(protocol.stream.messages, [update.frame_message(message)])
+
+
+####################################################################################################
+class LimitCompressionWindowTests(unittest.TestCase):
+    """ Unit tests for the limit_compression_window function. """
+    ################################################################################################
+    def test_limit_compression_window(self):
+        """ Test the window is only made smaller, and messages compressed with it can be
+        decompressed by a client allowing the largest window. """
+        protocol = tornado.websocket.WebSocketProtocol13(
+            None, False, tornado.websocket._WebSocketParams())
+        protocol._create_compressors("server", {})
+        update.limit_compression_window(protocol, None)
+        self.assertEqual(15, protocol._compressor._max_wbits)
+        update.limit_compression_window(protocol, 10)
+        self.assertEqual(10, protocol._compressor._max_wbits)
+        update.limit_compression_window(protocol, 12)
+        self.assertEqual(10, protocol._compressor._max_wbits)
+
+        message = codec.dumps({"results": ["x" * 2000, "y" * 2000, "x" * 2000]})
+        decompressor = zlib.decompressobj(-15)
+        for _ in range(2):
+            compressed = protocol._compressor.compress(message)
+            self.assertLess(len(compressed), len(message))
+            self.assertEqual(message, decompressor.decompress(compressed + b"\x00\x00\xff\xff"))
+
+        # The message repeats data from further back than a 10 bit window, so it can only be
+        # decompressed with one if the compressor really uses the smaller window. It is read in
+        # small pieces, otherwise the decompressor looks back through its output instead.
+        message = os.urandom(1500) * 2
+        compressed = protocol._compressor.compress(message) + b"\x00\x00\xff\xff"
+        decompressor = zlib.decompressobj(-10)
+        decompressed = b""
+        while compressed:
+            decompressed += decompressor.decompress(compressed, 100)
+            compressed = decompressor.unconsumed_tail
+        self.assertEqual(message, decompressed)
+
+        # Connections without compression are left alone.
+        update.limit_compression_window(tornado.websocket.WebSocketProtocol13(
+            None, False, tornado.websocket._WebSocketParams()), 10)
+
+    ################################################################################################
+    def test_compressors_without_a_window_are_left_alone(self):
+        """ Test a compressor without the attributes Tornado uses for the window is left alone, and
+        a warning is logged once. """
+        with patch('handlers.update.compression_window_warned', False), \
+                patch('handlers.update.logger') as mock_logger:
+            connection = MagicMock(spec=["_compressor"])
+            connection._compressor = object()
+            update.limit_compression_window(connection, 10)
+
+            connection._compressor = MagicMock(spec=["_max_wbits", "_compressor"])
+            connection._compressor._max_wbits = 15
+            update.limit_compression_window(connection, 10)
+            self.assertEqual(15, connection._compressor._max_wbits)
+            self.assertEqual(1, mock_logger.warning.call_count)
+
+
+####################################################################################################
+class GetBufferedBytesTests(tornado.testing.AsyncTestCase):
+    """ Unit tests for UpdateHandler.get_buffered_bytes. """
+    ################################################################################################
+    @tornado.testing.gen_test
+    def test_get_buffered_bytes(self):
+        """ Test the bytes written are counted until their write has finished or failed. """
+        handler = update.UpdateHandler.__new__(update.UpdateHandler)
+        handler.initialize()
+        handler.ws_connection = MagicMock()
+        handler.ws_connection.is_closing.return_value = False
+        writes = [tornado.concurrent.Future(), tornado.concurrent.Future()]
+        handler.ws_connection.stream.write.side_effect = writes
+        self.assertEqual(0, handler.get_buffered_bytes())
+
+        handler.write_frame(update.frame_message(b"123"))
+        handler.write_frame(update.frame_message(b"1234567"))
+        self.assertEqual(14, handler.get_buffered_bytes())
+
+        writes[0].set_result(None)
+        yield tornado.gen.moment
+        self.assertEqual(9, handler.get_buffered_bytes())
+        # The stream retrieves the error of the writes it fails when it is closed.
+        writes[1].set_exception(tornado.iostream.StreamClosedError())
+        writes[1].exception()
+        yield tornado.gen.moment
+        self.assertEqual(0, handler.get_buffered_bytes())
+
+
+####################################################################################################
+if __name__ == '__main__':
+    unittest.main()
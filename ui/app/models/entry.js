@@ -36,12 +36,15 @@ export default DS.Model.extend({
                 'Authorization': 'Bearer ' + this.get('session.data.authenticated.access_token')
             },
             type: 'PATCH',
+            dataType: 'json',
             data: JSON.stringify({
                 'update': 'score',
                 'score': newScore
             }),
-            success: () => {
-                this.set('score', newScore);
+            // The server writes the latest of the scores sent in quick succession, so every
+            // response has the score that was kept.
+            success: (data) => {
+                this.set('score', data['score']);
             }
         });
     },
@@ -49,6 +52,10 @@ export default DS.Model.extend({
     // The results array that will be updated every few seconds from the server using a websocket.
     results: undefined,
 
+    // The entry's position when ranked by total and by average score, sent by the server.
+    totalRank: undefined,
+    averageRank: undefined,
+
     // Variables used for summary information.
     displayResults: false,
     total: undefined,
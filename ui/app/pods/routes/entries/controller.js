@@ -17,13 +17,13 @@ export default Controller.extend({
         if (selected === sortTypeRange[0]) {
             return 'order:asc';
         } else if (selected === sortTypeRange[1]) {
-            return 'total:asc';
+            return 'totalRank:desc';
         } else if (selected === sortTypeRange[2]) {
-            return 'total:desc';
+            return 'totalRank:asc';
         } else if (selected === sortTypeRange[3]) {
-            return 'mean:asc';
+            return 'averageRank:desc';
         } else if (selected === sortTypeRange[4]) {
-            return 'mean:desc';
+            return 'averageRank:asc';
         } else {
             throw "Unknown entry sorting type.";
         }
@@ -11,6 +11,9 @@ export default Service.extend({
     refreshTokenRunLaterMethod: undefined,
     updateResultsRunLaterMethod: undefined,
     reconnecting: false,
+    // The sequence number of the last results changes applied, undefined when the server does not
+    // send the changes or a snapshot of the results has been requested.
+    resultsSequence: undefined,
 
     init() {
         this._super(...arguments);
@@ -79,8 +82,14 @@ export default Service.extend({
 
             if (data["type"] === "results") {
                 this.resultsMessage(data);
+            } else if (data["type"] === "resultsDelta") {
+                this.resultsDeltaMessage(data);
+            } else if (data["type"] === "leaderboard") {
+                this.leaderboardMessage(data);
             } else if (data["type"] === "scoreUpdate") {
                 this.scoreUpdate(data);
+            } else if (data["type"] === "scoreUpdates") {
+                this.scoreUpdates(data);
             } else if (data["type"] === "access_token_expiry") {
                 this.sendRefreshToken(data["access_token_expiry"]);
             }
@@ -120,14 +129,69 @@ export default Service.extend({
     },
 
     resultsMessage(data) {
+        if ("sequence" in data) {
+            this.set('resultsSequence', data["sequence"] === null ? undefined : data["sequence"]);
+        }
         this.updateEntries(data);
     },
 
+    // Sent instead of the results when scores change, with the change in the count of each score.
+    // If any changes have been missed a snapshot of the results is requested instead.
+    resultsDeltaMessage(data) {
+        const resultsSequence = this.get('resultsSequence');
+        if (resultsSequence === undefined || data["sequence"] <= resultsSequence) {
+            return;
+        }
+        if (data["sequence"] !== resultsSequence + 1) {
+            this.set('resultsSequence', undefined);
+            this.sendMessage({"type": "results_snapshot"});
+            return;
+        }
+
+        this.set('resultsSequence', data["sequence"]);
+        let changedResults = {};
+        for (let [id, score, count] of data["changes"]) {
+            if (!(id in changedResults)) {
+                const entry = this.get('store').peekRecord('entry', id);
+                if (!entry || !entry.get('results')) {
+                    continue;
+                }
+                changedResults[id] = Object.assign({}, entry.get('results'));
+            }
+            changedResults[id][score] = (changedResults[id][score] || 0) + count;
+        }
+        this.updateEntries({"results": changedResults});
+    },
+
+    // Sent when the ranking changes, the server keeps the entries ranked so they are not sorted
+    // here.
+    leaderboardMessage(data) {
+        data["leaderboard"]["total"].forEach((id, index) => {
+            const entry = this.get('store').peekRecord('entry', id);
+            if (entry) {
+                entry.set('totalRank', index + 1);
+            }
+        });
+        data["leaderboard"]["average"].forEach((id, index) => {
+            const entry = this.get('store').peekRecord('entry', id);
+            if (entry) {
+                entry.set('averageRank', index + 1);
+            }
+        });
+    },
+
     scoreUpdate(data) {
         const entry = this.get('store').peekRecord('entry', data["scoreUpdate"]["id"]);
         entry.set('score', data["scoreUpdate"]["score"]);
     },
 
+    // Sent when several scores are updated at once.
+    scoreUpdates(data) {
+        for (let scoreUpdate of data["scoreUpdates"]) {
+            this.scoreUpdate({"scoreUpdate": scoreUpdate});
+        }
+    },
+
     cancelSendRefreshToken() {
         const refreshTokenRunLaterMethod = this.get('refreshTokenRunLaterMethod');
         if(refreshTokenRunLaterMethod) {
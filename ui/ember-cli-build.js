@@ -8,8 +8,13 @@ module.exports = function(defaults) {
       sassOptions: {
           includePaths: ['app']
       },
+      // Fingerprinted files are cached forever by browsers, see server/handlers/static.py. The
+      // flags are not fingerprinted as their names are built from the entries, and the constants
+      // are replaced when the server is deployed.
       fingerprint: {
-          enabled: false
+          enabled: EmberApp.env() === 'production',
+          extensions: ['js', 'css', 'png', 'jpg', 'gif', 'map', 'svg', 'ttf', 'woff', 'woff2'],
+          exclude: ['images/flags', 'constants.js']
       },
       SRI: {
           enabled: false